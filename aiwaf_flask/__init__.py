@@ -117,6 +117,8 @@ class AIWAF:
             'AIWAF_RATE_FLOOD': 200,
             'AIWAF_MIN_FORM_TIME': 1.0,
             'AIWAF_HONEYPOT_SKIP_AUTHENTICATED': True,
+            'AIWAF_HONEYPOT_MODE': 'memory',
+            'AIWAF_HONEYPOT_TOKEN_MAX_AGE': 3600,
             'AIWAF_USE_CSV': True,
             'AIWAF_USE_RUST': False,
             'AIWAF_DATA_DIR': 'aiwaf_data',
@@ -125,12 +127,36 @@ class AIWAF:
             'AIWAF_WINDOW_SECONDS': 60,
             'AIWAF_DYNAMIC_TOP_N': 10,
             'AIWAF_MODEL_PATH': 'aiwaf_flask/resources/model.pkl',
+            'AIWAF_ROUTE_CACHE_SIZE': 4096,
+            'AIWAF_HISTORY_CAPACITY': 1024,
+            'AIWAF_LOG_INDEX_PATH': None,
+            'AIWAF_LOG_PARSE_JOBS': 1,
+            'AIWAF_TRAIN_INCREMENTAL': True,
+            'AIWAF_TRAIN_CHECKPOINT_PATH': None,
+            'AIWAF_TRAIN_RESERVOIR_SIZE': 20000,
+            'AIWAF_TRAIN_404_MAX_AGE': 7 * 24 * 3600,
+            'AIWAF_MODEL_EVALUATOR': 'compiled',
+            'AIWAF_MODEL_RELOAD_INTERVAL': 30,
+            'AIWAF_MODEL_CANARY_MAX_ANOMALY_RATE': 0.5,
+            'AIWAF_AI_PREFILTER': True,
+            'AIWAF_AI_PREFILTER_BURST': 20,
+            'AIWAF_AI_SCORING_MODE': 'sync',
+            'AIWAF_AI_BATCH_SIZE': 64,
+            'AIWAF_AI_BATCH_INTERVAL_MS': 20,
+            'AIWAF_AI_QUEUE_SIZE': 10000,
+            'AIWAF_AI_QUEUE_OVERFLOW': 'sync',
+            'AIWAF_KEYWORD_LEARNING_MODE': 'async',
+            'AIWAF_KEYWORD_QUEUE_SIZE': 1000,
             'AIWAF_GEO_BLOCK_ENABLED': False,
             'AIWAF_GEO_BLOCK_COUNTRIES': [],
             'AIWAF_GEO_ALLOW_COUNTRIES': [],
             'AIWAF_GEOIP_DB_PATH': 'ipinfo_lite.mmdb',
             'AIWAF_GEO_CACHE_SECONDS': 3600,
-            'AIWAF_GEO_CACHE_PREFIX': 'aiwaf_geo'
+            'AIWAF_GEO_CACHE_PREFIX': 'aiwaf_geo',
+            'AIWAF_GEO_CACHE_MAX_ENTRIES': 65536,
+            'AIWAF_GEO_COMPILED_RANGES': False,
+            'AIWAF_GEO_RANGE_CACHE_DIR': None,
+            'AIWAF_GEO_BLOCKED_REFRESH_SECONDS': 60
         }
         
         for key, value in defaults.items():
@@ -5,14 +5,30 @@ This middleware uses machine learning to detect anomalous behavior patterns
 and automatically blocks malicious IPs based on request characteristics.
 """
 
+import os
 import re
 import time
 import logging
-from flask import request, jsonify, g, current_app
+import threading
+from collections import OrderedDict, deque
+from flask import request, jsonify, make_response, g, current_app, has_request_context
+from werkzeug.exceptions import MethodNotAllowed
+from werkzeug.routing import RequestRedirect
 from .utils import get_ip, is_exempt, is_path_exempt
 from .blacklist_manager import BlacklistManager
 from .exemption_decorators import should_apply_middleware
 from . import rust_backend
+from .request_history import RequestHistoryStore, DEFAULT_HISTORY_CAPACITY
+from .log_index import LogVolumeIndex
+from .async_scoring import (
+    AsyncModelScorer,
+    MicroBatchWorker,
+    DEFAULT_BATCH_INTERVAL_MS,
+    DEFAULT_BATCH_SIZE,
+    DEFAULT_QUEUE_SIZE,
+    OVERFLOW_DROP,
+    OVERFLOW_SYNC,
+)
 
 # Try to import numpy and ML dependencies
 try:
@@ -37,6 +53,13 @@ except ImportError:
     PICKLE_AVAILABLE = False
     pickle = None
 
+try:
+    from .forest import CompiledIsolationForest, artifact_path_for, load_forest_artifact
+except ImportError:
+    CompiledIsolationForest = None
+    artifact_path_for = None
+    load_forest_artifact = None
+
 # Static malicious keywords (similar to Django implementation)
 STATIC_KEYWORDS = {
     'admin', 'wp-admin', 'wp-content', 'wp-includes', 'wp-config', 'xmlrpc',
@@ -51,6 +74,75 @@ STATIC_KEYWORDS = {
 # Status code mapping for ML features
 STATUS_CODES = ['200', '201', '204', '301', '302', '400', '401', '403', '404', '405', '500', '502', '503']
 
+# Strong indicators that a 404 path is an attack, used for keyword learning
+ATTACK_PATH_PATTERNS = (
+    '../', '..\\', '.env', 'wp-admin', 'phpmyadmin', 'config',
+    'backup', 'database', 'mysql', 'passwd', 'shadow', 'admin',
+    'shell', 'cmd', 'exec', 'system'
+)
+SUSPICIOUS_QUERY_PARAMS = ('cmd', 'exec', 'system', 'shell', 'eval')
+ENCODED_ATTACK_PATTERNS = ('%2e%2e', '%252e', '%c0%ae', '%2f', '%5c')
+SQL_INJECTION_PATTERNS = ('union select', 'drop table', 'insert into', 'delete from', 'update set')
+XSS_PATTERNS = ('<script', 'javascript:', 'onload=', 'onerror=', 'document.cookie')
+
+# Length of the vector built by _calculate_features
+FEATURE_COUNT = 6
+
+DEFAULT_ROUTE_CACHE_SIZE = 4096
+
+DEFAULT_MODEL_RELOAD_INTERVAL = 30
+DEFAULT_MODEL_CANARY_SIZE = 256
+DEFAULT_MODEL_CANARY_MAX_ANOMALY_RATE = 0.5
+
+# Scoring tiers, cheapest first: requests stop at the first tier that decides them
+TIER_NO_MODEL = 'no_model'
+TIER_PREFILTER = 'prefilter'
+TIER_MODEL = 'model'
+
+# Requests in the last 10s at or above which the pre-filter defers to the model
+DEFAULT_PREFILTER_BURST = 20
+
+DEFAULT_KEYWORD_QUEUE_SIZE = 1000
+DEFAULT_KEYWORD_BATCH_INTERVAL_MS = 100
+# 404 events remembered so repeated scanner hits are not re-evaluated
+DEFAULT_RECENT_404_EVENTS = 4096
+
+# Below this many entries the pure-Python sweep beats NumPy's call overhead
+NUMPY_BURST_MIN_ENTRIES = 64
+
+
+def _average_burst(timestamps, span=10):
+    """Mean, over all entries, of how many entries lie within +/-span seconds of it.
+
+    Each entry counts itself. Runs in O(n log n) on the sorted timestamps:
+    ``searchsorted`` with NumPy, or a two-pointer sweep without it.
+    """
+    n = len(timestamps)
+    if not n:
+        return 0
+    if NUMPY_AVAILABLE and n >= NUMPY_BURST_MIN_ENTRIES:
+        ts = np.sort(np.asarray(timestamps, dtype=float))
+        upper = np.searchsorted(ts, ts + span, side='right')
+        lower = np.searchsorted(ts, ts - span, side='left')
+        return float((upper - lower).sum()) / n
+    
+    ts = sorted(timestamps)
+    total = 0
+    lo = hi = 0
+    for t in ts:
+        while hi < n and ts[hi] - t <= span:
+            hi += 1
+        while t - ts[lo] > span:
+            lo += 1
+        total += hi - lo
+    return total / n
+
+
+def _url_map_signature(url_map):
+    """Identify a URL map's current rule set; changes whenever rules are added."""
+    rules = getattr(url_map, '_rules', None)
+    return (id(url_map), len(rules) if rules is not None else None)
+
 class AIAnomalyMiddleware:
     """
     AI-powered anomaly detection middleware for Flask.
@@ -63,14 +155,52 @@ class AIAnomalyMiddleware:
         self.app = app
         self.model = None
         self.malicious_keywords = set(STATIC_KEYWORDS)
-        self.request_cache = {}  # Simple in-memory cache for request history
         self.window_seconds = 60
+        self.request_cache = RequestHistoryStore(DEFAULT_HISTORY_CAPACITY, self.window_seconds)  # Per-IP request history
         self.top_n = 10
         
+        # path -> bool, LRU-bounded and dropped whenever the URL map changes
+        self._route_cache = OrderedDict()
+        self._route_cache_signature = None
+        self._route_cache_size = DEFAULT_ROUTE_CACHE_SIZE
+        self._route_cache_lock = threading.Lock()
+        
+        # Background micro-batch scorer (AIWAF_AI_SCORING_MODE='async')
+        self._scorer = None
+        
+        # Background keyword learning from 404s (AIWAF_KEYWORD_LEARNING_MODE='async')
+        self._keyword_learner = None
+        self._recent_404_events = OrderedDict()
+        self._recent_404_lock = threading.Lock()
+        # Serializes the read-merge-rebind of malicious_keywords between the
+        # learning thread and request threads learning inline
+        self._keyword_lock = threading.Lock()
+        
+        # Requests decided at each scoring tier
+        self.tier_counts = {TIER_NO_MODEL: 0, TIER_PREFILTER: 0, TIER_MODEL: 0}
+        self._prefilter_enabled = True
+        self._prefilter_burst = DEFAULT_PREFILTER_BURST
+        
         # Periodic AI check
         self.last_ai_check = 0
         self.ai_check_interval = app.config.get('AIWAF_AI_CHECK_INTERVAL', 3600) if app else 3600  # Default: Check every hour
         
+        # Incremental log line counts + the background thread that consults them
+        self._log_index = None
+        self._ai_monitor = None
+        self._ai_monitor_pid = None
+        self._ai_monitor_stop = threading.Event()
+        self._ai_monitor_lock = threading.Lock()
+        
+        # Model hot-reload: file signature the current model came from, and
+        # recent feature vectors a new model must score sensibly before a swap
+        self._model_wanted = False
+        self._model_signature = None
+        self._last_reload_check = 0
+        self._canary_features = deque(maxlen=DEFAULT_MODEL_CANARY_SIZE)
+        self.model_reloads = 0
+        self.model_reload_rejections = 0
+        
         # Setup logging
         self.logger = logging.getLogger(__name__)
         
@@ -84,9 +214,40 @@ class AIAnomalyMiddleware:
         # Configuration
         self.window_seconds = app.config.get('AIWAF_WINDOW_SECONDS', 60)
         self.top_n = app.config.get('AIWAF_DYNAMIC_TOP_N', 10)
+        self._route_cache_size = app.config.get('AIWAF_ROUTE_CACHE_SIZE', DEFAULT_ROUTE_CACHE_SIZE)
+        self._prefilter_enabled = app.config.get('AIWAF_AI_PREFILTER', True)
+        self._prefilter_burst = app.config.get('AIWAF_AI_PREFILTER_BURST', DEFAULT_PREFILTER_BURST)
+        self.request_cache = RequestHistoryStore(
+            app.config.get('AIWAF_HISTORY_CAPACITY', DEFAULT_HISTORY_CAPACITY),
+            self.window_seconds,
+        )
+        
+        # Log volume is checked on a background thread started by the first
+        # request; a forced model needs no log scan, so load it up front.
+        if app.config.get('AIWAF_FORCE_AI', False):
+            self._load_model(app)
+        
+        if app.config.get('AIWAF_AI_SCORING_MODE', 'sync') == 'async':
+            self._scorer = AsyncModelScorer(
+                self._score_batch,
+                self._handle_scored,
+                batch_size=app.config.get('AIWAF_AI_BATCH_SIZE', DEFAULT_BATCH_SIZE),
+                interval_ms=app.config.get('AIWAF_AI_BATCH_INTERVAL_MS', DEFAULT_BATCH_INTERVAL_MS),
+                queue_size=app.config.get('AIWAF_AI_QUEUE_SIZE', DEFAULT_QUEUE_SIZE),
+                overflow=app.config.get('AIWAF_AI_QUEUE_OVERFLOW', OVERFLOW_SYNC),
+                logger=self.logger,
+            )
         
-        # Try to load ML model
-        self._load_model(app)
+        if app.config.get('AIWAF_KEYWORD_LEARNING_MODE', 'async') == 'async':
+            self._keyword_learner = MicroBatchWorker(
+                self._learn_keywords,
+                interval_ms=DEFAULT_KEYWORD_BATCH_INTERVAL_MS,
+                queue_size=app.config.get('AIWAF_KEYWORD_QUEUE_SIZE', DEFAULT_KEYWORD_QUEUE_SIZE),
+                overflow=OVERFLOW_DROP,
+                logger=self.logger,
+                name='aiwaf-keywords',
+                description='keyword learning',
+            )
         
         # Register middleware hooks
         app.before_request(self.before_request)
@@ -105,32 +266,22 @@ class AIAnomalyMiddleware:
         
         return str(resources_dir / 'model.pkl')
 
+    def _get_log_index(self, app):
+        """Return the LogVolumeIndex for the configured log directory."""
+        log_dir = app.config.get('AIWAF_LOG_DIR', 'logs')
+        index_path = app.config.get('AIWAF_LOG_INDEX_PATH')
+        index = self._log_index
+        if index is None or index.log_dir != log_dir or (index_path and index.index_path != index_path):
+            index = self._log_index = LogVolumeIndex(log_dir, index_path)
+        return index
+
     def _check_log_data_sufficiency(self, app):
         """Check if there's enough log data to justify AI model usage."""
         min_ai_threshold = app.config.get('AIWAF_MIN_AI_LOGS', 10000)
-        log_dir = app.config.get('AIWAF_LOG_DIR', 'logs')
         
-        total_lines = 0
         try:
-            import os
-            import glob
-            
-            # Count lines in all log files
-            log_patterns = [
-                os.path.join(log_dir, '*.log'),
-                os.path.join(log_dir, '*.csv'),
-                os.path.join(log_dir, '*.json'),
-                os.path.join(log_dir, '*.jsonl'),
-            ]
-            
-            for pattern in log_patterns:
-                for log_file in glob.glob(pattern):
-                    try:
-                        with open(log_file, 'r', encoding='utf-8', errors='ignore') as f:
-                            total_lines += sum(1 for _ in f)
-                    except Exception as e:
-                        self.logger.debug(f"Error reading {log_file}: {e}")
-                        continue
+            # Only bytes appended since the last check are read
+            total_lines = self._get_log_index(app).refresh()
             
             self.logger.info(f"Found {total_lines} total log lines, threshold: {min_ai_threshold}")
             return total_lines >= min_ai_threshold
@@ -139,6 +290,48 @@ class AIAnomalyMiddleware:
             self.logger.warning(f"Could not check log data sufficiency: {e}")
             return True  # Default to allowing AI if we can't check
 
+    def _ensure_ai_monitor(self, app):
+        """Start the background AI status thread in this process if it is not running."""
+        thread = self._ai_monitor
+        if thread is not None and self._ai_monitor_pid == os.getpid() and thread.is_alive():
+            return
+        with self._ai_monitor_lock:
+            thread = self._ai_monitor
+            if thread is not None and self._ai_monitor_pid == os.getpid() and thread.is_alive():
+                return
+            if self._ai_monitor_stop.is_set():
+                return
+            # After a fork the parent's thread does not exist here; start fresh.
+            self._ai_monitor_pid = os.getpid()
+            self._ai_monitor = threading.Thread(
+                target=self._ai_monitor_loop, args=(app,), name='aiwaf-ai-status', daemon=True
+            )
+            self._ai_monitor.start()
+
+    def _ai_monitor_loop(self, app):
+        while not self._ai_monitor_stop.is_set():
+            try:
+                self._check_ai_status_periodically(app)
+            except Exception as e:
+                self.logger.warning(f"AI status check failed: {e}")
+            try:
+                self._check_model_reload(app)
+            except Exception as e:
+                self.logger.warning(f"Model reload check failed: {e}")
+            wait = self.last_ai_check + self.ai_check_interval - time.time()
+            reload_interval = app.config.get('AIWAF_MODEL_RELOAD_INTERVAL', DEFAULT_MODEL_RELOAD_INTERVAL)
+            if reload_interval:
+                wait = min(wait, self._last_reload_check + reload_interval - time.time())
+            self._ai_monitor_stop.wait(max(1.0, wait))
+
+    def stop_ai_monitor(self, timeout=1.0):
+        """Stop the background AI status thread (it is not restarted afterwards)."""
+        self._ai_monitor_stop.set()
+        thread = self._ai_monitor
+        if thread is not None and thread.is_alive():
+            thread.join(timeout)
+        self._ai_monitor = None
+
     def _check_ai_status_periodically(self, app):
         """Periodically re-evaluate whether AI should be enabled based on current log data."""
         import time
@@ -171,6 +364,7 @@ class AIAnomalyMiddleware:
         elif not has_sufficient_data and self.model is not None:
             # We no longer have enough data - disable AI
             self.logger.info("Insufficient log data detected - disabling AI model")
+            self._model_wanted = False
             self.model = None
 
     def _load_model(self, app):
@@ -180,14 +374,29 @@ class AIAnomalyMiddleware:
         if not force_ai and not self._check_log_data_sufficiency(app):
             self.logger.info("Insufficient log data for AI anomaly detection - using keyword-only mode")
             self.logger.info("Use AIWAF_FORCE_AI=True to override this behavior")
+            self._model_wanted = False
             self.model = None
             return
         elif force_ai:
             self.logger.info("AI model loading forced despite potentially insufficient log data")
         
-        # Get model path - use package-relative path by default
-        default_model_path = self._get_default_model_path()
-        model_path = app.config.get('AIWAF_MODEL_PATH', default_model_path)
+        self._model_wanted = True
+        
+        model_path = self._get_model_path(app)
+        signature = self._model_file_signature(model_path)
+        self.model = self._read_model(app, model_path)
+        self._model_signature = signature
+
+    def _get_model_path(self, app):
+        # Use package-relative path by default
+        return app.config.get('AIWAF_MODEL_PATH', self._get_default_model_path())
+
+    def _read_model(self, app, model_path):
+        """Deserialize the model at model_path; returns None if it cannot be loaded."""
+        # Prefer the memory-mapped compiled artifact: no unpickling, shared pages
+        model = self._load_artifact(app, model_path)
+        if model is not None:
+            return model
         
         if JOBLIB_AVAILABLE and NUMPY_AVAILABLE:
             try:
@@ -202,10 +411,10 @@ class AIAnomalyMiddleware:
                             
                             # Handle both new format (dict with metadata) and old format (direct model)
                             if isinstance(model_data, dict) and 'model' in model_data:
-                                self.model = model_data['model']
+                                model = self._select_model(model_data, app)
                                 self.logger.info(f"Loaded AI model from {model_path} (with metadata, joblib)")
                             else:
-                                self.model = model_data
+                                model = self._select_model(model_data, app)
                                 self.logger.info(f"Loaded AI model from {model_path} (legacy format, joblib)")
                     
                     except Exception as joblib_error:
@@ -219,10 +428,10 @@ class AIAnomalyMiddleware:
                                 
                                 # Handle both new format (dict with metadata) and old format (direct model)
                                 if isinstance(model_data, dict) and 'model' in model_data:
-                                    self.model = model_data['model']
+                                    model = self._select_model(model_data, app)
                                     self.logger.info(f"Loaded AI model from {model_path} (with metadata, pickle)")
                                 else:
-                                    self.model = model_data
+                                    model = self._select_model(model_data, app)
                                     self.logger.info(f"Loaded AI model from {model_path} (legacy format, pickle)")
                         else:
                             raise joblib_error
@@ -232,7 +441,7 @@ class AIAnomalyMiddleware:
             except Exception as e:
                 self.logger.error(f"Failed to load AI model: {e}")
                 self.logger.info("AI anomaly detection will continue without ML model (keyword-based only)")
-                self.model = None
+                model = None
         else:
             if not JOBLIB_AVAILABLE:
                 self.logger.warning("Joblib not available - trying pickle fallback")
@@ -247,62 +456,157 @@ class AIAnomalyMiddleware:
                                     model_data = pickle.load(f)
                                 
                                 if isinstance(model_data, dict) and 'model' in model_data:
-                                    self.model = model_data['model']
+                                    model = self._select_model(model_data, app)
                                     self.logger.info(f"Loaded AI model from {model_path} (with metadata, pickle only)")
                                 else:
-                                    self.model = model_data
+                                    model = self._select_model(model_data, app)
                                     self.logger.info(f"Loaded AI model from {model_path} (legacy format, pickle only)")
                         else:
                             self.logger.warning(f"AI model not found at {model_path}")
                     except Exception as e:
                         self.logger.error(f"Failed to load AI model with pickle: {e}")
-                        self.model = None
+                        model = None
                 else:
                     self.logger.warning("Neither joblib nor pickle available - AI anomaly detection disabled")
             if not NUMPY_AVAILABLE:
                 self.logger.warning("NumPy not available - AI anomaly detection disabled")
+        return model
+
+    def _load_artifact(self, app, model_path):
+        """Load the compiled .forest artifact for model_path if it is up to date."""
+        if load_forest_artifact is None or not NUMPY_AVAILABLE:
+            return None
+        if app.config.get('AIWAF_MODEL_EVALUATOR', 'compiled') == 'sklearn':
+            return None
+        
+        artifact = artifact_path_for(model_path)
+        if not os.path.exists(artifact):
+            return None
+        if (artifact != model_path and os.path.exists(model_path)
+                and os.path.getmtime(artifact) < os.path.getmtime(model_path)):
+            self.logger.info(f"Compiled model {artifact} is older than {model_path} - loading the pickle instead")
+            return None
+        
+        try:
+            model, _ = load_forest_artifact(artifact)
+            self.logger.info(f"Loaded AI model from {artifact} (compiled forest, memory-mapped)")
+            return model
+        except Exception as e:
+            self.logger.warning(f"Failed to load compiled model {artifact}: {e}")
+            return None
+
+    def _model_file_signature(self, model_path):
+        """(mtime_ns, size) of the model file and its compiled artifact; None where missing."""
+        paths = [model_path]
+        if artifact_path_for is not None and artifact_path_for(model_path) != model_path:
+            paths.append(artifact_path_for(model_path))
+        signature = []
+        for path in paths:
+            try:
+                stat = os.stat(path)
+                signature.append((stat.st_mtime_ns, stat.st_size))
+            except OSError:
+                signature.append(None)
+        return tuple(signature)
+
+    def _validate_model(self, model, app):
+        """Score the canary batch with a candidate model; raises ValueError if it misbehaves."""
+        recent = list(self._canary_features)
+        rows = recent or [[0.0] * FEATURE_COUNT]
+        predictions = np.asarray(model.predict(np.array(rows, dtype=float)))
+        if predictions.shape != (len(rows),) or not np.isin(predictions, (-1, 1)).all():
+            raise ValueError(f"unexpected predictions {predictions!r}")
+        
+        max_rate = app.config.get('AIWAF_MODEL_CANARY_MAX_ANOMALY_RATE', DEFAULT_MODEL_CANARY_MAX_ANOMALY_RATE)
+        if recent and max_rate is not None:
+            rate = float((predictions == -1).mean())
+            if rate > max_rate:
+                raise ValueError(f"flags {rate:.0%} of {len(rows)} recent requests as anomalous")
+
+    def _check_model_reload(self, app):
+        """Load a retrained model off the request path and swap it in once validated."""
+        interval = app.config.get('AIWAF_MODEL_RELOAD_INTERVAL', DEFAULT_MODEL_RELOAD_INTERVAL)
+        now = time.time()
+        if not interval or now - self._last_reload_check < interval:
+            return False
+        self._last_reload_check = now
+        
+        if not self._model_wanted or not NUMPY_AVAILABLE:
+            return False
+        model_path = self._get_model_path(app)
+        signature = self._model_file_signature(model_path)
+        if signature == self._model_signature or not any(signature):
+            return False
+        
+        candidate = self._read_model(app, model_path)
+        if candidate is None:
+            return False
+        try:
+            self._validate_model(candidate, app)
+        except Exception as e:
+            # Do not retry this file until it changes again
+            self._model_signature = signature
+            self.model_reload_rejections += 1
+            self.logger.warning(f"Rejected reloaded AI model from {model_path}: {e}")
+            return False
+        
+        # A single reference assignment: in-flight requests finish on the old model
+        self.model = candidate
+        self._model_signature = signature
+        self.model_reloads += 1
+        self.logger.info(f"Reloaded AI model from {model_path}")
+        return True
+
+    def _select_model(self, model_data, app):
+        """
+        Pick the estimator to score with from loaded model data.
+        Prefers the compiled NumPy forest (exported by the trainer, or compiled
+        here from a legacy IsolationForest) unless AIWAF_MODEL_EVALUATOR='sklearn'.
+        """
+        estimator = model_data['model'] if isinstance(model_data, dict) and 'model' in model_data else model_data
+        if CompiledIsolationForest is None or app.config.get('AIWAF_MODEL_EVALUATOR', 'compiled') == 'sklearn':
+            return estimator
+        try:
+            if isinstance(model_data, dict) and model_data.get('compiled'):
+                return CompiledIsolationForest.from_arrays(model_data['compiled'])
+            if hasattr(estimator, 'estimators_') and hasattr(estimator, 'offset_'):
+                return CompiledIsolationForest.from_sklearn(estimator)
+        except Exception as e:
+            self.logger.warning(f"Could not use compiled model evaluator, falling back to estimator: {e}")
+        return estimator
 
     def _is_malicious_context(self, request_obj, keyword):
         """
         Determine if a keyword appears in a malicious context.
         Only learn keywords when we have strong indicators of malicious intent.
         """
-        path = request_obj.path.lower()
-        query_string = request_obj.query_string.decode('utf-8', errors='ignore').lower()
-        
-        # Strong malicious indicators
-        malicious_indicators = [
-            # Multiple consecutive suspicious segments
-            len([seg for seg in re.split(r"\W+", path) if seg in self.malicious_keywords]) > 1,
-            
+        return self._is_malicious_path(
+            request_obj.path.lower(),
+            request_obj.query_string.decode('utf-8', errors='ignore').lower(),
+            request_obj.args,
+        )
+
+    def _is_malicious_path(self, path, query_string, arg_names):
+        """
+        Strong malicious indicators for a lowercased path and query string.
+        The verdict does not depend on the keyword, so callers evaluate it once per path.
+        """
+        return (
             # Common attack patterns in path
-            any(pattern in path for pattern in [
-                '../', '..\\', '.env', 'wp-admin', 'phpmyadmin', 'config',
-                'backup', 'database', 'mysql', 'passwd', 'shadow', 'admin',
-                'shell', 'cmd', 'exec', 'system'
-            ]),
-            
+            any(pattern in path for pattern in ATTACK_PATH_PATTERNS)
             # Suspicious query parameters
-            any(param in request_obj.args for param in ['cmd', 'exec', 'system', 'shell', 'eval']),
-            
+            or any(param in arg_names for param in SUSPICIOUS_QUERY_PARAMS)
             # Multiple directory traversal attempts
-            path.count('../') > 2 or path.count('..\\') > 2,
-            
+            or path.count('../') > 2 or path.count('..\\') > 2
             # Encoded attack patterns
-            any(encoded in path for encoded in ['%2e%2e', '%252e', '%c0%ae', '%2f', '%5c']),
-            
+            or any(encoded in path for encoded in ENCODED_ATTACK_PATTERNS)
             # SQL injection patterns
-            any(sql_pattern in query_string for sql_pattern in [
-                'union select', 'drop table', 'insert into', 'delete from', 'update set'
-            ]),
-            
+            or any(sql_pattern in query_string for sql_pattern in SQL_INJECTION_PATTERNS)
             # XSS patterns
-            any(xss_pattern in query_string for xss_pattern in [
-                '<script', 'javascript:', 'onload=', 'onerror=', 'document.cookie'
-            ])
-        ]
-        
-        return any(malicious_indicators)
+            or any(xss_pattern in query_string for xss_pattern in XSS_PATTERNS)
+            # Multiple consecutive suspicious segments
+            or len([seg for seg in re.split(r"\W+", path) if seg in self.malicious_keywords]) > 1
+        )
 
     def _is_scanning_path(self, path):
         """
@@ -352,13 +656,49 @@ class AIAnomalyMiddleware:
         """
         Check if a route exists in the Flask application.
         This is the Flask equivalent of Django's path_exists_in_django.
+        
+        The current request's path is answered from Flask's own routing result;
+        other paths are matched once and remembered until the URL map changes.
         """
         try:
-            from flask import current_app
-            from werkzeug.routing import RequestRedirect, MethodNotAllowed
+            if has_request_context() and request.path == path:
+                if request.url_rule is not None:
+                    return True
+                routing_exception = getattr(request, 'routing_exception', None)
+                if routing_exception is not None:
+                    # Route exists but wrong method or redirect
+                    return isinstance(routing_exception, (RequestRedirect, MethodNotAllowed))
             
+            url_map = current_app.url_map
+        except:
+            return False
+        
+        signature = _url_map_signature(url_map)
+        with self._route_cache_lock:
+            if signature != self._route_cache_signature:
+                self._route_cache.clear()
+                self._route_cache_signature = signature
+            cached = self._route_cache.get(path)
+            if cached is not None:
+                self._route_cache.move_to_end(path)
+                return cached
+        
+        exists = self._match_route(url_map, path)
+        
+        if self._route_cache_size:
+            with self._route_cache_lock:
+                if signature == self._route_cache_signature:
+                    self._route_cache[path] = exists
+                    while len(self._route_cache) > self._route_cache_size:
+                        self._route_cache.popitem(last=False)
+        return exists
+
+    @staticmethod
+    def _match_route(url_map, path):
+        """Match path against url_map the way an incoming GET would be routed."""
+        try:
             # Test if the path matches any route
-            adapter = current_app.url_map.bind('localhost')
+            adapter = url_map.bind('localhost')
             try:
                 adapter.match(path)
                 return True
@@ -384,30 +724,192 @@ class AIAnomalyMiddleware:
         if not known_path and not is_path_exempt(path):
             kw_hits = sum(1 for kw in self.malicious_keywords if kw in path.lower())
         
-        # Get request history for this IP
+        # Get request history for this IP (window already pruned)
         now = time.time()
         key = f"aiwaf:{ip}"
-        data = self.request_cache.get(key, [])
-        
-        # Calculate burst count (requests within last 10 seconds)
-        burst_count = sum(1 for (t, _, _, _) in data if now - t <= 10)
+        history = self.request_cache.prune(key, now)
         
-        # Calculate total 404s
-        total_404 = sum(1 for (_, _, st, _) in data if st == 404)
+        # Burst count (requests within last 10 seconds) and total 404s,
+        # both maintained incrementally by the history buffer
+        burst_count = history.burst_count(now) if history is not None else 0
+        total_404 = history.total_404 if history is not None else 0
         
         # Status code index (default to -1 for unknown)
         status_idx = -1  # Will be set when we know the response status
         
         return [path_len, kw_hits, response_time, status_idx, burst_count, total_404]
 
+    def _scoring_tier(self, model, features, ip, path, status_code):
+        """
+        Pick the cheapest tier that can decide this request.
+        The pre-filter skips inference when every cheap signal is clear: a known
+        route, no keyword hits, no 404s in the window and a low burst, and
+        neither branch of _handle_anomaly could block the request either.
+        """
+        if model is None or not NUMPY_AVAILABLE:
+            return TIER_NO_MODEL
+        if self._prefilter_enabled:
+            _, kw_hits, _, _, burst_count, total_404 = features
+            if (kw_hits == 0 and total_404 == 0 and status_code != 404
+                    and burst_count < self._prefilter_burst
+                    and self._route_exists(path)
+                    and self._cannot_block(ip, path)):
+                return TIER_PREFILTER
+        return TIER_MODEL
+
+    def _cannot_block(self, ip, path):
+        """
+        True when _handle_anomaly would not block this request whatever the model says.
+        With no history it checks the raw path for keywords plus a scanning
+        pattern (known routes included); with history it needs keyword hits on
+        an unknown path or a 404, and the caller has already ruled out 404s.
+        """
+        path_lower = path.lower()
+        raw_kw_hits = sum(1 for kw in self.malicious_keywords if kw in path_lower)
+        if raw_kw_hits >= 3 and self._is_scanning_path(path):
+            return False
+        history = self.request_cache.get(f"aiwaf:{ip}")
+        if history is None:
+            return True
+        for _, entry_path, _, _ in history.entries(self.request_cache.paths):
+            entry_lower = entry_path.lower()
+            if (any(kw in entry_lower for kw in self.malicious_keywords)
+                    and not self._route_exists(entry_path)
+                    and not is_path_exempt(entry_path)):
+                return False
+        return True
+
+    def _handle_anomaly(self, ip, features, now, path):
+        """
+        Decide whether a request the model flagged should block its IP.
+        Returns True if the IP is now blocked.
+        """
+        key = f"aiwaf:{ip}"
+        self.logger.info(f"AI detected anomaly for IP {ip}: {features}")
+        
+        # Analyze patterns before blocking (like Django implementation)
+        history = self.request_cache.get(key)
+        recent_data = (
+            history.entries(self.request_cache.paths, since=now - 300)  # Last 5 minutes
+            if history is not None else []
+        )
+        
+        if recent_data:
+            use_rust = (
+                self.app.config.get("AIWAF_USE_RUST", False)
+                and rust_backend.rust_available()
+            )
+            rust_result = None
+            if use_rust:
+                rust_entries = []
+                for entry_time, entry_path, entry_status, entry_resp_time in recent_data:
+                    entry_known_path = self._route_exists(entry_path)
+                    kw_check = not entry_known_path and not is_path_exempt(entry_path)
+                    rust_entries.append({
+                        "path_lower": entry_path.lower(),
+                        "timestamp": float(entry_time),
+                        "status": int(entry_status),
+                        "kw_check": kw_check,
+                    })
+                rust_result = rust_backend.analyze_recent_behavior(
+                    rust_entries,
+                    list(self.malicious_keywords),
+                )
+
+            if rust_result:
+                avg_kw_hits = rust_result.get("avg_kw_hits", 0.0)
+                max_404s = rust_result.get("max_404s", 0)
+                avg_burst = rust_result.get("avg_burst", 0.0)
+                total_requests = rust_result.get("total_requests", len(recent_data))
+                scanning_404s = rust_result.get("scanning_404s", 0)
+                legitimate_404s = rust_result.get("legitimate_404s", max_404s - scanning_404s)
+                should_block = rust_result.get("should_block", False)
+            else:
+                # Calculate behavior metrics (Python fallback)
+                recent_kw_hits = []
+                recent_404s = 0
+                scanning_404s = 0
+                
+                for entry_time, entry_path, entry_status, entry_resp_time in recent_data:
+                    # Calculate keyword hits for this entry
+                    entry_known_path = self._route_exists(entry_path)
+                    entry_kw_hits = 0
+                    if not entry_known_path and not is_path_exempt(entry_path):
+                        entry_kw_hits = sum(1 for kw in self.malicious_keywords if kw in entry_path.lower())
+                    recent_kw_hits.append(entry_kw_hits)
+                    
+                    # Count 404s and scanning 404s
+                    if entry_status == 404:
+                        recent_404s += 1
+                        if self._is_scanning_path(entry_path):
+                            scanning_404s += 1
+                
+                # Calculate averages and metrics
+                avg_kw_hits = sum(recent_kw_hits) / len(recent_kw_hits) if recent_kw_hits else 0
+                max_404s = recent_404s
+                # Entries within 10s of each entry, averaged (windowed count, not O(n^2))
+                avg_burst = _average_burst([entry[0] for entry in recent_data])
+                total_requests = len(recent_data)
+                legitimate_404s = max_404s - scanning_404s
+                
+                # Enhanced blocking logic - don't block legitimate behavior
+                should_block = not (
+                    avg_kw_hits < 3 and           # Allow some keyword hits
+                    scanning_404s < 5 and        # Focus on scanning 404s
+                    legitimate_404s < 20 and     # Allow legitimate 404s
+                    avg_burst < 25 and           # Allow higher burst
+                    total_requests < 150         # Allow more total requests
+                )
+
+                # High burst alone is not enough to block if there are no signals of abuse
+                if avg_kw_hits == 0 and max_404s == 0:
+                    should_block = False
+            
+            if should_block:
+                reason = f"AI anomaly + scanning behavior (404s:{max_404s}, scanning:{scanning_404s}, kw:{avg_kw_hits:.1f}, burst:{avg_burst:.1f})"
+                BlacklistManager.block(ip, reason)
+                self.logger.warning(f"Blocked IP {ip}: {reason}")
+                
+                if BlacklistManager.is_blocked(ip):
+                    return True
+        else:
+            # No recent data - be more conservative
+            current_scanning = self._is_scanning_path(path)
+            current_kw_hits = sum(1 for kw in self.malicious_keywords if kw in path.lower())
+            
+            if current_kw_hits >= 3 and current_scanning:
+                reason = f"AI anomaly + scanning behavior (kw:{current_kw_hits}, scanning_path:{path})"
+                BlacklistManager.block(ip, reason)
+                self.logger.warning(f"Blocked IP {ip}: {reason}")
+                
+                if BlacklistManager.is_blocked(ip):
+                    return True
+        return False
+
+    def _score_batch(self, items):
+        """Score queued (ip, features, now, path) items with one predict call."""
+        model = self.model
+        if model is None:
+            return [1] * len(items)
+        X = np.array([item[1] for item in items], dtype=float)
+        return model.predict(X)
+
+    def _handle_scored(self, item, prediction):
+        """Apply the behaviour analysis for an item the background scorer flagged."""
+        if prediction != -1:  # -1 indicates anomaly
+            return
+        ip, features, now, path = item
+        with self.app.app_context():
+            self._handle_anomaly(ip, features, now, path)
+
     def before_request(self):
         """Process request before it reaches the route handler."""
         # Check exemption status first - skip if exempt from AI anomaly detection
         if not should_apply_middleware('ai_anomaly'):
             return None  # Allow request to proceed without AI anomaly checking
         
-        # Periodically check if AI should be enabled/disabled
-        self._check_ai_status_periodically(current_app)
+        # AI enable/disable is re-evaluated off the request path
+        self._ensure_ai_monitor(current_app._get_current_object())
         
         # Legacy exemption check for backward compatibility
         if is_exempt(request):
@@ -438,9 +940,7 @@ class AIAnomalyMiddleware:
         start_time = getattr(g, 'aiwaf_start_time', now)
         resp_time = now - start_time
         
-        # Get request cache for this IP
         key = f"aiwaf:{ip}"
-        data = self.request_cache.get(key, [])
         
         # Calculate features for ML model
         features = self._calculate_features(request, ip, resp_time)
@@ -450,143 +950,96 @@ class AIAnomalyMiddleware:
         if status_code in STATUS_CODES:
             features[3] = STATUS_CODES.index(status_code)
         
+        # Recent traffic a reloaded model is checked against before it is swapped in
+        self._canary_features.append(features)
+        
         # Only use AI model if it's available and numpy is available
-        if self.model is not None and NUMPY_AVAILABLE:
+        # (read once: the reloader may swap it between requests)
+        model = self.model
+        tier = self._scoring_tier(model, features, ip, request.path, response.status_code)
+        self.tier_counts[tier] += 1
+        if tier != TIER_MODEL:
+            pass  # No model, or nothing suspicious enough to be worth inference
+        elif self._scorer is not None and self._scorer.submit((ip, features, now, request.path)):
+            pass  # Scored in the background; a block applies to subsequent requests
+        else:
             try:
                 X = np.array(features, dtype=float).reshape(1, -1)
                 
-                if self.model.predict(X)[0] == -1:  # -1 indicates anomaly
-                    self.logger.info(f"AI detected anomaly for IP {ip}: {features}")
-                    
-                    # Analyze patterns before blocking (like Django implementation)
-                    recent_data = [d for d in data if now - d[0] <= 300]  # Last 5 minutes
-                    
-                    if recent_data:
-                        use_rust = (
-                            self.app.config.get("AIWAF_USE_RUST", False)
-                            and rust_backend.rust_available()
-                        )
-                        rust_result = None
-                        if use_rust:
-                            rust_entries = []
-                            for entry_time, entry_path, entry_status, entry_resp_time in recent_data:
-                                entry_known_path = self._route_exists(entry_path)
-                                kw_check = not entry_known_path and not is_path_exempt(entry_path)
-                                rust_entries.append({
-                                    "path_lower": entry_path.lower(),
-                                    "timestamp": float(entry_time),
-                                    "status": int(entry_status),
-                                    "kw_check": kw_check,
-                                })
-                            rust_result = rust_backend.analyze_recent_behavior(
-                                rust_entries,
-                                list(self.malicious_keywords),
-                            )
-
-                        if rust_result:
-                            avg_kw_hits = rust_result.get("avg_kw_hits", 0.0)
-                            max_404s = rust_result.get("max_404s", 0)
-                            avg_burst = rust_result.get("avg_burst", 0.0)
-                            total_requests = rust_result.get("total_requests", len(recent_data))
-                            scanning_404s = rust_result.get("scanning_404s", 0)
-                            legitimate_404s = rust_result.get("legitimate_404s", max_404s - scanning_404s)
-                            should_block = rust_result.get("should_block", False)
-                        else:
-                            # Calculate behavior metrics (Python fallback)
-                            recent_kw_hits = []
-                            recent_404s = 0
-                            recent_burst_counts = []
-                            scanning_404s = 0
-                            
-                            for entry_time, entry_path, entry_status, entry_resp_time in recent_data:
-                                # Calculate keyword hits for this entry
-                                entry_known_path = self._route_exists(entry_path)
-                                entry_kw_hits = 0
-                                if not entry_known_path and not is_path_exempt(entry_path):
-                                    entry_kw_hits = sum(1 for kw in self.malicious_keywords if kw in entry_path.lower())
-                                recent_kw_hits.append(entry_kw_hits)
-                                
-                                # Count 404s and scanning 404s
-                                if entry_status == 404:
-                                    recent_404s += 1
-                                    if self._is_scanning_path(entry_path):
-                                        scanning_404s += 1
-                                
-                                # Calculate burst for this entry
-                                entry_burst = sum(1 for (t, _, _, _) in recent_data if abs(entry_time - t) <= 10)
-                                recent_burst_counts.append(entry_burst)
-                            
-                            # Calculate averages and metrics
-                            avg_kw_hits = sum(recent_kw_hits) / len(recent_kw_hits) if recent_kw_hits else 0
-                            max_404s = recent_404s
-                            avg_burst = sum(recent_burst_counts) / len(recent_burst_counts) if recent_burst_counts else 0
-                            total_requests = len(recent_data)
-                            legitimate_404s = max_404s - scanning_404s
-                            
-                            # Enhanced blocking logic - don't block legitimate behavior
-                            should_block = not (
-                                avg_kw_hits < 3 and           # Allow some keyword hits
-                                scanning_404s < 5 and        # Focus on scanning 404s
-                                legitimate_404s < 20 and     # Allow legitimate 404s
-                                avg_burst < 25 and           # Allow higher burst
-                                total_requests < 150         # Allow more total requests
-                            )
-
-                            # High burst alone is not enough to block if there are no signals of abuse
-                            if avg_kw_hits == 0 and max_404s == 0:
-                                should_block = False
-                        
-                        if should_block:
-                            reason = f"AI anomaly + scanning behavior (404s:{max_404s}, scanning:{scanning_404s}, kw:{avg_kw_hits:.1f}, burst:{avg_burst:.1f})"
-                            BlacklistManager.block(ip, reason)
-                            self.logger.warning(f"Blocked IP {ip}: {reason}")
-                            
-                            if BlacklistManager.is_blocked(ip):
-                                return jsonify({"error": "blocked"}), 403
-                    else:
-                        # No recent data - be more conservative
-                        current_scanning = self._is_scanning_path(request.path)
-                        current_kw_hits = sum(1 for kw in self.malicious_keywords if kw in request.path.lower())
-                        
-                        if current_kw_hits >= 3 and current_scanning:
-                            reason = f"AI anomaly + scanning behavior (kw:{current_kw_hits}, scanning_path:{request.path})"
-                            BlacklistManager.block(ip, reason)
-                            self.logger.warning(f"Blocked IP {ip}: {reason}")
-                            
-                            if BlacklistManager.is_blocked(ip):
-                                return jsonify({"error": "blocked"}), 403
+                if model.predict(X)[0] == -1:  # -1 indicates anomaly
+                    if self._handle_anomaly(ip, features, now, request.path):
+                        # after_request must return a response object, not a (body, status) tuple
+                        return make_response(jsonify({"error": "blocked"}), 403)
                                 
             except Exception as e:
                 self.logger.error(f"Error in AI anomaly detection: {e}")
         
-        # Update request cache
-        data.append((now, request.path, response.status_code, resp_time))
-        # Keep only recent data within the window
-        data = [d for d in data if now - d[0] < self.window_seconds]
-        self.request_cache[key] = data
+        # Update request history (also drops entries older than the window)
+        self.request_cache.record(key, now, request.path, response.status_code, resp_time)
         
         # Learn keywords from 404 responses on non-existent paths
-        if (response.status_code == 404 and 
-            not self._route_exists(request.path) and 
-            not is_path_exempt(request.path)):
-            
-            try:
-                from .storage import get_keyword_store
-                keyword_store = get_keyword_store()
-                
-                # Extract and learn potential malicious keywords
-                for seg in re.split(r"\W+", request.path.lower()):
-                    if (len(seg) > 3 and 
-                        seg not in self.malicious_keywords and
-                        self._is_malicious_context(request, seg)):
-                        keyword_store.add_keyword(seg)
-                        self.malicious_keywords.add(seg)  # Update local cache
-                        self.logger.info(f"Learned new malicious keyword: {seg}")
-            except Exception as e:
-                self.logger.error(f"Error learning keywords: {e}")
+        if response.status_code == 404 and not self._route_exists(request.path):
+            event = (
+                request.path,
+                request.query_string.decode('utf-8', errors='ignore'),
+                tuple(request.args),
+            )
+            if self._keyword_learner is not None:
+                self._keyword_learner.submit(event)  # dropped if the queue is full
+            else:
+                self._learn_keywords([event])
         
         return response
 
+    def _learn_keywords(self, events):
+        """
+        Learn malicious keywords from queued (path, query_string, arg_names) 404 events.
+        Runs on the keyword-learning thread: paths seen recently are skipped, the
+        context is evaluated once per path and new keywords are stored in one call.
+        """
+        known = self.malicious_keywords
+        learned = set()
+        with self.app.app_context():
+            for path, query_string, arg_names in events:
+                event_key = (path, query_string, arg_names)
+                with self._recent_404_lock:
+                    if event_key in self._recent_404_events:
+                        self._recent_404_events.move_to_end(event_key)
+                        continue
+                    self._recent_404_events[event_key] = True
+                    if len(self._recent_404_events) > DEFAULT_RECENT_404_EVENTS:
+                        self._recent_404_events.popitem(last=False)
+                
+                path_lower = path.lower()
+                candidates = {
+                    seg for seg in re.split(r"\W+", path_lower)
+                    if len(seg) > 3 and seg not in known and seg not in learned
+                }
+                if not candidates or is_path_exempt(path):
+                    continue
+                if self._is_malicious_path(path_lower, query_string.lower(), arg_names):
+                    learned |= candidates
+            
+            if not learned:
+                return
+            with self._keyword_lock:
+                # Another learner may have added keywords since known was read
+                current = self.malicious_keywords
+                learned -= current
+                if not learned:
+                    return
+                try:
+                    from .storage import get_keyword_store
+                    get_keyword_store().add_keywords(learned)
+                except Exception as e:
+                    self.logger.error(f"Error learning keywords: {e}")
+                    return
+                # Rebind rather than mutate: request threads iterate the current set
+                self.malicious_keywords = current | learned
+        
+        for seg in sorted(learned):
+            self.logger.info(f"Learned new malicious keyword: {seg}")
+
     def get_stats(self):
         """Get statistics about the anomaly detection middleware."""
         return {
@@ -595,6 +1048,14 @@ class AIAnomalyMiddleware:
             'joblib_available': JOBLIB_AVAILABLE,
             'pickle_available': PICKLE_AVAILABLE,
             'cached_ips': len(self.request_cache),
+            'cached_routes': len(self._route_cache),
+            'log_lines': self._log_index.total_lines if self._log_index is not None else None,
+            'model_reloads': self.model_reloads,
+            'model_reload_rejections': self.model_reload_rejections,
+            'scoring_mode': 'async' if self._scorer is not None else 'sync',
+            'scoring_tiers': dict(self.tier_counts),
+            'async_scoring': self._scorer.stats() if self._scorer is not None else None,
+            'keyword_learning': self._keyword_learner.stats() if self._keyword_learner is not None else None,
             'malicious_keywords': len(self.malicious_keywords),
             'window_seconds': self.window_seconds
         }
@@ -0,0 +1,211 @@
+"""
+Background micro-batch workers for the AI anomaly detector.
+
+Requests push work onto a bounded queue and return immediately. A daemon
+thread drains the queue every ``interval_ms`` or every ``batch_size`` items
+and processes the whole batch at once. ``AsyncModelScorer`` scores a batch
+with one ``predict`` call and hands each (item, prediction) pair back to the
+middleware, which applies any resulting block through BlacklistManager for
+subsequent requests.
+"""
+
+import logging
+import os
+import queue
+import threading
+import time
+
+OVERFLOW_SYNC = "sync"
+OVERFLOW_DROP = "drop"
+OVERFLOW_DROP_OLDEST = "drop_oldest"
+OVERFLOW_POLICIES = (OVERFLOW_SYNC, OVERFLOW_DROP, OVERFLOW_DROP_OLDEST)
+
+DEFAULT_BATCH_SIZE = 64
+DEFAULT_BATCH_INTERVAL_MS = 20
+DEFAULT_QUEUE_SIZE = 10000
+
+_STOP = object()
+
+
+class MicroBatchWorker:
+    """Calls ``process(items)`` on micro-batches of queued items on a background thread.
+
+    The thread starts on first submit and is restarted after a fork, so it is
+    safe to create before worker processes are spawned.
+    """
+
+    thread_name = "aiwaf-batch"
+    description = "batch processing"
+
+    def __init__(self, process, batch_size=DEFAULT_BATCH_SIZE,
+                 interval_ms=DEFAULT_BATCH_INTERVAL_MS, queue_size=DEFAULT_QUEUE_SIZE,
+                 overflow=OVERFLOW_SYNC, logger=None, name=None, description=None):
+        if overflow not in OVERFLOW_POLICIES:
+            raise ValueError(f"Unknown overflow policy {overflow!r}; expected one of {OVERFLOW_POLICIES}")
+        self.process = process
+        self.thread_name = name or self.thread_name
+        self.description = description or self.description
+        self.batch_size = max(1, int(batch_size))
+        self.interval = max(0.0, float(interval_ms) / 1000.0)
+        self.queue_size = max(1, int(queue_size))
+        self.overflow = overflow
+        self.logger = logger or logging.getLogger(__name__)
+
+        self.submitted = 0
+        self.processed = 0
+        self.batches = 0
+        self.dropped = 0
+        self.overflowed = 0
+
+        self._queue = None
+        self._thread = None
+        self._pid = None
+        self._stopping = False
+        self._lock = threading.Lock()
+
+    def _ensure_started(self):
+        if self._thread is not None and self._pid == os.getpid() and self._thread.is_alive():
+            return
+        with self._lock:
+            if self._thread is not None and self._pid == os.getpid() and self._thread.is_alive():
+                return
+            # After a fork the parent's thread does not exist here; start fresh.
+            self._queue = queue.Queue(maxsize=self.queue_size)
+            self._pid = os.getpid()
+            self._stopping = False
+            self._thread = threading.Thread(target=self._run, name=self.thread_name, daemon=True)
+            self._thread.start()
+
+    def submit(self, item):
+        """Queue item for scoring.
+
+        Returns False when the queue is full and the overflow policy is
+        ``sync``; the caller should then score the item itself.
+        """
+        self._ensure_started()
+        q = self._queue
+        try:
+            q.put_nowait(item)
+        except queue.Full:
+            self.overflowed += 1
+            if self.overflow == OVERFLOW_SYNC:
+                return False
+            if self.overflow == OVERFLOW_DROP:
+                self.dropped += 1
+                return True
+            # drop_oldest: make room by discarding the head of the queue
+            try:
+                q.get_nowait()
+                q.task_done()
+                self.dropped += 1
+            except queue.Empty:
+                pass
+            try:
+                q.put_nowait(item)
+            except queue.Full:
+                self.dropped += 1
+                return True
+        self.submitted += 1
+        return True
+
+    def _next_batch(self, q):
+        try:
+            first = q.get(timeout=0.5)
+        except queue.Empty:
+            return []
+        if first is _STOP:
+            q.task_done()
+            return []
+        batch = [first]
+        deadline = time.monotonic() + self.interval
+        while len(batch) < self.batch_size:
+            remaining = deadline - time.monotonic()
+            try:
+                item = q.get(timeout=remaining) if remaining > 0 else q.get_nowait()
+            except queue.Empty:
+                break
+            if item is _STOP:
+                q.task_done()
+                break
+            batch.append(item)
+        return batch
+
+    def _run(self):
+        q = self._queue
+        while not self._stopping:
+            batch = self._next_batch(q)
+            if not batch:
+                continue
+            try:
+                self.process(batch)
+                self.batches += 1
+                self.processed += len(batch)
+            except Exception as e:
+                self.logger.error(f"Error in {self.description}: {e}")
+            finally:
+                for _ in batch:
+                    q.task_done()
+
+    def flush(self, timeout=5.0):
+        """Wait until every queued item has been processed; returns True if drained."""
+        q = self._queue
+        if q is None:
+            return True
+        deadline = time.monotonic() + timeout
+        while q.unfinished_tasks:
+            if time.monotonic() >= deadline:
+                return False
+            time.sleep(0.001)
+        return True
+
+    def stop(self, timeout=1.0):
+        self._stopping = True
+        thread = self._thread
+        if thread is not None and thread.is_alive():
+            try:
+                self._queue.put_nowait(_STOP)  # wake the worker if it is idle
+            except queue.Full:
+                pass
+            thread.join(timeout)
+        self._thread = None
+
+    def stats(self):
+        return {
+            "submitted": self.submitted,
+            "processed": self.processed,
+            "batches": self.batches,
+            "dropped": self.dropped,
+            "overflowed": self.overflowed,
+            "queued": self._queue.qsize() if self._queue is not None else 0,
+        }
+
+
+class AsyncModelScorer(MicroBatchWorker):
+    """Scores queued items in micro-batches on a background thread.
+
+    ``score_batch(items)`` returns one prediction per item; ``handle(item,
+    prediction)`` is called for each.
+    """
+
+    thread_name = "aiwaf-scorer"
+    description = "batched AI scoring"
+
+    def __init__(self, score_batch, handle, **kwargs):
+        super().__init__(self._score_and_handle, **kwargs)
+        self.score_batch = score_batch
+        self.handle = handle
+
+    @property
+    def scored(self):
+        return self.processed
+
+    def _score_and_handle(self, batch):
+        predictions = self.score_batch(batch)
+        for item, prediction in zip(batch, predictions):
+            try:
+                self.handle(item, prediction)
+            except Exception as e:
+                self.logger.error(f"Error handling scored request: {e}")
+
+    def stats(self):
+        return dict(super().stats(), scored=self.processed)
@@ -576,7 +576,8 @@ class AIWAFManager:
             print(f"❌ Error importing configuration: {e}")
             return False
     
-    def analyze_logs(self, log_dir: Optional[str] = None, log_format: str = 'combined'):
+    def analyze_logs(self, log_dir: Optional[str] = None, log_format: str = 'combined',
+                     jobs: Optional[int] = None):
         """Analyze AIWAF logs and show statistics."""
         try:
             from .logging_middleware import analyze_access_logs
@@ -597,7 +598,7 @@ class AIWAFManager:
                     actual_log_dir = 'logs'
                     print(f"📁 Using default log directory: {actual_log_dir}")
             
-            stats = analyze_access_logs(actual_log_dir, log_format)
+            stats = analyze_access_logs(actual_log_dir, log_format, jobs=jobs)
             
             if 'error' in stats:
                 print(f"❌ {stats['error']}")
@@ -657,12 +658,13 @@ class AIWAFManager:
             print(f"❌ Error analyzing logs: {e}")
             return False
 
-    def geoip_traffic_summary(self, log_dir: Optional[str] = None, top: int = 10, limit: int = 0):
+    def geoip_traffic_summary(self, log_dir: Optional[str] = None, top: int = 10, limit: int = 0,
+                              jobs: Optional[int] = None):
         """Summarize request traffic by country using the GeoIP database."""
         try:
             from flask import Flask
             from .trainer import _trainer
-            from .geoip import lookup_country_name
+            from .geoip import batch_country_counts
 
             top_n = max(1, int(top))
             max_lines = max(0, int(limit))
@@ -680,34 +682,27 @@ class AIWAFManager:
             app.config['AIWAF_LOG_DIR'] = actual_log_dir
             _trainer.init_app(app)
 
-            lines = _trainer._read_all_logs()
-            if not lines:
+            # --limit bounds the parsing itself, not just what is counted
+            line_count, records = _trainer._collect_records(jobs=jobs, limit=max_lines or None)
+            if not line_count:
                 print("No log lines found – check AIWAF_LOG_DIR setting.")
                 return False
 
-            ip_counts = Counter()
-            processed = 0
-            for line in lines:
-                rec = _trainer._parse(line)
-                if not rec:
-                    continue
-                ip_counts[rec["ip"]] += 1
-                processed += 1
-                if max_lines and processed >= max_lines:
-                    break
+            ips = records.ips
+            ip_ids = records.ip_ids[:max_lines] if max_lines else records.ip_ids
+            ip_counts = Counter({ips[ip_id]: count for ip_id, count in Counter(ip_ids).items()})
 
             if not ip_counts:
                 print("No valid log entries to process.")
                 return False
 
-            country_counts = Counter()
-            unknown = 0
-            for ip, count in ip_counts.items():
-                name = lookup_country_name(ip, cache_prefix="aiwaf:geo:summary:", cache_seconds=3600)
-                if name:
-                    country_counts[name] += count
-                else:
-                    unknown += count
+            def _progress(done, total):
+                print(f"\r   Resolved {done}/{total} IPs", end="", flush=True)
+                if done >= total:
+                    print()
+
+            country_counts = batch_country_counts(ip_counts, jobs=jobs, progress=_progress)
+            unknown = country_counts.pop(None, 0)
 
             print(f"GeoIP traffic summary (top {top_n}):")
             for code, count in country_counts.most_common(top_n):
@@ -720,7 +715,8 @@ class AIWAFManager:
             return False
     
     def train_model(self, log_dir: Optional[str] = None, disable_ai: bool = False, 
-                   min_ai_logs: int = 10000, force_ai: bool = False, verbose: bool = False):
+                   min_ai_logs: int = 10000, force_ai: bool = False, verbose: bool = False,
+                   jobs: Optional[int] = None, full: bool = False):
         """Train AIWAF AI model from access logs."""
         try:
             from flask import Flask
@@ -749,6 +745,8 @@ class AIWAFManager:
                 print(f"AI training: {'disabled' if disable_ai else 'enabled'}")
                 print(f"Min AI logs threshold: {min_ai_logs}")
                 print(f"Force AI: {force_ai}")
+                print(f"Parse jobs: {jobs if jobs is not None else 1}")
+                print(f"Mode: {'full rebuild' if full else 'incremental'}")
                 print("=" * 40)
             
             # Create minimal Flask app for training
@@ -760,6 +758,8 @@ class AIWAFManager:
             app.config['AIWAF_AI_CONTAMINATION'] = 0.05
             app.config['AIWAF_MIN_AI_LOGS'] = min_ai_logs
             app.config['AIWAF_FORCE_AI'] = force_ai
+            if jobs is not None:
+                app.config['AIWAF_LOG_PARSE_JOBS'] = jobs
             
             # Optional settings (can be customized)
             app.config['AIWAF_EXEMPT_PATHS'] = {'/health', '/status', '/favicon.ico'}
@@ -771,7 +771,7 @@ class AIWAFManager:
             
             # Run training with app context
             with app.app_context():
-                train_from_logs(app, disable_ai=disable_ai)
+                train_from_logs(app, disable_ai=disable_ai, full=full)
             
             if verbose:
                 print("\n✅ Training completed successfully!")
@@ -858,6 +858,8 @@ class AIWAFManager:
                                 for key, value in model_data.items():
                                     if key == 'model':
                                         print(f"   Model Type: {type(value).__name__}")
+                                    elif key == 'compiled':
+                                        print(f"   compiled: {len(value['roots'])} trees, {len(value['feature'])} nodes")
                                     else:
                                         print(f"   {key}: {value}")
                             else:
@@ -882,6 +884,8 @@ class AIWAFManager:
                                 print(f"   Current sklearn: {sklearn.__version__}")
                             except ImportError:
                                 print(f"   Current sklearn: Not installed")
+                            
+                            self._print_serving_format(model_path)
                         
                         return True
                         
@@ -905,6 +909,33 @@ class AIWAFManager:
             return False
 
 
+    def _print_serving_format(self, model_path):
+        """Show which model file the middleware will load."""
+        import os
+        from .forest import artifact_path_for, read_forest_artifact_info
+        
+        artifact = artifact_path_for(model_path)
+        print(f"\n🚀 Serving Format:")
+        if not os.path.exists(artifact):
+            print(f"   Format: pickle (joblib)")
+            print(f"   💡 Retrain to also write a memory-mappable {os.path.basename(artifact)}")
+            return
+        
+        try:
+            header = read_forest_artifact_info(artifact)
+        except (OSError, ValueError) as e:
+            print(f"   Format: pickle (joblib) - unreadable artifact {artifact}: {e}")
+            return
+        
+        stale = os.path.getmtime(artifact) < os.path.getmtime(model_path)
+        print(f"   Format: {header['format']} (memory-mapped){' - older than pickle, not used' if stale else ''}")
+        print(f"   Artifact: {artifact}")
+        print(f"   Trees: {header['arrays']['roots']['shape'][0]}")
+        print(f"   Nodes: {header['arrays']['feature']['shape'][0]}")
+        for key, value in header.get('metadata', {}).items():
+            print(f"   {key}: {value}")
+
+
 class RouteNode:
     def __init__(self, name, full_path):
         self.name = name
@@ -1111,6 +1142,8 @@ def main():
     logs_parser.add_argument('--log-dir', help='Custom log directory path')
     logs_parser.add_argument('--format', choices=['combined', 'common', 'csv', 'json'], 
                            default='combined', help='Log format to analyze')
+    logs_parser.add_argument('--jobs', type=int, default=None,
+                           help='Worker processes for parsing large logs (default: 1, 0 = one per CPU)')
     
     # Train command
     train_parser = subparsers.add_parser('train', help='Train AI model from logs')
@@ -1123,6 +1156,10 @@ def main():
                             help='Force AI training even with insufficient log data')
     train_parser.add_argument('--verbose', '-v', action='store_true',
                             help='Enable verbose output')
+    train_parser.add_argument('--jobs', type=int, default=None,
+                            help='Worker processes for log parsing (default: 1, 0 = one per CPU)')
+    train_parser.add_argument('--full', action='store_true',
+                            help='Ignore the training checkpoint and re-read all logs')
     
     # Model diagnostics command
     model_parser = subparsers.add_parser('model', help='Model diagnostics and management')
@@ -1147,6 +1184,9 @@ def main():
     geo_summary_parser.add_argument('--limit', type=int, default=0,
                                     help='Limit number of log lines processed (default: 0, no limit)')
     geo_summary_parser.add_argument('--log-dir', help='Custom log directory path (default: auto)')
+    geo_summary_parser.add_argument('--jobs', type=int, default=None,
+                                    help='Worker processes for log parsing and GeoIP lookups '
+                                         '(default: serial parsing, CPU count for lookups; 0 = one per CPU)')
 
     # Route shell command
     route_shell_parser = subparsers.add_parser('route-shell', help='Interactive route browser for exemptions')
@@ -1244,10 +1284,11 @@ def main():
     
     elif args.command == 'logs':
         log_format = getattr(args, 'format', 'combined')
-        manager.analyze_logs(args.log_dir, log_format)
+        manager.analyze_logs(args.log_dir, log_format, args.jobs)
     
     elif args.command == 'train':
-        manager.train_model(args.log_dir, args.disable_ai, args.min_ai_logs, args.force_ai, args.verbose)
+        manager.train_model(args.log_dir, args.disable_ai, args.min_ai_logs, args.force_ai, args.verbose,
+                            args.jobs, args.full)
     
     elif args.command == 'model':
         # Handle model diagnostics
@@ -1263,7 +1304,7 @@ def main():
         manager.import_config(args.filename)
 
     elif args.command == 'geo-summary':
-        manager.geoip_traffic_summary(args.log_dir, args.top, args.limit)
+        manager.geoip_traffic_summary(args.log_dir, args.top, args.limit, args.jobs)
 
     elif args.command == 'route-shell':
         try:
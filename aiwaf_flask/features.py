@@ -0,0 +1,144 @@
+"""
+Columnar feature extraction for the AIWAF trainer.
+
+Works directly on a ``LogRecords`` store instead of looping over records:
+
+- burst counts come from each IP's sorted epochs with ``searchsorted`` rather
+  than rescanning every timestamp of the IP for every record;
+- 404 totals are grouped by IP id in one pass;
+- path length and keyword hits are computed once per unique path and
+  gathered by path id.
+
+The resulting columns are the ones the per-record loop produced, in the same
+order: ip, path_len, kw_hits, resp_time, status_idx, burst_count, total_404.
+NumPy is used when installed; otherwise the same algorithm runs on lists with
+``bisect``.
+"""
+
+from bisect import bisect_left
+from collections import defaultdict
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+BURST_WINDOW_SECONDS = 10
+
+
+def _settle(epoch, seg, lo, window):
+    """Nudge a searchsorted index so it agrees exactly with ``epoch - t <= window``."""
+    if lo > 0 and epoch - seg[lo - 1] <= window:
+        return lo - 1
+    if lo < len(seg) and epoch - seg[lo] > window:
+        return lo + 1
+    return lo
+
+
+def burst_counts(records, window=BURST_WINDOW_SECONDS):
+    """For each record, count records of the same IP with ``epoch - t <= window``.
+
+    Later records of the IP count as well, as they always have: the count is
+    the IP's total minus its records older than ``epoch - window``.
+    """
+    n = len(records)
+    if np is None:
+        grouped = defaultdict(list)
+        for ip_id, epoch in zip(records.ip_ids, records.epochs):
+            grouped[ip_id].append(epoch)
+        for seg in grouped.values():
+            seg.sort()
+        counts = []
+        for ip_id, epoch in zip(records.ip_ids, records.epochs):
+            seg = grouped[ip_id]
+            lo = _settle(epoch, seg, bisect_left(seg, epoch - window), window)
+            counts.append(len(seg) - lo)
+        return counts
+
+    ip_ids = np.asarray(records.ip_ids)
+    epochs = np.asarray(records.epochs)
+    counts = np.ones(n, dtype=np.int64)
+    if n == 0:
+        return counts
+    order = np.lexsort((epochs, ip_ids))
+    sorted_ips = ip_ids[order]
+    sorted_epochs = epochs[order]
+    bounds = np.flatnonzero(sorted_ips[1:] != sorted_ips[:-1]) + 1
+    starts = np.concatenate(([0], bounds))
+    ends = np.concatenate((bounds, [n]))
+    for start, end in zip(starts[ends - starts > 1], ends[ends - starts > 1]):
+        seg = sorted_epochs[start:end]
+        lo = np.searchsorted(seg, seg - window, side="left")
+        # Float rounding in (epoch - window) can put the index one step off.
+        prev = np.maximum(lo - 1, 0)
+        lo = np.where((lo > 0) & (seg - seg[prev] <= window), prev, lo)
+        cur = np.minimum(lo, len(seg) - 1)
+        lo = np.where((lo < len(seg)) & (seg - seg[cur] > window), lo + 1, lo)
+        counts[order[start:end]] = (end - start) - lo
+    return counts
+
+
+def count_404s(records, path_exempt):
+    """Return (ip_404, ip_404_login): per-IP 404 counts on normal and exempt paths.
+
+    ``path_exempt`` holds one flag per unique path (indexed by path id).
+    """
+    ip_404 = defaultdict(int)
+    ip_404_login = defaultdict(int)
+    if np is not None and len(records):
+        statuses = np.asarray(records.statuses)
+        hits = statuses == 404
+        exempt = np.asarray(path_exempt, dtype=bool)[np.asarray(records.path_ids)]
+        ip_ids = np.asarray(records.ip_ids)
+        size = len(records.ips)
+        for target, mask in ((ip_404, hits & ~exempt), (ip_404_login, hits & exempt)):
+            totals = np.bincount(ip_ids[mask], minlength=size)
+            for ip_id in np.flatnonzero(totals):
+                target[records.ips[ip_id]] = int(totals[ip_id])
+        return ip_404, ip_404_login
+
+    for ip_id, path_id, status in zip(records.ip_ids, records.path_ids, records.statuses):
+        if status == 404:
+            target = ip_404_login if path_exempt[path_id] else ip_404
+            target[records.ips[ip_id]] += 1
+    return ip_404, ip_404_login
+
+
+def extract_features(records, ip_404, path_kw_hits, status_codes):
+    """Build the training feature columns for every record.
+
+    ``path_kw_hits`` is one keyword-hit count per unique path, ``ip_404`` maps
+    IP to its 404 total and ``status_codes`` lists the status strings that
+    get an index (others are -1).
+    """
+    status_index = {int(code): i for i, code in enumerate(status_codes)}
+    path_lens = [len(path) for path in records.paths]
+    ip_totals = [ip_404.get(ip, 0) for ip in records.ips]
+    bursts = burst_counts(records)
+
+    if np is None:
+        return {
+            "ip": [records.ips[i] for i in records.ip_ids],
+            "path_len": [path_lens[i] for i in records.path_ids],
+            "kw_hits": [path_kw_hits[i] for i in records.path_ids],
+            "resp_time": list(records.resp_times),
+            "status_idx": [status_index.get(s, -1) for s in records.statuses],
+            "burst_count": bursts,
+            "total_404": [ip_totals[i] for i in records.ip_ids],
+        }
+
+    ip_ids = np.asarray(records.ip_ids)
+    path_ids = np.asarray(records.path_ids)
+    statuses = np.asarray(records.statuses)
+    status_idx = np.full(len(records), -1, dtype=np.int64)
+    for code, index in status_index.items():
+        status_idx[statuses == code] = index
+    return {
+        "ip": np.asarray(records.ips, dtype=object)[ip_ids],
+        "path_len": np.asarray(path_lens, dtype=np.int64)[path_ids],
+        "kw_hits": np.asarray(path_kw_hits, dtype=np.int64)[path_ids],
+        "resp_time": np.array(records.resp_times, dtype=np.float64),
+        "status_idx": status_idx,
+        "burst_count": bursts,
+        "total_404": np.asarray(ip_totals, dtype=np.int64)[ip_ids],
+    }
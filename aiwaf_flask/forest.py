@@ -0,0 +1,260 @@
+"""
+Compiled IsolationForest for inference without scikit-learn.
+
+The trainer flattens a fitted ``sklearn.ensemble.IsolationForest`` into a few
+NumPy arrays: every tree's nodes laid end to end, with per-node split feature,
+threshold, child indices and the path length credited when a sample ends at
+that node. ``CompiledIsolationForest`` walks all trees for all samples at once
+and reproduces ``predict``/``decision_function``/``score_samples``.
+
+Compiled forests are saved as a standalone ``.forest`` artifact: a magic
+string, a JSON header and 64-byte aligned raw arrays. Loading memory-maps the
+file, so every worker process shares the same physical pages and start-up does
+no deserialization.
+"""
+
+import json
+import mmap
+import os
+import struct
+
+import numpy as np
+
+FORMAT_VERSION = 1
+
+# Array names making up a compiled forest, as stored in artifacts
+ARRAY_FIELDS = ("feature", "threshold", "left", "right", "leaf_value", "roots")
+SCALAR_FIELDS = ("format_version", "max_depth", "max_samples", "offset", "n_features")
+
+ARTIFACT_FORMAT = "aiwaf-forest"
+ARTIFACT_SUFFIX = ".forest"
+_ARTIFACT_MAGIC = b"AIWAFFOR"
+_HEADER_LEN = struct.Struct("<Q")
+_ALIGN = 64
+
+
+def _average_path_length(n_samples):
+    """Expected path length of an unsuccessful BST search over n samples."""
+    n = np.asarray(n_samples, dtype=float)
+    result = np.zeros_like(n)
+    two = n == 2
+    rest = n > 2
+    result[two] = 1.0
+    result[rest] = 2.0 * (np.log(n[rest] - 1.0) + np.euler_gamma) - 2.0 * (n[rest] - 1.0) / n[rest]
+    return result
+
+
+def export_isolation_forest(model):
+    """Flatten a fitted IsolationForest into a dict of NumPy arrays + scalars."""
+    n_features = int(model.n_features_in_)
+    subsample = getattr(model, "_max_features", n_features) != n_features
+
+    features, thresholds, lefts, rights, leaf_values, roots = [], [], [], [], [], []
+    offset = 0
+    max_depth = 0
+    for tree, tree_features in zip(model.estimators_, model.estimators_features_):
+        t = tree.tree_
+        n_nodes = t.node_count
+        is_leaf = t.children_left == -1
+
+        depth = np.zeros(n_nodes, dtype=np.int64)
+        for node in range(n_nodes):
+            if not is_leaf[node]:
+                depth[t.children_left[node]] = depth[node] + 1
+                depth[t.children_right[node]] = depth[node] + 1
+        max_depth = max(max_depth, int(depth.max()))
+
+        feature = np.where(is_leaf, -1, t.feature).astype(np.int32)
+        if subsample:
+            # Trees were fitted on a column subset; point back at the full vector.
+            mapped = np.asarray(tree_features)[np.clip(feature, 0, None)]
+            feature = np.where(is_leaf, -1, mapped).astype(np.int32)
+
+        features.append(feature)
+        thresholds.append(t.threshold.astype(np.float64))
+        # Leaves point at themselves so extra traversal steps are no-ops.
+        node_ids = np.arange(n_nodes)
+        lefts.append((np.where(is_leaf, node_ids, t.children_left) + offset).astype(np.int32))
+        rights.append((np.where(is_leaf, node_ids, t.children_right) + offset).astype(np.int32))
+        leaf_values.append(depth + _average_path_length(t.n_node_samples))
+        roots.append(offset)
+        offset += n_nodes
+
+    return {
+        "format_version": FORMAT_VERSION,
+        "feature": np.concatenate(features),
+        "threshold": np.concatenate(thresholds),
+        "left": np.concatenate(lefts),
+        "right": np.concatenate(rights),
+        "leaf_value": np.concatenate(leaf_values),
+        "roots": np.asarray(roots, dtype=np.int32),
+        "max_depth": max_depth,
+        "max_samples": int(model.max_samples_),
+        "offset": float(model.offset_),
+        "n_features": n_features,
+    }
+
+
+class CompiledIsolationForest:
+    """Vectorised IsolationForest evaluator over exported node arrays."""
+
+    def __init__(self, feature, threshold, left, right, leaf_value, roots,
+                 max_depth, max_samples, offset, n_features):
+        self.feature = feature
+        self.threshold = threshold
+        self.left = left
+        self.right = right
+        self.leaf_value = leaf_value
+        self.roots = roots
+        self.max_depth = int(max_depth)
+        self.offset_ = float(offset)
+        self.n_features_in_ = int(n_features)
+        self.max_samples_ = int(max_samples)
+        self.artifact_path = None
+        self.memory_mapped = False
+        self._denominator = len(roots) * float(_average_path_length([self.max_samples_])[0])
+
+    @classmethod
+    def from_sklearn(cls, model):
+        return cls.from_arrays(export_isolation_forest(model))
+
+    @classmethod
+    def from_arrays(cls, arrays):
+        version = int(arrays.get("format_version", FORMAT_VERSION))
+        if version > FORMAT_VERSION:
+            raise ValueError(f"Compiled forest format {version} is newer than supported ({FORMAT_VERSION})")
+        return cls(
+            *(arrays[name] for name in ARRAY_FIELDS),
+            max_depth=arrays["max_depth"],
+            max_samples=arrays["max_samples"],
+            offset=arrays["offset"],
+            n_features=arrays["n_features"],
+        )
+
+    def to_arrays(self):
+        arrays = {name: getattr(self, name) for name in ARRAY_FIELDS}
+        arrays.update(
+            format_version=FORMAT_VERSION,
+            max_depth=self.max_depth,
+            max_samples=self.max_samples_,
+            offset=self.offset_,
+            n_features=self.n_features_in_,
+        )
+        return arrays
+
+    @property
+    def n_estimators(self):
+        return len(self.roots)
+
+    def _path_lengths(self, X):
+        # Trees split float32 inputs; compare the same way to agree at thresholds.
+        X = np.asarray(X, dtype=np.float32).astype(np.float64)
+        if X.ndim == 1:
+            X = X.reshape(1, -1)
+        if X.shape[1] != self.n_features_in_:
+            raise ValueError(f"X has {X.shape[1]} features, model expects {self.n_features_in_}")
+        rows = np.arange(X.shape[0])[:, None]
+        nodes = np.broadcast_to(self.roots, (X.shape[0], len(self.roots)))
+        for _ in range(self.max_depth):
+            feature = self.feature[nodes]
+            values = X[rows, np.maximum(feature, 0)]
+            nodes = np.where(values <= self.threshold[nodes], self.left[nodes], self.right[nodes])
+        return self.leaf_value[nodes].sum(axis=1)
+
+    def score_samples(self, X):
+        depths = self._path_lengths(X)
+        if not self._denominator:
+            return -np.ones_like(depths)
+        return -(2.0 ** (-depths / self._denominator))
+
+    def decision_function(self, X):
+        return self.score_samples(X) - self.offset_
+
+    def predict(self, X):
+        return np.where(self.decision_function(X) < 0, -1, 1)
+
+
+def artifact_path_for(model_path):
+    """Path of the compiled artifact that accompanies a pickled model."""
+    model_path = str(model_path)
+    if model_path.endswith(ARTIFACT_SUFFIX):
+        return model_path
+    return os.path.splitext(model_path)[0] + ARTIFACT_SUFFIX
+
+
+def _align(n):
+    return (n + _ALIGN - 1) // _ALIGN * _ALIGN
+
+
+def save_forest_artifact(path, arrays, metadata=None):
+    """Write exported forest arrays to path atomically."""
+    layout = {}
+    blobs = []
+    offset = 0
+    for name in ARRAY_FIELDS:
+        array = np.ascontiguousarray(arrays[name])
+        offset = _align(offset)
+        layout[name] = {"dtype": array.dtype.str, "shape": list(array.shape), "offset": offset}
+        blobs.append((offset, array.tobytes()))
+        offset += array.nbytes
+
+    header = json.dumps({
+        "format": ARTIFACT_FORMAT,
+        "scalars": {name: arrays[name] for name in SCALAR_FIELDS if name in arrays},
+        "arrays": layout,
+        "metadata": metadata or {},
+    }, default=str).encode("utf-8")
+    data_start = _align(len(_ARTIFACT_MAGIC) + _HEADER_LEN.size + len(header))
+
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(_ARTIFACT_MAGIC)
+        f.write(_HEADER_LEN.pack(len(header)))
+        f.write(header)
+        for blob_offset, blob in blobs:
+            f.seek(data_start + blob_offset)
+            f.write(blob)
+    os.replace(tmp_path, path)
+
+
+def _read_header(f):
+    if f.read(len(_ARTIFACT_MAGIC)) != _ARTIFACT_MAGIC:
+        raise ValueError("Not an AIWAF compiled forest artifact")
+    (length,) = _HEADER_LEN.unpack(f.read(_HEADER_LEN.size))
+    header = json.loads(f.read(length).decode("utf-8"))
+    header["data_start"] = _align(len(_ARTIFACT_MAGIC) + _HEADER_LEN.size + length)
+    return header
+
+
+def read_forest_artifact_info(path):
+    """Return the artifact header (format, scalars, array layout, metadata)."""
+    with open(path, "rb") as f:
+        return _read_header(f)
+
+
+def load_forest_artifact(path, use_mmap=True):
+    """Load a compiled forest; returns (CompiledIsolationForest, metadata).
+
+    With use_mmap the arrays are read-only views onto a shared memory map of
+    the file, so the OS page cache backs every process that loads it.
+    """
+    with open(path, "rb") as f:
+        header = _read_header(f)
+        if use_mmap:
+            buffer = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        else:
+            f.seek(0)
+            buffer = f.read()
+
+    arrays = dict(header["scalars"])
+    for name, spec in header["arrays"].items():
+        dtype = np.dtype(spec["dtype"])
+        count = int(np.prod(spec["shape"], dtype=np.int64))
+        arrays[name] = np.frombuffer(
+            buffer, dtype=dtype, count=count, offset=header["data_start"] + spec["offset"]
+        ).reshape(spec["shape"])
+
+    forest = CompiledIsolationForest.from_arrays(arrays)
+    forest.artifact_path = path
+    forest.memory_mapped = bool(use_mmap)
+    return forest, header.get("metadata", {})
@@ -1,10 +1,15 @@
 # Flask GeoBlockMiddleware
+import time
+
 from flask import request, jsonify
 from .utils import get_ip, is_exempt
 from .blacklist_manager import BlacklistManager
 from .exemption_decorators import should_apply_middleware
 from .geoip import get_country_for_ip
-from .storage import get_geo_blocked_countries
+from .geo_ranges import GeoRangeResolver, RANGE_MODE_ALLOW, RANGE_MODE_BLOCK
+from .storage import get_geo_blocked_countries, get_geo_blocked_countries_version, DEFAULT_DATA_DIR
+
+DEFAULT_GEO_BLOCKED_REFRESH_SECONDS = 60
 
 
 def _normalize_country_list(value):
@@ -21,13 +26,125 @@ def _normalize_country_list(value):
     return normalized
 
 
+def _country_index(code):
+    """Slot of a two-letter A-Z code in the verdict bitmap, or None."""
+    if len(code) != 2:
+        return None
+    a = ord(code[0]) - 65
+    b = ord(code[1]) - 65
+    if 0 <= a < 26 and 0 <= b < 26:
+        return a * 26 + b
+    return None
+
+
+class GeoBlockPolicy:
+    """Normalized allow/block sets plus a 26x26 verdict bitmap over country codes."""
+
+    __slots__ = ("allow", "block", "dynamic", "verdicts")
+
+    def __init__(self, allow, block, dynamic):
+        self.allow = frozenset(allow)
+        self.block = frozenset(block)
+        self.dynamic = frozenset(dynamic)
+        if self.allow:
+            verdicts = bytearray(b"\x01" * 676)
+            for code in self.allow:
+                index = _country_index(code)
+                if index is not None:
+                    verdicts[index] = 0
+        else:
+            verdicts = bytearray(676)
+            for code in self.block | self.dynamic:
+                index = _country_index(code)
+                if index is not None:
+                    verdicts[index] = 1
+        self.verdicts = bytes(verdicts)
+
+    @property
+    def active(self):
+        return bool(self.allow or self.block or self.dynamic)
+
+    @property
+    def range_mode(self):
+        if self.allow:
+            return RANGE_MODE_ALLOW, self.allow
+        return RANGE_MODE_BLOCK, self.block | self.dynamic
+
+    def is_blocked(self, country):
+        index = _country_index(country)
+        if index is not None:
+            return bool(self.verdicts[index])
+        # Codes outside A-Z pairs (e.g. "EU", numeric or longer) use the sets.
+        if self.allow:
+            return country not in self.allow
+        return country in self.block or country in self.dynamic
+
+
 class GeoBlockMiddleware:
     def __init__(self, app=None):
         self.app = app
+        self._ranges = GeoRangeResolver()
+        self._policy = None
+        self._policy_key = None
+        self._policy_built_at = 0.0
         if app is not None:
             self.init_app(app)
 
+    def refresh_policy(self):
+        """Drop the cached country sets; they are rebuilt on the next request."""
+        self._policy_key = None
+
+    def _get_policy(self, app):
+        allow_source = app.config.get('AIWAF_GEO_ALLOW_COUNTRIES', [])
+        block_source = app.config.get('AIWAF_GEO_BLOCK_COUNTRIES', [])
+        version = get_geo_blocked_countries_version()
+
+        refresh_seconds = app.config.get(
+            'AIWAF_GEO_BLOCKED_REFRESH_SECONDS', DEFAULT_GEO_BLOCKED_REFRESH_SECONDS
+        )
+        now = time.time()
+        expired = bool(refresh_seconds) and now - self._policy_built_at >= refresh_seconds
+
+        # Storage writes in this process bump the version and reassigned
+        # config lists differ by identity, so either rebuilds at once. In-place
+        # list edits and other processes' writes wait for the periodic
+        # refresh (or refresh_policy()).
+        key = self._policy_key
+        if (self._policy is None or key is None or expired or key[2] != version
+                or key[0] is not allow_source or key[1] is not block_source):
+            self._policy = GeoBlockPolicy(
+                _normalize_country_list(allow_source),
+                _normalize_country_list(block_source),
+                _normalize_country_list(get_geo_blocked_countries()),
+            )
+            self._policy_key = (allow_source, block_source, version)
+            self._policy_built_at = now
+        return self._policy
+
+    def _range_table(self, app, policy):
+        """The compiled range table for policy, or None (disabled or still building)."""
+        if not app.config.get('AIWAF_GEO_COMPILED_RANGES', False):
+            return None
+        mode, countries = policy.range_mode
+        return self._ranges.get_table(
+            app.config.get('AIWAF_GEOIP_DB_PATH'),
+            countries,
+            mode,
+            app.config.get('AIWAF_GEO_RANGE_CACHE_DIR')
+            or app.config.get('AIWAF_DATA_DIR', DEFAULT_DATA_DIR),
+        )
+
     def init_app(self, app):
+        if app.config.get('AIWAF_GEO_BLOCK_ENABLED', False) and app.config.get('AIWAF_GEO_COMPILED_RANGES', False):
+            # Start compiling the range table now rather than on the first request
+            try:
+                with app.app_context():
+                    policy = self._get_policy(app)
+                    if policy.active:
+                        self._range_table(app, policy)
+            except Exception as e:
+                app.logger.warning(f"Could not start geo range table build: {e}")
+
         @app.before_request
         def before_request():
             if not should_apply_middleware('geo_block'):
@@ -39,32 +156,27 @@ class GeoBlockMiddleware:
             if not app.config.get('AIWAF_GEO_BLOCK_ENABLED', False):
                 return None
 
-            allow_countries = _normalize_country_list(
-                app.config.get('AIWAF_GEO_ALLOW_COUNTRIES', [])
-            )
-            block_countries = _normalize_country_list(
-                app.config.get('AIWAF_GEO_BLOCK_COUNTRIES', [])
-            )
-            dynamic_blocked = _normalize_country_list(get_geo_blocked_countries())
-
-            if not allow_countries and not block_countries and not dynamic_blocked:
+            policy = self._get_policy(app)
+            if not policy.active:
                 return None
 
             ip = get_ip()
             if not ip:
                 return None
 
-            country = get_country_for_ip(ip, app.config)
-            if not country:
-                return None
-
-            country = country.strip().upper()
-            blocked = False
+            # Falls back to per-request lookups until the table is built
+            table = self._range_table(app, policy)
 
-            if allow_countries:
-                blocked = country not in allow_countries
+            if table is not None:
+                country = table.lookup(ip)
+                blocked = country is not None
             else:
-                blocked = country in block_countries or country in dynamic_blocked
+                country = get_country_for_ip(ip, app.config)
+                if not country:
+                    return None
+
+                country = country.strip().upper()
+                blocked = policy.is_blocked(country)
 
             if blocked:
                 reason = f"Geo blocked: {country}"
@@ -0,0 +1,252 @@
+"""Precompiled IP range tables for geo-blocking.
+
+Walks the GeoIP database once and keeps only the networks that belong to
+blocked countries, merged into sorted intervals. A request is then answered
+with a single ``bisect`` on the integer form of the address instead of an
+mmdb lookup. Compiled tables are cached on disk next to the other AIWAF data
+and rebuilt when the database file or the country lists change; a rebuild
+replaces the previous cache file. Compiling walks the whole database, so the
+resolver does it on a background thread and requests use per-request lookups
+until the table is ready.
+"""
+import hashlib
+import ipaddress
+import json
+import logging
+import os
+import re
+import threading
+from array import array
+from bisect import bisect_right
+
+try:
+    import maxminddb
+    MAXMINDDB_AVAILABLE = True
+except ImportError:
+    maxminddb = None
+    MAXMINDDB_AVAILABLE = False
+
+from .geoip import _extract_country_from_raw
+
+logger = logging.getLogger("aiwaf.geo_ranges")
+
+RANGE_MODE_BLOCK = "block"
+RANGE_MODE_ALLOW = "allow"
+
+# Bump when the on-disk layout changes so stale files are ignored.
+_CACHE_FORMAT = 1
+
+_CACHE_FILE = re.compile(r"geo_ranges_[0-9a-f]{16}\.json$")
+
+
+class GeoRangeTable:
+    """Sorted, non-overlapping [start, end] intervals with their country code."""
+
+    def __init__(self, v4=(), v6=()):
+        self._v4_starts = array("Q", (r[0] for r in v4))
+        self._v4_ends = array("Q", (r[1] for r in v4))
+        self._v4_codes = [r[2] for r in v4]
+        # IPv6 bounds do not fit a fixed-width array; plain int lists still bisect.
+        self._v6_starts = [r[0] for r in v6]
+        self._v6_ends = [r[1] for r in v6]
+        self._v6_codes = [r[2] for r in v6]
+
+    def __len__(self):
+        return len(self._v4_codes) + len(self._v6_codes)
+
+    def lookup(self, ip):
+        """Return the country code of the blocked range containing ip, or None."""
+        try:
+            addr = ipaddress.ip_address(ip)
+        except ValueError:
+            return None
+        if addr.version == 4:
+            starts, ends, codes = self._v4_starts, self._v4_ends, self._v4_codes
+        else:
+            mapped = addr.ipv4_mapped
+            if mapped is not None:
+                return self.lookup(mapped)
+            starts, ends, codes = self._v6_starts, self._v6_ends, self._v6_codes
+        value = int(addr)
+        i = bisect_right(starts, value) - 1
+        if i >= 0 and value <= ends[i]:
+            return codes[i]
+        return None
+
+    def to_dict(self):
+        return {
+            "v4": [list(r) for r in zip(self._v4_starts, self._v4_ends, self._v4_codes)],
+            "v6": [list(r) for r in zip(self._v6_starts, self._v6_ends, self._v6_codes)],
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(data.get("v4", ()), data.get("v6", ()))
+
+
+def _merge_ranges(ranges):
+    ranges.sort()
+    merged = []
+    for start, end, code in ranges:
+        if merged and merged[-1][2] == code and start <= merged[-1][1] + 1:
+            if end > merged[-1][1]:
+                merged[-1][1] = end
+            continue
+        merged.append([start, end, code])
+    return merged
+
+
+def compile_geo_ranges(db_path, countries, mode=RANGE_MODE_BLOCK):
+    """Walk db_path once and return a GeoRangeTable of the blocked networks.
+
+    In ``block`` mode the table holds networks located in ``countries``. In
+    ``allow`` mode it holds every network with a known country *not* in
+    ``countries``, so addresses the database cannot place stay unblocked,
+    matching the per-request lookup behaviour.
+    """
+    if not MAXMINDDB_AVAILABLE:
+        raise RuntimeError("maxminddb is required to compile geo range tables")
+    countries = {str(c).strip().upper() for c in countries if c}
+    allow = mode == RANGE_MODE_ALLOW
+
+    v4, v6 = [], []
+    reader = maxminddb.open_database(db_path)
+    try:
+        for network, record in reader:
+            code = _extract_country_from_raw(record)
+            if not code:
+                continue
+            code = str(code).strip().upper()
+            if (code in countries) == allow:
+                continue
+            start = int(network.network_address)
+            end = int(network.broadcast_address)
+            (v4 if network.version == 4 else v6).append((start, end, code))
+    finally:
+        reader.close()
+
+    return GeoRangeTable(_merge_ranges(v4), _merge_ranges(v6))
+
+
+def _cache_key(db_path, countries, mode, stat):
+    parts = [
+        str(_CACHE_FORMAT),
+        os.path.abspath(db_path),
+        str(stat.st_mtime_ns),
+        str(stat.st_size),
+        mode,
+        ",".join(sorted(countries)),
+    ]
+    return hashlib.sha1("|".join(parts).encode("utf-8")).hexdigest()
+
+
+def _remove_stale_caches(cache_dir, keep):
+    """Delete compiled tables in cache_dir other than keep; they can no longer match."""
+    try:
+        names = os.listdir(cache_dir)
+    except OSError:
+        return
+    for name in names:
+        if name != keep and _CACHE_FILE.match(name):
+            try:
+                os.remove(os.path.join(cache_dir, name))
+            except OSError as e:
+                logger.warning(f"Could not remove stale geo range cache {name}: {e}")
+
+
+def load_geo_ranges(db_path, countries, mode=RANGE_MODE_BLOCK, cache_dir=None):
+    """Return a GeoRangeTable for countries, from cache_dir when up to date.
+
+    Compiles and stores the table when no matching cache file exists. Returns
+    None when the database is missing or cannot be read.
+    """
+    countries = {str(c).strip().upper() for c in countries if c}
+    try:
+        stat = os.stat(db_path)
+    except (OSError, TypeError):
+        return None
+
+    key = _cache_key(db_path, countries, mode, stat)
+    cache_path = os.path.join(cache_dir, f"geo_ranges_{key[:16]}.json") if cache_dir else None
+
+    if cache_path and os.path.exists(cache_path):
+        try:
+            with open(cache_path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+            if data.get("key") == key:
+                return GeoRangeTable.from_dict(data)
+        except (OSError, ValueError) as e:
+            logger.warning(f"Ignoring unreadable geo range cache {cache_path}: {e}")
+
+    try:
+        table = compile_geo_ranges(db_path, countries, mode)
+    except Exception as e:
+        logger.warning(f"Could not compile geo range table from {db_path}: {e}")
+        return None
+
+    if cache_path:
+        try:
+            os.makedirs(cache_dir, exist_ok=True)
+            tmp_path = f"{cache_path}.{os.getpid()}.tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(dict(table.to_dict(), key=key), f, separators=(",", ":"))
+            os.replace(tmp_path, cache_path)
+        except OSError as e:
+            logger.warning(f"Could not write geo range cache {cache_path}: {e}")
+        else:
+            _remove_stale_caches(cache_dir, os.path.basename(cache_path))
+    return table
+
+
+class GeoRangeResolver:
+    """Keeps the compiled table for the current (db, mode, countries) in memory.
+
+    Tables are loaded or compiled on a background thread, never on the
+    request thread. Until the table for the current key is ready,
+    ``get_table`` returns None and callers use per-request lookups.
+    """
+
+    def __init__(self):
+        self._key = None
+        self._table = None
+        self._building = None
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def get_table(self, db_path, countries, mode, cache_dir=None):
+        """Return the table for these settings, or None while it is being built."""
+        try:
+            mtime = os.stat(db_path).st_mtime_ns
+        except (OSError, TypeError):
+            return None
+        key = (db_path, mtime, mode, frozenset(countries))
+        if key == self._key:
+            return self._table
+        with self._lock:
+            if key == self._key:
+                return self._table
+            if key != self._building:
+                self._building = key
+                self._thread = threading.Thread(
+                    target=self._build,
+                    args=(key, db_path, countries, mode, cache_dir),
+                    name="aiwaf-geo-ranges",
+                    daemon=True,
+                )
+                self._thread.start()
+        return None
+
+    def _build(self, key, db_path, countries, mode, cache_dir):
+        table = load_geo_ranges(db_path, countries, mode, cache_dir)
+        with self._lock:
+            # A newer key may have been requested meanwhile; its build wins.
+            if key == self._building:
+                self._key = key
+                self._table = table
+                self._building = None
+
+    def wait(self, timeout=None):
+        """Block until the build in progress (if any) has finished."""
+        thread = self._thread
+        if thread is not None:
+            thread.join(timeout)
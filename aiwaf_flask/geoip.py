@@ -1,6 +1,13 @@
+import ipaddress
 import logging
 import os
+import threading
 import time
+from collections import Counter, OrderedDict
+from collections.abc import Mapping
+from concurrent.futures import ProcessPoolExecutor
+
+from .log_ingest import resolve_jobs
 
 try:
     from geoip2.database import Reader as GeoIPReader
@@ -11,25 +18,146 @@ except ImportError:
     AddressNotFoundError = Exception
     GEOIP_AVAILABLE = False
 
+try:
+    from maxminddb import MODE_MMAP
+except ImportError:
+    MODE_MMAP = None
+
 logger = logging.getLogger("aiwaf.geoip")
 
-_geoip_cache = {}
+DEFAULT_GEO_CACHE_MAX_ENTRIES = 65536
+DEFAULT_BATCH_CHUNK_SIZE = 5000
 
+# Process-wide reader registry: db_path -> _ReaderEntry
+_readers = {}
+_readers_lock = threading.Lock()
 
-def _cache_get(cache_key):
-    cached = _geoip_cache.get(cache_key)
-    if not cached:
-        return None
-    value, expires_at = cached
-    if expires_at and expires_at < time.time():
-        _geoip_cache.pop(cache_key, None)
-        return None
-    return value
+_LOOKUP_STRATEGIES = ("country", "city", "raw")
+
+
+class GeoNetworkCache:
+    """Bounded LRU of GeoIP results keyed by the network each record covers.
+
+    The mmdb reports the prefix length of the block a record applies to, so a
+    single lookup is stored once for the whole block and answers every address
+    in it. Lookups probe only the prefix lengths currently cached, longest first.
+    """
+
+    _MISS = object()
+
+    def __init__(self, max_entries=DEFAULT_GEO_CACHE_MAX_ENTRIES):
+        self.max_entries = max(0, int(max_entries))
+        self.hits = 0
+        self.misses = 0
+        # (namespace, version, prefix_len, network_int) -> (value, expires_at)
+        self._entries = OrderedDict()
+        # (namespace, version) -> {prefix_len: entry count}
+        self._prefix_counts = {}
+        # (namespace, version) -> prefix lengths present, longest first
+        self._prefix_order = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _parse(ip):
+        try:
+            addr = ipaddress.ip_address(ip)
+        except ValueError:
+            return None
+        return addr.version, addr.max_prefixlen, int(addr)
+
+    def get(self, namespace, ip):
+        """Return the cached value for ip, or GeoNetworkCache._MISS."""
+        parsed = self._parse(ip)
+        if parsed is None:
+            return self._MISS
+        version, bits, ip_int = parsed
+        now = time.time()
+        with self._lock:
+            for prefix_len in self._prefix_order.get((namespace, version), ()):
+                key = (namespace, version, prefix_len, ip_int >> (bits - prefix_len))
+                cached = self._entries.get(key)
+                if cached is None:
+                    continue
+                value, expires_at = cached
+                if expires_at and expires_at < now:
+                    self._remove(key)
+                    break
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return value
+            self.misses += 1
+            return self._MISS
+
+    def set(self, namespace, ip, prefix_len, value, timeout):
+        """Cache value for the prefix_len-bit network containing ip."""
+        if self.max_entries <= 0:
+            return
+        parsed = self._parse(ip)
+        if parsed is None:
+            return
+        version, bits, ip_int = parsed
+        if prefix_len is None or not 0 <= prefix_len <= bits:
+            prefix_len = bits
+        key = (namespace, version, prefix_len, ip_int >> (bits - prefix_len))
+        expires_at = time.time() + timeout if timeout else None
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+            else:
+                group = (namespace, version)
+                counts = self._prefix_counts.setdefault(group, {})
+                counts[prefix_len] = counts.get(prefix_len, 0) + 1
+                if counts[prefix_len] == 1:
+                    self._prefix_order[group] = sorted(counts, reverse=True)
+            self._entries[key] = (value, expires_at)
+            while len(self._entries) > self.max_entries:
+                self._remove(next(iter(self._entries)))
+
+    def _remove(self, key):
+        self._entries.pop(key, None)
+        group = key[:2]
+        counts = self._prefix_counts.get(group)
+        if not counts:
+            return
+        counts[key[2]] -= 1
+        if counts[key[2]] <= 0:
+            del counts[key[2]]
+            self._prefix_order[group] = sorted(counts, reverse=True)
+
+    def resize(self, max_entries):
+        max_entries = max(0, int(max_entries))
+        if max_entries == self.max_entries:
+            return
+        with self._lock:
+            self.max_entries = max_entries
+            while len(self._entries) > self.max_entries:
+                self._remove(next(iter(self._entries)))
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._prefix_counts.clear()
+            self._prefix_order.clear()
+            self.hits = 0
+            self.misses = 0
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": (self.hits / lookups) if lookups else 0.0,
+            "size": len(self._entries),
+            "max_entries": self.max_entries,
+        }
 
 
-def _cache_set(cache_key, value, timeout):
-    expires_at = time.time() + timeout if timeout else None
-    _geoip_cache[cache_key] = (value, expires_at)
+_geoip_cache = GeoNetworkCache()
+
+
+def get_geo_cache_stats():
+    """Return hit/miss counters and fill of the shared GeoIP network cache."""
+    return _geoip_cache.stats()
 
 
 def _extract_country_from_raw(raw):
@@ -66,127 +194,238 @@ def _extract_country_name_from_raw(raw):
     return None
 
 
-def _lookup_maxmind(ip, db_path):
+class _ReaderEntry:
+    """An open reader plus what we learned about its database."""
+
+    __slots__ = ("reader", "mtime", "strategy")
+
+    def __init__(self, reader, mtime):
+        self.reader = reader
+        self.mtime = mtime
+        # First of _LOOKUP_STRATEGIES the database supports, found on first lookup.
+        self.strategy = None
+
+
+def _open_reader(db_path):
+    if MODE_MMAP is not None:
+        return GeoIPReader(db_path, mode=MODE_MMAP)
+    return GeoIPReader(db_path)
+
+
+def _get_reader_entry(db_path):
+    """Return the shared reader for db_path, reopening it if the file changed."""
     if not GEOIP_AVAILABLE or not db_path:
         return None
-    if not os.path.exists(db_path):
-        return None
-    reader = None
     try:
-        reader = GeoIPReader(db_path)
-        try:
-            response = reader.country(ip)
-            code = getattr(response.country, "iso_code", None)
-            if code:
-                return code
-        except Exception:
-            pass
+        mtime = os.stat(db_path).st_mtime_ns
+    except OSError:
+        return None
+
+    entry = _readers.get(db_path)
+    if entry is not None and entry.mtime == mtime:
+        return entry
+
+    with _readers_lock:
+        entry = _readers.get(db_path)
+        if entry is None or entry.mtime != mtime:
+            try:
+                reader = _open_reader(db_path)
+            except Exception as e:
+                logger.warning(f"Could not open GeoIP database {db_path}: {e}")
+                return None
+            # The previous reader is not closed here: other threads may still be
+            # mid-lookup on it. It is released once the last reference drops.
+            entry = _ReaderEntry(reader, mtime)
+            _readers[db_path] = entry
+        return entry
 
+
+def close_geoip_readers():
+    """Close and forget every shared GeoIP reader."""
+    with _readers_lock:
+        entries = list(_readers.values())
+        _readers.clear()
+    for entry in entries:
         try:
-            response = reader.city(ip)
-            code = getattr(response.country, "iso_code", None)
-            if code:
-                return code
+            entry.reader.close()
         except Exception:
             pass
 
+
+def _traits_prefix_len(response):
+    network = getattr(getattr(response, "traits", None), "network", None)
+    return getattr(network, "prefixlen", None)
+
+
+def _lookup_with_strategy(reader, strategy, ip):
+    if strategy == "country":
+        response = reader.country(ip)
+        country = response.country
+        return getattr(country, "iso_code", None), getattr(country, "name", None), _traits_prefix_len(response)
+    if strategy == "city":
+        response = reader.city(ip)
+        country = response.country
+        return getattr(country, "iso_code", None), getattr(country, "name", None), _traits_prefix_len(response)
+    raw_reader = reader if hasattr(reader, "get") else getattr(reader, "_db_reader", None)
+    if raw_reader is None:
+        return None, None, None
+    if hasattr(raw_reader, "get_with_prefix_len"):
+        raw, prefix_len = raw_reader.get_with_prefix_len(ip)
+    else:
+        raw, prefix_len = raw_reader.get(ip), None
+    return _extract_country_from_raw(raw), _extract_country_name_from_raw(raw), prefix_len
+
+
+def _lookup_record(ip, db_path):
+    """Return (country_code, country_name, prefix_len) for ip.
+
+    prefix_len is the size of the network the answer applies to (including
+    "not found" answers), or None when the database did not report it.
+    """
+    entry = _get_reader_entry(db_path)
+    if entry is None:
+        return None, None, None
+
+    strategies = (entry.strategy,) if entry.strategy else _LOOKUP_STRATEGIES
+    for strategy in strategies:
         try:
-            if hasattr(reader, "get"):
-                raw = reader.get(ip)
-            else:
-                raw_reader = getattr(reader, "_db_reader", None)
-                raw = raw_reader.get(ip) if raw_reader is not None else None
-            code = _extract_country_from_raw(raw)
-            if code:
-                return code
+            result = _lookup_with_strategy(entry.reader, strategy, ip)
+        except AddressNotFoundError as e:
+            entry.strategy = strategy
+            return None, None, getattr(getattr(e, "network", None), "prefixlen", None)
+        except ValueError:
+            # Not a valid IP address; no strategy will do better.
+            return None, None, None
         except Exception:
-            return None
-    except AddressNotFoundError:
-        return None
-    except Exception:
-        return None
-    finally:
-        if reader is not None:
-            try:
-                reader.close()
-            except Exception:
-                pass
+            # Typically a database type mismatch (e.g. country() on a non-GeoIP2 db).
+            continue
+        entry.strategy = strategy
+        return result
+    return None, None, None
 
 
-def lookup_country(ip, cache_prefix=None, cache_seconds=3600, db_path=None):
-    default_path = os.path.join(os.path.dirname(__file__), "geolock", "ipinfo_lite.mmdb")
-    db_path = db_path or default_path
-    cache_key = None
-    if cache_prefix:
-        cache_key = f"{cache_prefix}{ip}"
-        cached = _cache_get(cache_key)
-        if cached is not None:
-            return cached
+def _lookup_cached(ip, cache_prefix, cache_seconds, db_path):
+    """Resolve (code, name) through the network cache when cache_prefix is set."""
+    if not cache_prefix:
+        code, name, _ = _lookup_record(ip, db_path)
+        return code, name
 
-    code = _lookup_maxmind(ip, db_path)
+    cached = _geoip_cache.get(cache_prefix, ip)
+    if cached is not GeoNetworkCache._MISS:
+        return cached
 
-    if cache_key and cache_seconds is not None:
-        _cache_set(cache_key, code, cache_seconds)
-    return code
+    code, name, prefix_len = _lookup_record(ip, db_path)
+    if cache_seconds is not None:
+        _geoip_cache.set(cache_prefix, ip, prefix_len, (code, name), cache_seconds)
+    return code, name
+
+
+def lookup_country(ip, cache_prefix=None, cache_seconds=3600, db_path=None):
+    db_path = db_path or _default_db_path()
+    return _lookup_cached(ip, cache_prefix, cache_seconds, db_path)[0]
 
 
 def lookup_country_name(ip, cache_prefix=None, cache_seconds=3600, db_path=None):
-    default_path = os.path.join(os.path.dirname(__file__), "geolock", "ipinfo_lite.mmdb")
-    db_path = db_path or default_path
+    db_path = db_path or _default_db_path()
     if not GEOIP_AVAILABLE or not db_path or not os.path.exists(db_path):
         return None
+    return _lookup_cached(ip, cache_prefix, cache_seconds, db_path)[1]
+
+
+def get_country_for_ip(ip, app_config):
+    prefix = app_config.get("AIWAF_GEO_CACHE_PREFIX", "aiwaf_geo")
+    cache_seconds = app_config.get("AIWAF_GEO_CACHE_SECONDS", 3600)
+    db_path = app_config.get("AIWAF_GEOIP_DB_PATH")
+    _geoip_cache.resize(app_config.get("AIWAF_GEO_CACHE_MAX_ENTRIES", DEFAULT_GEO_CACHE_MAX_ENTRIES))
+    return lookup_country(ip, cache_prefix=f"{prefix}:", cache_seconds=cache_seconds, db_path=db_path)
+
+
+def _default_db_path():
+    return os.path.join(os.path.dirname(__file__), "geolock", "ipinfo_lite.mmdb")
 
-    cache_key = None
-    if cache_prefix:
-        cache_key = f"{cache_prefix}{ip}"
-        cached = _cache_get(cache_key)
-        if cached is not None:
-            return cached
 
-    reader = None
+def _ip_sort_key(ip):
     try:
-        reader = GeoIPReader(db_path)
-        try:
-            response = reader.country(ip)
-            name = getattr(response.country, "name", None)
-            if name:
-                if cache_key and cache_seconds is not None:
-                    _cache_set(cache_key, name, cache_seconds)
-                return name
-        except Exception:
-            pass
+        addr = ipaddress.ip_address(ip)
+    except ValueError:
+        return (2, 0, ip)
+    return (addr.version, int(addr), ip)
 
-        try:
-            response = reader.city(ip)
-            name = getattr(response.country, "name", None)
-            if name:
-                if cache_key and cache_seconds is not None:
-                    _cache_set(cache_key, name, cache_seconds)
-                return name
-        except Exception:
-            pass
 
+def _lookup_names_chunk(ips, db_path):
+    """Resolve a sorted chunk of IPs to country names.
+
+    Consecutive addresses usually fall in the network of the previous answer,
+    which is reused instead of querying the database again.
+    """
+    names = []
+    last_version = last_network = last_shift = None
+    last_name = None
+    for ip in ips:
         try:
-            raw_reader = getattr(reader, "_db_reader", None)
-            raw = raw_reader.get(ip) if raw_reader is not None else None
-            name = _extract_country_name_from_raw(raw)
-            if name:
-                if cache_key and cache_seconds is not None:
-                    _cache_set(cache_key, name, cache_seconds)
-                return name
-        except Exception:
-            return None
-    finally:
-        if reader is not None:
-            try:
-                reader.close()
-            except Exception:
-                pass
-    return None
+            addr = ipaddress.ip_address(ip)
+        except ValueError:
+            names.append(None)
+            continue
+        value = int(addr)
+        if (last_network is not None and addr.version == last_version
+                and value >> last_shift == last_network):
+            names.append(last_name)
+            continue
+        _, name, prefix_len = _lookup_record(ip, db_path)
+        names.append(name)
+        if prefix_len is not None and 0 <= prefix_len <= addr.max_prefixlen:
+            last_version = addr.version
+            last_shift = addr.max_prefixlen - prefix_len
+            last_network = value >> last_shift
+            last_name = name
+        else:
+            last_network = None
+    return names
 
 
-def get_country_for_ip(ip, app_config):
-    prefix = app_config.get("AIWAF_GEO_CACHE_PREFIX", "aiwaf_geo")
-    cache_seconds = app_config.get("AIWAF_GEO_CACHE_SECONDS", 3600)
-    db_path = app_config.get("AIWAF_GEOIP_DB_PATH")
-    return lookup_country(ip, cache_prefix=f"{prefix}:", cache_seconds=cache_seconds, db_path=db_path)
+def batch_country_counts(ips, db_path=None, jobs=None, chunk_size=DEFAULT_BATCH_CHUNK_SIZE, progress=None):
+    """Count addresses per country name in one pass over the GeoIP database.
+
+    ``ips`` is either an iterable of addresses (duplicates are counted) or a
+    mapping of address -> weight. Distinct addresses are sorted, split into
+    chunks and resolved across ``jobs`` worker processes, each mapping the same
+    database file; ``jobs`` None or 0 means one per CPU, as for log parsing. Addresses that cannot be resolved are counted under ``None``.
+    ``progress(done, total)`` is called after every chunk.
+    """
+    weights = ips if isinstance(ips, Mapping) else Counter(ips)
+    db_path = db_path or _default_db_path()
+    counts = Counter()
+    if not weights:
+        return counts
+    if not GEOIP_AVAILABLE or not os.path.exists(db_path):
+        counts[None] = sum(weights.values())
+        return counts
+
+    unique = sorted(weights, key=_ip_sort_key)
+    chunk_size = max(1, int(chunk_size))
+    chunks = [unique[i:i + chunk_size] for i in range(0, len(unique), chunk_size)]
+    total = len(unique)
+    jobs = resolve_jobs(0 if jobs is None else jobs)
+    jobs = min(jobs, len(chunks))
+
+    def _collect(chunk, names, done):
+        for ip, name in zip(chunk, names):
+            counts[name] += weights[ip]
+        if progress:
+            progress(done, total)
+
+    done = 0
+    if jobs <= 1:
+        for chunk in chunks:
+            names = _lookup_names_chunk(chunk, db_path)
+            done += len(chunk)
+            _collect(chunk, names, done)
+        return counts
+
+    with ProcessPoolExecutor(max_workers=jobs) as executor:
+        results = executor.map(_lookup_names_chunk, chunks, [db_path] * len(chunks))
+        for chunk, names in zip(chunks, results):
+            done += len(chunk)
+            _collect(chunk, names, done)
+    return counts
@@ -1,5 +1,6 @@
 # Flask-adapted HeaderValidationMiddleware
 import re
+from functools import lru_cache
 from flask import request, jsonify, current_app
 from .utils import get_ip, is_exempt
 from .blacklist_manager import BlacklistManager
@@ -73,18 +74,42 @@ def _has_header(environ, key):
     return bool(value)
 
 
+# All patterns folded into one alternation per group so a UA is scanned once.
+# Each suspicious pattern gets a named group (s0, s1, ...) in SUSPICIOUS_UA order.
+_LEGITIMATE_BOTS_RX = re.compile(
+    "|".join(f"(?:{rx.pattern})" for rx in LEGITIMATE_BOTS), re.IGNORECASE
+)
+_SUSPICIOUS_UA_RX = re.compile(
+    "|".join(f"(?P<s{idx}>{rx.pattern})" for idx, (_, rx) in enumerate(SUSPICIOUS_UA)),
+    re.IGNORECASE,
+)
+_SUSPICIOUS_UA_NAMES = {f"s{idx}": name for idx, (name, _) in enumerate(SUSPICIOUS_UA)}
+
+DEFAULT_VERDICT_CACHE_SIZE = 4096
+# Header values longer than this bypass the verdict cache to bound its memory.
+_MAX_CACHEABLE_VALUE_LEN = 512
+
+
+def _classify_user_agent(ua_lower):
+    """Return ("legitimate", None), ("suspicious", pattern_name) or (None, None)."""
+    if _LEGITIMATE_BOTS_RX.search(ua_lower):
+        return "legitimate", None
+    match = _SUSPICIOUS_UA_RX.search(ua_lower)
+    if match is None:
+        return None, None
+    # Reports the leftmost match (ties go to the earlier pattern in SUSPICIOUS_UA)
+    return "suspicious", _SUSPICIOUS_UA_NAMES[match.lastgroup]
+
+
 def _check_user_agent(user_agent):
     if not user_agent:
         return "Empty user agent"
 
-    ua_lower = user_agent.lower()
-    for legit in LEGITIMATE_BOTS:
-        if legit.search(ua_lower):
-            return None
-
-    for pattern, regex in SUSPICIOUS_UA:
-        if regex.search(ua_lower):
-            return f"Pattern: {pattern}"
+    group, pattern = _classify_user_agent(user_agent.lower())
+    if group == "legitimate":
+        return None
+    if group == "suspicious":
+        return f"Pattern: {pattern}"
 
     if len(user_agent) < 10:
         return "Too short"
@@ -104,34 +129,86 @@ def _resolve_required_headers(config_required_headers=None, method=None):
     return resolved.get(method_name, resolved["GET"])
 
 
+def build_required_header_table(config_required_headers=None):
+    """Resolve required headers for every method once.
+
+    Returns ``{METHOD: (required_headers_tuple, has_method_override)}`` where the
+    override flag is True when the configured list differs from the default.
+    """
+    defaults = {k: tuple(v) for k, v in DEFAULT_REQUIRED_HEADERS.items()}
+    resolved = dict(defaults)
+    if isinstance(config_required_headers, dict):
+        for k, value in config_required_headers.items():
+            if not isinstance(value, list):
+                continue
+            resolved[str(k).upper()] = tuple(str(item) for item in value if item)
+    return {
+        method_name: (headers, headers != defaults.get(method_name, defaults["GET"]))
+        for method_name, headers in resolved.items()
+    }
+
+
 def _required_header_display_name(header_key):
     return str(header_key).replace("HTTP_", "").replace("_", "-").lower()
 
 
-def validate_headers_python(environ, method="GET", config_required_headers=None):
-    required_headers = _resolve_required_headers(config_required_headers, method)
+def validate_headers_python(environ, method="GET", config_required_headers=None, required_headers=None):
+    if required_headers is None:
+        required_headers = _resolve_required_headers(config_required_headers, method)
     # Explicit empty list means this method is exempt from header validation checks.
     if len(required_headers) == 0:
         return None
-    missing = []
-    for header_key in required_headers:
-        if not _has_header(environ, header_key):
-            missing.append(_required_header_display_name(header_key))
-    if missing:
-        return f"Missing required headers: {', '.join(missing)}"
 
     user_agent = _get_header(environ, "HTTP_USER_AGENT")
-    reason = _check_user_agent(user_agent)
-    if reason:
-        return f"Suspicious user agent: {reason}"
-
-    server_protocol = _get_header(environ, "SERVER_PROTOCOL")
     accept = _get_header(environ, "HTTP_ACCEPT")
     accept_language = _get_header(environ, "HTTP_ACCEPT_LANGUAGE")
     accept_encoding = _get_header(environ, "HTTP_ACCEPT_ENCODING")
     connection = _get_header(environ, "HTTP_CONNECTION")
+    server_protocol = _get_header(environ, "SERVER_PROTOCOL")
 
-    if server_protocol.startswith("HTTP/2") and "mozilla/4.0" in user_agent.lower():
+    # Everything the verdict depends on; required headers outside the six
+    # tracked values only matter through their presence.
+    key = (
+        tuple(required_headers),
+        tuple(_has_header(environ, header_key) for header_key in required_headers),
+        user_agent,
+        accept,
+        accept_language,
+        accept_encoding,
+        connection,
+        server_protocol,
+        _has_header(environ, "HTTP_CACHE_CONTROL"),
+    )
+    if any(len(value) > _MAX_CACHEABLE_VALUE_LEN for value in key[2:8]):
+        return _compute_header_verdict(*key)
+    return _verdict_cache(*key)
+
+
+def _compute_header_verdict(
+    required_headers,
+    required_present,
+    user_agent,
+    accept,
+    accept_language,
+    accept_encoding,
+    connection,
+    server_protocol,
+    has_cache_control,
+):
+    missing = [
+        _required_header_display_name(header_key)
+        for header_key, present in zip(required_headers, required_present)
+        if not present
+    ]
+    if missing:
+        return f"Missing required headers: {', '.join(missing)}"
+
+    reason = _check_user_agent(user_agent)
+    if reason:
+        return f"Suspicious user agent: {reason}"
+
+    ua_lower = user_agent.lower()
+    if server_protocol.startswith("HTTP/2") and "mozilla/4.0" in ua_lower:
         return "Suspicious headers: HTTP/2 with old browser user agent"
     if user_agent and not accept:
         return "Suspicious headers: User-Agent present but no Accept header"
@@ -139,21 +216,16 @@ def validate_headers_python(environ, method="GET", config_required_headers=None)
         return "Suspicious headers: Generic Accept header without language/encoding"
     if user_agent and not accept_language and not accept_encoding and not connection:
         return "Suspicious headers: Missing all browser-standard headers"
-    if user_agent and server_protocol == "HTTP/1.0" and "chrome" in user_agent.lower():
+    if user_agent and server_protocol == "HTTP/1.0" and "chrome" in ua_lower:
         return "Suspicious headers: Modern browser with HTTP/1.0"
 
     score = 0
-    if _has_header(environ, "HTTP_USER_AGENT"):
+    if user_agent:
         score += 2
-    if _has_header(environ, "HTTP_ACCEPT"):
+    if accept:
         score += 2
-    for header in [
-        "HTTP_ACCEPT_LANGUAGE",
-        "HTTP_ACCEPT_ENCODING",
-        "HTTP_CONNECTION",
-        "HTTP_CACHE_CONTROL",
-    ]:
-        if _has_header(environ, header):
+    for present in (accept_language, accept_encoding, connection, has_cache_control):
+        if present:
             score += 1
     if accept_language and accept_encoding:
         score += 1
@@ -167,13 +239,65 @@ def validate_headers_python(environ, method="GET", config_required_headers=None)
 
     return None
 
+
+_verdict_cache = lru_cache(maxsize=DEFAULT_VERDICT_CACHE_SIZE)(_compute_header_verdict)
+
+
+def configure_verdict_cache(maxsize):
+    """Resize the header verdict LRU (0 disables caching). Clears existing entries."""
+    global _verdict_cache
+    maxsize = max(0, int(maxsize))
+    if _verdict_cache.cache_parameters()["maxsize"] != maxsize:
+        _verdict_cache = lru_cache(maxsize=maxsize)(_compute_header_verdict)
+
+
+def clear_verdict_cache():
+    """Drop all memoized header verdicts and reset hit/miss counters."""
+    _verdict_cache.cache_clear()
+
+
+def get_verdict_cache_stats():
+    """Return hit/miss counters and current fill of the header verdict cache."""
+    info = _verdict_cache.cache_info()
+    lookups = info.hits + info.misses
+    return {
+        "hits": info.hits,
+        "misses": info.misses,
+        "hit_rate": (info.hits / lookups) if lookups else 0.0,
+        "size": info.currsize,
+        "maxsize": info.maxsize,
+    }
+
 class HeaderValidationMiddleware:
     def __init__(self, app=None):
         self.app = app
+        self._required_source = None
+        self._required_table = build_required_header_table()
         if app is not None:
             self.init_app(app)
 
+    def _get_required_table(self, configured_required):
+        # Rebuilt only when AIWAF_REQUIRED_HEADERS is reassigned; call
+        # refresh_required_headers() after mutating the dict in place.
+        if configured_required is not self._required_source:
+            self._required_table = build_required_header_table(configured_required)
+            self._required_source = configured_required
+        return self._required_table
+
+    def refresh_required_headers(self, app=None):
+        """Recompute the per-method required-header table from app config."""
+        app = app or self.app
+        configured_required = app.config.get("AIWAF_REQUIRED_HEADERS") if app else None
+        self._required_table = build_required_header_table(configured_required)
+        self._required_source = configured_required
+
     def init_app(self, app):
+        self.app = app
+        self.refresh_required_headers(app)
+        configure_verdict_cache(
+            app.config.get("AIWAF_HEADER_VERDICT_CACHE_SIZE", DEFAULT_VERDICT_CACHE_SIZE)
+        )
+
         @app.before_request
         def before_request():
             # Check exemption status first - skip if exempt from header validation
@@ -186,16 +310,14 @@ class HeaderValidationMiddleware:
             
             ip = get_ip()
             req_method = (request.method or "GET").upper()
-            configured_required = current_app.config.get("AIWAF_REQUIRED_HEADERS")
+            table = self._get_required_table(current_app.config.get("AIWAF_REQUIRED_HEADERS"))
+            required_headers, has_method_override = table.get(req_method) or table["GET"]
 
             use_rust = (
                 current_app.config.get("AIWAF_USE_RUST", False)
                 and current_app.config.get("AIWAF_USE_CSV", True)
                 and rust_backend.rust_available()
             )
-            effective_required_headers = _resolve_required_headers(configured_required, req_method)
-            default_required_headers = _resolve_required_headers(None, req_method)
-            has_method_override = effective_required_headers != default_required_headers
 
             if use_rust and not has_method_override:
                 reason = rust_backend.validate_headers(request.environ)
@@ -203,7 +325,7 @@ class HeaderValidationMiddleware:
                 reason = validate_headers_python(
                     request.environ,
                     method=req_method,
-                    config_required_headers=configured_required,
+                    required_headers=required_headers,
                 )
 
             if reason:
@@ -1,12 +1,30 @@
 # Flask-adapted HoneypotTimingMiddleware
+import hashlib
+import hmac
+import logging
+import os
 import time
-from flask import request, jsonify, current_app
+from flask import request, jsonify, current_app, g, has_request_context
+from markupsafe import Markup, escape
 from .utils import get_ip
 from .blacklist_manager import BlacklistManager
 from .exemption_decorators import should_apply_middleware
 
 _aiwaf_cache = {}
 
+logger = logging.getLogger(__name__)
+
+HONEYPOT_MODE_MEMORY = "memory"
+HONEYPOT_MODE_SIGNED = "signed"
+
+DEFAULT_TOKEN_FIELD = "aiwaf_ts"
+DEFAULT_TOKEN_COOKIE = "aiwaf_ts"
+DEFAULT_TOKEN_MAX_AGE = 3600
+
+# Per-process fallback key, only used when neither AIWAF_HONEYPOT_SECRET nor
+# SECRET_KEY is configured. Tokens signed with it do not verify on other workers.
+_fallback_secret = os.urandom(32)
+
 
 def _is_authenticated_request() -> bool:
     """Best-effort auth detection without introducing hard dependencies."""
@@ -18,6 +36,87 @@ def _is_authenticated_request() -> bool:
         return False
 
 
+def _get_signing_key(app):
+    secret = app.config.get("AIWAF_HONEYPOT_SECRET") or app.secret_key
+    if not secret:
+        return _fallback_secret
+    if isinstance(secret, str):
+        secret = secret.encode("utf-8")
+    return secret
+
+
+def _sign(key, issued_at, ip):
+    message = f"{issued_at}|{ip or ''}".encode("utf-8")
+    return hmac.new(key, message, hashlib.sha256).hexdigest()
+
+
+def _client_ip(ip):
+    if ip is None and has_request_context():
+        return get_ip()
+    return ip
+
+
+def make_form_token(app=None, now=None, ip=None):
+    """Return a signed ``<issued_at>.<signature>`` token for the current time.
+
+    The signature also covers the client IP (the requester's by default), so
+    a token only verifies for the address it was issued to.
+    """
+    app = app or current_app
+    issued_at = f"{time.time() if now is None else now:.3f}"
+    return f"{issued_at}.{_sign(_get_signing_key(app), issued_at, _client_ip(ip))}"
+
+
+def verify_form_token(token, app=None, ip=None, now=None):
+    """Return the issue timestamp of a valid token, or None if missing/tampered/expired.
+
+    Tokens older than ``AIWAF_HONEYPOT_TOKEN_MAX_AGE`` seconds, or issued to
+    another IP, are rejected.
+    """
+    if not token or not isinstance(token, str):
+        return None
+    # The timestamp itself contains a dot, so split on the last one.
+    issued_at, _, signature = token.rpartition(".")
+    if not issued_at or not signature:
+        return None
+    app = app or current_app
+    expected = _sign(_get_signing_key(app), issued_at, _client_ip(ip))
+    if not hmac.compare_digest(expected, signature):
+        return None
+    try:
+        issued = float(issued_at)
+    except ValueError:
+        return None
+    max_age = app.config.get("AIWAF_HONEYPOT_TOKEN_MAX_AGE", DEFAULT_TOKEN_MAX_AGE)
+    now = time.time() if now is None else now
+    if max_age is not None and now - issued > max_age:
+        return None
+    return issued
+
+
+def _render_token(app):
+    """Token for a form being rendered; after_request sends the same one as the cookie."""
+    token = g.get("_aiwaf_form_token")
+    if token is None:
+        token = g._aiwaf_form_token = make_form_token(app)
+    return token
+
+
+def _get_submitted_token(app):
+    field = app.config.get("AIWAF_HONEYPOT_FIELD", DEFAULT_TOKEN_FIELD)
+    token = None
+    if field:
+        try:
+            token = request.form.get(field)
+        except Exception:
+            token = None
+    if not token:
+        cookie_name = app.config.get("AIWAF_HONEYPOT_COOKIE", DEFAULT_TOKEN_COOKIE)
+        if cookie_name:
+            token = request.cookies.get(cookie_name)
+    return token
+
+
 class HoneypotTimingMiddleware:
     def __init__(self, app=None):
         self.app = app
@@ -25,6 +124,27 @@ class HoneypotTimingMiddleware:
             self.init_app(app)
 
     def init_app(self, app):
+        @app.context_processor
+        def honeypot_context():
+            def aiwaf_honeypot_field():
+                field = app.config.get("AIWAF_HONEYPOT_FIELD", DEFAULT_TOKEN_FIELD)
+                return Markup(
+                    f'<input type="hidden" name="{escape(field)}" '
+                    f'value="{escape(_render_token(app))}">'
+                )
+
+            return {
+                "aiwaf_honeypot_token": lambda: _render_token(app),
+                "aiwaf_honeypot_field": aiwaf_honeypot_field,
+            }
+
+        if (app.config.get("AIWAF_HONEYPOT_MODE", HONEYPOT_MODE_MEMORY) == HONEYPOT_MODE_SIGNED
+                and not (app.config.get("AIWAF_HONEYPOT_SECRET") or app.secret_key)):
+            logger.warning(
+                "AIWAF_HONEYPOT_MODE='signed' without AIWAF_HONEYPOT_SECRET or SECRET_KEY; "
+                "form tokens will only verify on the worker that issued them"
+            )
+
         @app.before_request
         def before_request():
             # Check exemption status first - skip if exempt from honeypot detection
@@ -33,16 +153,38 @@ class HoneypotTimingMiddleware:
 
             if app.config.get("AIWAF_HONEYPOT_SKIP_AUTHENTICATED", True) and _is_authenticated_request():
                 return None
-            
+
             ip = get_ip()
             now = time.time()
+            signed = app.config.get("AIWAF_HONEYPOT_MODE", HONEYPOT_MODE_MEMORY) == HONEYPOT_MODE_SIGNED
             if request.method == "POST":
-                get_time = _aiwaf_cache.get(f"honeypot_get:{ip}")
+                if signed:
+                    get_time = verify_form_token(_get_submitted_token(app), app, ip=ip, now=now)
+                else:
+                    get_time = _aiwaf_cache.get(f"honeypot_get:{ip}")
                 if get_time is not None:
                     time_diff = now - get_time
                     min_time = app.config.get("AIWAF_MIN_FORM_TIME", 1.0)
                     if time_diff < min_time:
                         BlacklistManager.block(ip, f"Form submitted too quickly ({time_diff:.2f}s)")
                         return jsonify({"error": "blocked"}), 403
-            elif request.method == "GET":
+            elif request.method == "GET" and not signed:
                 _aiwaf_cache[f"honeypot_get:{ip}"] = now
+
+        @app.after_request
+        def after_request(response):
+            if app.config.get("AIWAF_HONEYPOT_MODE", HONEYPOT_MODE_MEMORY) != HONEYPOT_MODE_SIGNED:
+                return response
+            # Only responses that rendered a honeypot field or token carry the cookie
+            token = g.get("_aiwaf_form_token")
+            cookie_name = app.config.get("AIWAF_HONEYPOT_COOKIE", DEFAULT_TOKEN_COOKIE)
+            if token is None or not cookie_name or not should_apply_middleware('honeypot'):
+                return response
+            response.set_cookie(
+                cookie_name,
+                token,
+                httponly=True,
+                samesite="Lax",
+                secure=request.is_secure,
+            )
+            return response
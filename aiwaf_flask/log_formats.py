@@ -0,0 +1,278 @@
+"""
+Log format detection and single-pass line parsers for the AIWAF trainer.
+
+A ``LogLineParser`` is created per file. It works out the file's format from
+the first line it recognises: Apache/Nginx combined with ``response-time=``,
+combined (optionally with the ``<n>ms`` response time that
+``AIWAFLoggingMiddleware`` appends), common, the AIWAF CSV schema (from its
+header row) or JSON lines. Every later line is parsed with that format's
+parser. Apache-style lines are matched by one anchored pattern made of
+negated character classes, so a non-matching line fails in linear time
+whatever its user-agent holds. Timestamps use a cached per-day offset instead
+of ``datetime.strptime``.
+
+Parsers return ``(ip, epoch, path, status, response_time)`` tuples, where
+epoch is seconds since the epoch with naive timestamps read as UTC, status is
+an int and response_time is in seconds.
+"""
+
+import csv
+import json
+import re
+from datetime import datetime, timedelta
+from functools import lru_cache
+
+_EPOCH = datetime(1970, 1, 1)
+
+FORMAT_COMBINED_RT = "combined_rt"
+FORMAT_COMBINED = "combined"
+FORMAT_COMMON = "common"
+FORMAT_CSV = "csv"
+FORMAT_JSON = "json"
+
+# ip ident user [timestamp] "METHOD path PROTOCOL" status size
+_REQUEST_LINE = re.compile(r'(\S+) \S+ \S+ \[([^\]]*)\] "(\S+) ([^\s"]+)(?: [^"]*)?" (\d{3}) (?:\d+|-)')
+# "referer" "user-agent" [<n>ms] following the request line
+_COMBINED_TAIL = re.compile(r' "[^"]*" "[^"]*"(?: (\d+)ms)?')
+_RESPONSE_TIME_KEY = "response-time="
+
+_MONTHS = {name: number for number, name in enumerate(
+    ("Jan", "Feb", "Mar", "Apr", "May", "Jun", "Jul", "Aug", "Sep", "Oct", "Nov", "Dec"), 1)}
+
+_CSV_REQUIRED = {"timestamp", "ip", "path", "status_code"}
+
+
+def to_epoch(ts):
+    """Seconds since the epoch; naive datetimes are read as UTC so differences stay exact."""
+    if ts.tzinfo is not None:
+        return ts.timestamp()
+    return (ts - _EPOCH).total_seconds()
+
+
+def from_epoch(epoch):
+    """Naive UTC datetime for an epoch produced by to_epoch."""
+    return _EPOCH + timedelta(seconds=epoch)
+
+
+@lru_cache(maxsize=1024)
+def _day_epoch(day):
+    """Epoch of midnight UTC for an Apache date such as '10/Oct/2025'."""
+    return to_epoch(datetime(int(day[7:11]), _MONTHS[day[3:6]], int(day[:2])))
+
+
+def parse_timestamp(value):
+    """Epoch seconds for an Apache ('10/Oct/2025:13:55:36 +0000') or ISO timestamp, or None.
+
+    The Apache zone offset is ignored, as the trainer always has.
+    """
+    if (len(value) >= 20 and value[2] == "/" and value[6] == "/" and value[11] == ":"
+            and value[14] == ":" and value[17] == ":"):
+        try:
+            return (_day_epoch(value[:11]) + int(value[12:14]) * 3600
+                    + int(value[15:17]) * 60 + int(value[18:20]))
+        except (KeyError, ValueError):
+            pass
+    if value[4:5] != "-":
+        try:
+            return to_epoch(datetime.strptime(value.split()[0], "%d/%b/%Y:%H:%M:%S"))
+        except (ValueError, IndexError):
+            pass
+    try:
+        return to_epoch(datetime.fromisoformat(value.replace("Z", "+00:00")))
+    except ValueError:
+        return None
+
+
+def _float(value, default=0.0):
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return default
+
+
+def record_from_row(row):
+    """Build a record tuple from a CSV/JSON row dict, or None if it lacks the core fields.
+
+    ``response_time_ms`` (AIWAFLoggingMiddleware) is converted to seconds;
+    ``response_time`` (AIWAFLoggerMiddleware) is already in seconds.
+    """
+    try:
+        ip = row["ip"]
+        path = row["path"]
+        status = int(row["status_code"])
+        timestamp = row["timestamp"]
+    except (KeyError, TypeError, ValueError):
+        return None
+    if not ip or not path or not timestamp:
+        return None
+    epoch = parse_timestamp(str(timestamp))
+    if epoch is None:
+        return None
+    if row.get("response_time_ms") not in (None, ""):
+        response_time = _float(row["response_time_ms"]) / 1000.0
+    else:
+        response_time = _float(row.get("response_time"))
+    return ip, epoch, path, status, response_time
+
+
+def _request_line(line):
+    m = _REQUEST_LINE.match(line)
+    if m is None:
+        return None, None
+    epoch = parse_timestamp(m.group(2))
+    if epoch is None:
+        return None, None
+    return m, epoch
+
+
+def _parse_common(line):
+    m, epoch = _request_line(line)
+    if m is None:
+        return None
+    return m.group(1), epoch, m.group(4), int(m.group(5)), 0.0
+
+
+def _parse_combined(line):
+    m, epoch = _request_line(line)
+    if m is None:
+        return None
+    response_time = 0.0
+    tail = _COMBINED_TAIL.match(line, m.end())
+    if tail is not None and tail.group(1):
+        response_time = int(tail.group(1)) / 1000.0
+    return m.group(1), epoch, m.group(4), int(m.group(5)), response_time
+
+
+def _parse_combined_rt(line):
+    m, epoch = _request_line(line)
+    if m is None:
+        return None
+    response_time = 0.0
+    pos = line.find(_RESPONSE_TIME_KEY, m.end())
+    if pos != -1:
+        start = pos + len(_RESPONSE_TIME_KEY)
+        end = start
+        while end < len(line) and (line[end].isdigit() or line[end] == "."):
+            end += 1
+        response_time = _float(line[start:end])
+    return m.group(1), epoch, m.group(4), int(m.group(5)), response_time
+
+
+def _parse_json(line):
+    try:
+        row = json.loads(line)
+    except ValueError:
+        return None
+    return record_from_row(row) if isinstance(row, dict) else None
+
+
+_LINE_PARSERS = {
+    FORMAT_COMBINED_RT: _parse_combined_rt,
+    FORMAT_COMBINED: _parse_combined,
+    FORMAT_COMMON: _parse_common,
+    FORMAT_JSON: _parse_json,
+}
+
+
+def _csv_header(line):
+    """Field names if line is a CSV header carrying the AIWAF request columns."""
+    if "," not in line:
+        return None
+    fields = next(csv.reader([line]), [])
+    fields = [field.strip() for field in fields]
+    return fields if _CSV_REQUIRED.issubset(fields) else None
+
+
+def detect_format(line):
+    """Return (format, csv_fieldnames) for a line, or (None, None) if unrecognised."""
+    stripped = line.strip()
+    if not stripped:
+        return None, None
+    if stripped[0] == "{":
+        return FORMAT_JSON, None
+    fieldnames = _csv_header(stripped)
+    if fieldnames:
+        return FORMAT_CSV, fieldnames
+    m = _REQUEST_LINE.match(stripped)
+    if m is None:
+        return None, None
+    if stripped.find(_RESPONSE_TIME_KEY, m.end()) != -1:
+        return FORMAT_COMBINED_RT, None
+    if _COMBINED_TAIL.match(stripped, m.end()):
+        return FORMAT_COMBINED, None
+    return FORMAT_COMMON, None
+
+
+def csv_line_records(lines, fieldnames=None):
+    """Yield record tuples from CSV lines; fieldnames None reads them from the first line."""
+    for row in csv.DictReader(lines, fieldnames=fieldnames):
+        record = record_from_row(row)
+        if record is not None:
+            yield record
+
+
+def json_line_records(lines):
+    """Yield record tuples from JSON lines."""
+    for line in lines:
+        record = _parse_json(line)
+        if record is not None:
+            yield record
+
+
+def iter_csv_records(path):
+    """Yield record tuples from a CSV request log with a header row.
+
+    Reads both the AIWAFLoggingMiddleware and AIWAFLoggerMiddleware schemas;
+    rows missing the core columns are skipped.
+    """
+    with open(path, "r", newline="", errors="ignore") as f:
+        yield from csv_line_records(f)
+
+
+def iter_json_records(path):
+    """Yield record tuples from a JSON-lines request log."""
+    with open(path, "r", errors="ignore") as f:
+        yield from json_line_records(f)
+
+
+class LogLineParser:
+    """Parses the lines of one log file with the format detected from its content.
+
+    The format is fixed by the first recognised line (for CSV, its header
+    row). A line that the current format cannot parse is checked again, so a
+    file whose format changes part way through is still read.
+    """
+
+    def __init__(self):
+        self.format = None
+        self.fieldnames = None
+
+    def _parse_as(self, fmt, line):
+        if fmt == FORMAT_CSV:
+            values = next(csv.reader([line]), None)
+            if not values or len(values) != len(self.fieldnames):
+                return None
+            return record_from_row(dict(zip(self.fieldnames, values)))
+        return _LINE_PARSERS[fmt](line)
+
+    def parse(self, line):
+        """Return a record tuple for line, or None (header rows and unparseable lines)."""
+        if self.format is not None:
+            record = self._parse_as(self.format, line)
+            if record is not None:
+                return record
+        fmt, fieldnames = detect_format(line)
+        if fmt is None:
+            return None
+        if fmt == FORMAT_CSV:
+            self.format, self.fieldnames = fmt, fieldnames
+            return None
+        if fmt == self.format:
+            return None  # already tried with this format
+        self.format = fmt
+        return self._parse_as(fmt, line)
+
+
+def parse_line(line):
+    """Parse a single line of any supported self-describing format (not CSV rows)."""
+    return LogLineParser().parse(line)
@@ -0,0 +1,129 @@
+"""
+Incremental line counts for the AIWAF log directory.
+
+The anomaly middleware only enables the AI model once the log directory holds
+``AIWAF_MIN_AI_LOGS`` lines. Rather than re-reading every file, a small JSON
+index keeps one record per file (device, inode, size, newline count at that
+size). A refresh only counts newlines in bytes appended since the last one;
+files that were rotated (new inode) or truncated are counted again from the
+start.
+"""
+
+import glob
+import json
+import logging
+import mmap
+import os
+import threading
+
+LOG_PATTERNS = ('*.log', '*.csv', '*.json', '*.jsonl')
+
+# Hidden, so it never matches LOG_PATTERNS itself
+INDEX_FILENAME = '.aiwaf_log_index.json'
+
+# Bump when the record layout changes so old index files are ignored.
+_INDEX_FORMAT = 1
+
+_CHUNK_BYTES = 16 * 1024 * 1024
+
+logger = logging.getLogger("aiwaf.log_index")
+
+
+def count_newlines(path, start, end):
+    """Count newlines in bytes [start, end) of path.
+
+    Returns (count, partial) where partial is True when byte end-1 is not a
+    newline, i.e. the file ends in an unterminated line.
+    """
+    if end <= 0:
+        return 0, False
+    with open(path, 'rb') as f:
+        with mmap.mmap(f.fileno(), end, access=mmap.ACCESS_READ) as mm:
+            count = 0
+            for pos in range(start, end, _CHUNK_BYTES):
+                count += mm[pos:min(pos + _CHUNK_BYTES, end)].count(b'\n')
+            return count, mm[end - 1] != 0x0A
+
+
+class LogVolumeIndex:
+    """Persisted per-file line counts for one log directory."""
+
+    def __init__(self, log_dir, index_path=None):
+        self.log_dir = log_dir
+        self.index_path = index_path or os.path.join(log_dir, INDEX_FILENAME)
+        self.total_lines = 0
+        self._files = None
+        self._lock = threading.Lock()
+
+    def _load(self):
+        try:
+            with open(self.index_path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return {}
+        if data.get('format') != _INDEX_FORMAT or data.get('log_dir') != os.path.abspath(self.log_dir):
+            return {}
+        return data.get('files', {})
+
+    def _save(self):
+        tmp_path = f"{self.index_path}.{os.getpid()}.tmp"
+        try:
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump({
+                    'format': _INDEX_FORMAT,
+                    'log_dir': os.path.abspath(self.log_dir),
+                    'files': self._files,
+                }, f, separators=(',', ':'))
+            os.replace(tmp_path, self.index_path)
+        except OSError as e:
+            # A read-only log dir only costs a full count on the next start.
+            logger.debug(f"Could not write log index {self.index_path}: {e}")
+
+    def _count(self, path, stat, record):
+        same_file = (
+            record is not None
+            and record['dev'] == stat.st_dev
+            and record['ino'] == stat.st_ino
+            and stat.st_size >= record['size']
+        )
+        if same_file and stat.st_size == record['size']:
+            return record
+
+        if same_file:
+            added, partial = count_newlines(path, record['size'], stat.st_size)
+            newlines = record['newlines'] + added
+        else:
+            newlines, partial = count_newlines(path, 0, stat.st_size)
+        return {
+            'dev': stat.st_dev,
+            'ino': stat.st_ino,
+            'size': stat.st_size,
+            'newlines': newlines,
+            'partial': partial,
+        }
+
+    def refresh(self):
+        """Bring the index up to date and return the total line count."""
+        with self._lock:
+            if self._files is None:
+                self._files = self._load()
+
+            files = {}
+            for pattern in LOG_PATTERNS:
+                for path in glob.glob(os.path.join(self.log_dir, pattern)):
+                    record = self._files.get(path)
+                    try:
+                        files[path] = self._count(path, os.stat(path), record)
+                    except (OSError, ValueError) as e:
+                        # Vanished or truncated mid-count; keep what we had.
+                        logger.debug(f"Error indexing {path}: {e}")
+                        if record is not None:
+                            files[path] = record
+
+            changed = files != self._files
+            self._files = files
+            if changed:
+                self._save()
+
+            self.total_lines = sum(r['newlines'] + bool(r['partial']) for r in files.values())
+            return self.total_lines
@@ -0,0 +1,306 @@
+"""
+Log ingestion for the AIWAF trainer.
+
+Parsed log records are kept in a ``LogRecords`` column store instead of a
+list of dicts: IPs and paths are interned once, and each record costs a few
+fixed-width array slots. Together with line generators that never hold a whole
+file in memory, training memory grows with the number of unique IPs and paths
+and the size of the feature matrix, not with the raw text of the logs.
+
+Large logs can also be parsed in parallel. Plain files are split into tasks at
+newline-aligned byte offsets and each gzipped rotation is one task. The tasks
+are parsed in a ``ProcessPoolExecutor``. Each task reads the first line of its
+file to detect the file's format (see ``log_formats``), so every chunk of a
+file is parsed the same way. Each worker sends back its own
+``LogRecords`` (a few arrays plus the IPs and paths it saw), and the parent
+merges them in task order. Tasks over CSV and JSON-lines request logs are
+read with the typed row readers of ``log_formats``; a CSV chunk takes its
+column names from the file's header row.
+"""
+
+import csv
+import gzip
+import logging
+import os
+from array import array
+from collections import defaultdict, deque
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from functools import partial
+from itertools import islice
+
+from .log_formats import LogLineParser, csv_line_records, json_line_records, to_epoch
+
+# Smallest byte range worth shipping to a worker process
+MIN_CHUNK_BYTES = 4 * 1024 * 1024
+
+# Request logs written by the AIWAF logging middlewares, read as typed rows
+STRUCTURED_SUFFIXES = (".csv", ".json", ".jsonl")
+
+logger = logging.getLogger("aiwaf.log_ingest")
+
+
+class LogRecords:
+    """Columnar store of parsed log records (ip, epoch, path, status, response time)."""
+
+    def __init__(self):
+        self.ips = []
+        self.paths = []
+        self._ip_ids = {}
+        self._path_ids = {}
+        self.ip_ids = array("I")
+        self.epochs = array("d")
+        self.path_ids = array("I")
+        self.statuses = array("H")
+        self.resp_times = array("d")
+
+    def __len__(self):
+        return len(self.epochs)
+
+    def _intern(self, value, ids, values):
+        value_id = ids.get(value)
+        if value_id is None:
+            value_id = ids[value] = len(values)
+            values.append(value)
+        return value_id
+
+    def append(self, ip, timestamp, path, status, response_time=0.0):
+        """Add one record; timestamp is a datetime or an epoch float, status a code."""
+        if isinstance(timestamp, datetime):
+            timestamp = to_epoch(timestamp)
+        status = int(status)
+        self.ip_ids.append(self._intern(ip, self._ip_ids, self.ips))
+        self.epochs.append(timestamp)
+        self.path_ids.append(self._intern(path, self._path_ids, self.paths))
+        self.statuses.append(status if 0 <= status <= 0xFFFF else 0)
+        self.resp_times.append(response_time)
+
+    def extend(self, other):
+        """Append every record of another LogRecords, re-mapping its interned ids."""
+        ip_map = [self._intern(ip, self._ip_ids, self.ips) for ip in other.ips]
+        path_map = [self._intern(path, self._path_ids, self.paths) for path in other.paths]
+        self.ip_ids.extend(ip_map[i] for i in other.ip_ids)
+        self.epochs.extend(other.epochs)
+        self.path_ids.extend(path_map[i] for i in other.path_ids)
+        self.statuses.extend(other.statuses)
+        self.resp_times.extend(other.resp_times)
+
+    def __getstate__(self):
+        # The lookup dicts duplicate ips/paths; rebuild them instead of pickling.
+        state = self.__dict__.copy()
+        del state["_ip_ids"], state["_path_ids"]
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._ip_ids = {ip: i for i, ip in enumerate(self.ips)}
+        self._path_ids = {path: i for i, path in enumerate(self.paths)}
+
+    def add_parsed(self, rec):
+        """Add a record dict as returned by FlaskAITrainer._parse."""
+        self.append(rec["ip"], rec["timestamp"], rec["path"], rec["status"], rec["response_time"])
+
+    def rows(self):
+        """Yield (ip, epoch, path, status, response_time) tuples in insertion order."""
+        ips, paths = self.ips, self.paths
+        for ip_id, epoch, path_id, status, resp_time in zip(
+            self.ip_ids, self.epochs, self.path_ids, self.statuses, self.resp_times
+        ):
+            yield ips[ip_id], epoch, paths[path_id], status, resp_time
+
+    def epochs_by_ip(self):
+        """Map each IP to the list of its record epochs."""
+        grouped = defaultdict(list)
+        for ip_id, epoch in zip(self.ip_ids, self.epochs):
+            grouped[self.ips[ip_id]].append(epoch)
+        return grouped
+
+
+def resolve_jobs(jobs):
+    """Worker process count: None means serial, 0 or less means one per CPU."""
+    if jobs is None:
+        return 1
+    jobs = int(jobs)
+    if jobs < 1:
+        return os.cpu_count() or 1
+    return jobs
+
+
+def split_file(path, chunk_bytes, start=0, end=None):
+    """Split bytes [start, end) of path (end defaults to its size) into ranges ending on newlines."""
+    size = os.path.getsize(path) if end is None else end
+    ranges = []
+    with open(path, "rb") as f:
+        while start < size:
+            f.seek(min(start + chunk_bytes, size))
+            f.readline()  # run on to the end of the current line
+            end = min(f.tell(), size)
+            ranges.append((start, end))
+            start = end
+    return ranges
+
+
+def last_line_end(path, size):
+    """Offset just past the last newline within the first size bytes of path (0 if none)."""
+    with open(path, "rb") as f:
+        pos = size
+        while pos > 0:
+            block = min(64 * 1024, pos)
+            f.seek(pos - block)
+            newline = f.read(block).rfind(b"\n")
+            if newline != -1:
+                return pos - block + newline + 1
+            pos -= block
+    return 0
+
+
+def split_ranges(ranges, jobs, chunk_bytes=None):
+    """Turn (path, start, end) byte ranges into parse tasks; end None is a whole gzip file."""
+    tasks = []
+    for path, start, end in ranges:
+        if end is None or (jobs <= 1 and not chunk_bytes):
+            tasks.append((path, start, end))
+            continue
+        step = chunk_bytes or max(MIN_CHUNK_BYTES, (end - start) // (jobs * 4) + 1)
+        try:
+            tasks.extend((path, s, e) for s, e in split_file(path, step, start, end))
+        except OSError as e:
+            logger.info(f"Warning: Could not read log file {path}: {e}")
+    return tasks
+
+
+def plan_log_tasks(paths, jobs, chunk_bytes=None):
+    """Build (path, start, end) parse tasks; gzip files are one task with end None."""
+    ranges = []
+    for path in paths:
+        if path.endswith(".gz"):
+            ranges.append((path, 0, None))
+            continue
+        try:
+            ranges.append((path, 0, os.path.getsize(path)))
+        except OSError as e:
+            logger.info(f"Warning: Could not read log file {path}: {e}")
+    return split_ranges(ranges, jobs, chunk_bytes)
+
+
+def iter_task_lines(task):
+    """Yield the text lines covered by one parse task.
+
+    For a gzip task (end None) start counts decompressed bytes to skip.
+    """
+    path, start, end = task
+    if end is None:
+        with gzip.open(path, "rb") as f:
+            pos = 0
+            for raw in f:
+                pos += len(raw)
+                if pos > start:
+                    yield raw.decode("utf-8", errors="ignore")
+        return
+    with open(path, "rb") as f:
+        f.seek(start)
+        pos = start
+        for raw in f:
+            if pos >= end:
+                break
+            pos += len(raw)
+            yield raw.decode("utf-8", errors="ignore")
+
+
+def _read_first_line(path):
+    opener = gzip.open if path.endswith(".gz") else open
+    with opener(path, "rb") as f:
+        return f.readline().decode("utf-8", errors="ignore")
+
+
+def _parse_structured_task(task, records, limit=None):
+    """Parse a byte range of a CSV or JSON-lines request log; returns the lines read."""
+    path, start, end = task
+    line_count = 0
+
+    def lines(start):
+        nonlocal line_count
+        for line in iter_task_lines((path, start, end)):
+            line_count += 1
+            yield line
+
+    if path.endswith(".csv"):
+        with open(path, "rb") as f:
+            header = f.readline()
+        fieldnames = next(csv.reader([header.decode("utf-8", errors="ignore")]), None)
+        if not fieldnames:
+            return 0
+        rows = csv_line_records(lines(max(start, len(header))), fieldnames)
+    else:
+        rows = json_line_records(lines(start))
+    for record in rows:
+        records.append(*record)
+        if limit and len(records) >= limit:
+            break
+    return line_count
+
+
+def parse_log_task(task, records=None, limit=None):
+    """Parse one task into records (a new LogRecords by default); returns (lines, records).
+
+    With limit, parsing stops once records holds that many records.
+    """
+    records = LogRecords() if records is None else records
+    parser = LogLineParser()
+    line_count = 0
+    try:
+        if task[0].endswith(STRUCTURED_SUFFIXES):
+            return _parse_structured_task(task, records, limit), records
+        if task[1]:
+            # A chunk from the middle of a file: learn the format from its head.
+            parser.parse(_read_first_line(task[0]))
+        for line in iter_task_lines(task):
+            line_count += 1
+            record = parser.parse(line)
+            if record:
+                records.append(*record)
+                if limit and len(records) >= limit:
+                    break
+    except (OSError, EOFError) as e:
+        logger.info(f"Warning: Could not read log file {task[0]}: {e}")
+    return line_count, records
+
+
+def parse_log_tasks(tasks, jobs=1, limit=None):
+    """Parse tasks across jobs processes and merge them in order; returns (lines, LogRecords).
+
+    With limit, no further tasks are parsed once that many records are in;
+    the result may hold a few more, from tasks already under way.
+    """
+    jobs = min(resolve_jobs(jobs), len(tasks))
+    if jobs <= 1:
+        records = LogRecords()
+        line_count = 0
+        for task in tasks:
+            line_count += parse_log_task(task, records, limit)[0]
+            if limit and len(records) >= limit:
+                break
+        return line_count, records
+
+    records = LogRecords()
+    line_count = 0
+    with ProcessPoolExecutor(max_workers=jobs) as executor:
+        if not limit:
+            for count, partial_records in executor.map(parse_log_task, tasks):
+                line_count += count
+                records.extend(partial_records)
+            return line_count, records
+        # Keep only a couple of tasks per worker in flight so a limit stops the work early
+        parse = partial(parse_log_task, limit=limit)
+        remaining = iter(tasks)
+        pending = deque(executor.submit(parse, task) for task in islice(remaining, jobs * 2))
+        while pending:
+            count, partial_records = pending.popleft().result()
+            line_count += count
+            records.extend(partial_records)
+            if len(records) >= limit:
+                for future in pending:
+                    future.cancel()
+                break
+            pending.extend(executor.submit(parse, task) for task in islice(remaining, 1))
+    return line_count, records
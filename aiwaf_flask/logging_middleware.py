@@ -8,10 +8,13 @@ Creates standard web server access logs with AIWAF security annotations.
 import csv
 import os
 import logging
+from concurrent.futures import ProcessPoolExecutor
+from itertools import repeat
 from datetime import datetime
 from pathlib import Path
 from flask import request, g
 from .exemption_decorators import should_apply_middleware
+from .log_ingest import MIN_CHUNK_BYTES, iter_task_lines, resolve_jobs, split_file
 import time
 
 logger = logging.getLogger(__name__)
@@ -254,15 +257,8 @@ def get_logging_middleware():
 
 
 # Utility functions for log analysis (Gunicorn/Nginx style)
-def analyze_access_logs(log_dir='aiwaf_logs', log_format='combined'):
-    """Analyze access logs in standard web server format."""
-    log_path = Path(log_dir)
-    access_log = log_path / 'access.log'
-    
-    if not access_log.exists():
-        return {"error": "Access log not found"}
-    
-    stats = {
+def _new_log_stats():
+    return {
         'total_requests': 0,
         'blocked_requests': 0,
         'status_codes': {},
@@ -274,9 +270,27 @@ def analyze_access_logs(log_dir='aiwaf_logs', log_format='combined'):
         'response_times': [],
         'blocked_reasons': {}
     }
+
+
+def analyze_access_logs(log_dir='aiwaf_logs', log_format='combined', jobs=None):
+    """Analyze access logs in standard web server format.
+    
+    With jobs > 1 the log is split into newline-aligned chunks that are
+    analyzed in worker processes and merged.
+    """
+    log_path = Path(log_dir)
+    access_log = log_path / 'access.log'
+    
+    if not access_log.exists():
+        return {"error": "Access log not found"}
+    
+    stats = _new_log_stats()
     
     try:
-        if log_format == 'csv':
+        jobs = resolve_jobs(jobs)
+        if jobs > 1:
+            _analyze_logs_parallel(str(access_log), log_format, stats, jobs)
+        elif log_format == 'csv':
             _analyze_csv_logs(access_log, stats)
         elif log_format == 'json':
             _analyze_json_logs(access_log, stats)
@@ -300,84 +314,153 @@ def analyze_access_logs(log_dir='aiwaf_logs', log_format='combined'):
     return stats
 
 
+def _analyze_logs_parallel(log_file, log_format, stats, jobs):
+    """Analyze newline-aligned chunks of log_file across jobs processes."""
+    start = 0
+    fieldnames = None
+    if log_format == 'csv':
+        # Workers only see their own byte range, so hand them the header.
+        with open(log_file, 'rb') as f:
+            header = f.readline()
+            start = f.tell()
+        fieldnames = next(csv.reader([header.decode('utf-8', errors='ignore')]), None)
+        if not fieldnames:
+            return
+    
+    size = os.path.getsize(log_file)
+    chunk_bytes = max(MIN_CHUNK_BYTES, size // (jobs * 4) + 1)
+    tasks = [(log_file, chunk_start, chunk_end)
+             for chunk_start, chunk_end in split_file(log_file, chunk_bytes, start)]
+    if len(tasks) <= 1:
+        for task in tasks:
+            _merge_log_stats(stats, _analyze_log_chunk(task, log_format, fieldnames))
+        return
+    
+    with ProcessPoolExecutor(max_workers=min(jobs, len(tasks))) as executor:
+        for partial in executor.map(_analyze_log_chunk, tasks, repeat(log_format), repeat(fieldnames)):
+            _merge_log_stats(stats, partial)
+
+
+def _analyze_log_chunk(task, log_format, fieldnames=None):
+    """Analyze one (path, start, end) byte range; returns a partial stats dict."""
+    stats = _new_log_stats()
+    lines = iter_task_lines(task)
+    if log_format == 'csv':
+        _analyze_csv_lines(lines, stats, fieldnames)
+    elif log_format == 'json':
+        _analyze_json_lines(lines, stats)
+    else:
+        _analyze_combined_lines(lines, stats)
+    return stats
+
+
+def _merge_log_stats(stats, partial):
+    """Add a partial stats dict (from one chunk) into stats."""
+    for key, value in partial.items():
+        if isinstance(value, dict):
+            counts = stats[key]
+            for item, count in value.items():
+                counts[item] = counts.get(item, 0) + count
+        elif isinstance(value, list):
+            stats[key].extend(value)
+        else:
+            stats[key] += value
+
+
 def _analyze_csv_logs(log_file, stats):
     """Analyze CSV format logs."""
     with open(log_file, 'r', encoding='utf-8') as f:
-        reader = csv.DictReader(f)
-        for row in reader:
+        _analyze_csv_lines(f, stats)
+
+
+def _analyze_csv_lines(lines, stats, fieldnames=None):
+    """Analyze CSV log lines; fieldnames is given when lines has no header row."""
+    reader = csv.DictReader(lines, fieldnames=fieldnames)
+    for row in reader:
+        stats['total_requests'] += 1
+        
+        # Track status codes
+        status = row.get('status_code', '0')
+        stats['status_codes'][status] = stats['status_codes'].get(status, 0) + 1
+        
+        # Track IPs
+        ip = row.get('ip', 'unknown')
+        stats['ips'][ip] = stats['ips'].get(ip, 0) + 1
+        
+        # Track paths
+        path = row.get('path', 'unknown')
+        stats['paths'][path] = stats['paths'].get(path, 0) + 1
+        
+        # Track methods
+        method = row.get('method', 'unknown')
+        stats['methods'][method] = stats['methods'].get(method, 0) + 1
+        
+        # Track blocked requests
+        if row.get('blocked', '').lower() == 'true':
+            stats['blocked_requests'] += 1
+            reason = row.get('block_reason', 'unknown')
+            stats['blocked_reasons'][reason] = stats['blocked_reasons'].get(reason, 0) + 1
+        
+        # Track response times
+        try:
+            response_time = int(row.get('response_time_ms', 0))
+            stats['response_times'].append(response_time)
+        except:
+            pass
+        
+        # Track hourly distribution
+        try:
+            timestamp = row.get('timestamp', '')
+            hour = timestamp.split('T')[1].split(':')[0] if 'T' in timestamp else '00'
+            stats['hourly_distribution'][hour] = stats['hourly_distribution'].get(hour, 0) + 1
+        except:
+            pass
+
+
+def _analyze_json_logs(log_file, stats):
+    """Analyze JSON format logs."""
+    with open(log_file, 'r', encoding='utf-8') as f:
+        _analyze_json_lines(f, stats)
+
+
+def _analyze_json_lines(lines, stats):
+    """Analyze JSON log lines."""
+    import json
+    
+    for line in lines:
+        try:
+            row = json.loads(line.strip())
             stats['total_requests'] += 1
             
-            # Track status codes
-            status = row.get('status_code', '0')
+            # Similar analysis as CSV but with JSON structure
+            status = str(row.get('status_code', 0))
             stats['status_codes'][status] = stats['status_codes'].get(status, 0) + 1
             
-            # Track IPs
             ip = row.get('ip', 'unknown')
             stats['ips'][ip] = stats['ips'].get(ip, 0) + 1
             
-            # Track paths
-            path = row.get('path', 'unknown')
-            stats['paths'][path] = stats['paths'].get(path, 0) + 1
-            
-            # Track methods
-            method = row.get('method', 'unknown')
-            stats['methods'][method] = stats['methods'].get(method, 0) + 1
-            
-            # Track blocked requests
-            if row.get('blocked', '').lower() == 'true':
+            if row.get('blocked', False):
                 stats['blocked_requests'] += 1
                 reason = row.get('block_reason', 'unknown')
                 stats['blocked_reasons'][reason] = stats['blocked_reasons'].get(reason, 0) + 1
             
-            # Track response times
-            try:
-                response_time = int(row.get('response_time_ms', 0))
+            # Response times
+            response_time = row.get('response_time_ms', 0)
+            if response_time:
                 stats['response_times'].append(response_time)
-            except:
-                pass
-            
-            # Track hourly distribution
-            try:
-                timestamp = row.get('timestamp', '')
-                hour = timestamp.split('T')[1].split(':')[0] if 'T' in timestamp else '00'
-                stats['hourly_distribution'][hour] = stats['hourly_distribution'].get(hour, 0) + 1
-            except:
-                pass
-
-
-def _analyze_json_logs(log_file, stats):
-    """Analyze JSON format logs."""
-    import json
-    
-    with open(log_file, 'r', encoding='utf-8') as f:
-        for line in f:
-            try:
-                row = json.loads(line.strip())
-                stats['total_requests'] += 1
-                
-                # Similar analysis as CSV but with JSON structure
-                status = str(row.get('status_code', 0))
-                stats['status_codes'][status] = stats['status_codes'].get(status, 0) + 1
-                
-                ip = row.get('ip', 'unknown')
-                stats['ips'][ip] = stats['ips'].get(ip, 0) + 1
                 
-                if row.get('blocked', False):
-                    stats['blocked_requests'] += 1
-                    reason = row.get('block_reason', 'unknown')
-                    stats['blocked_reasons'][reason] = stats['blocked_reasons'].get(reason, 0) + 1
-                
-                # Response times
-                response_time = row.get('response_time_ms', 0)
-                if response_time:
-                    stats['response_times'].append(response_time)
-                    
-            except json.JSONDecodeError:
-                continue
+        except json.JSONDecodeError:
+            continue
 
 
 def _analyze_combined_logs(log_file, stats):
     """Analyze Combined/Common log format."""
+    with open(log_file, 'r', encoding='utf-8') as f:
+        _analyze_combined_lines(f, stats)
+
+
+def _analyze_combined_lines(lines, stats):
+    """Analyze Combined/Common log lines."""
     import re
     
     # Combined log format regex
@@ -387,24 +470,23 @@ def _analyze_combined_logs(log_file, stats):
         r'(?:\s+(?P<response_time>\d+)ms)?(?:\s+(?P<blocked>\S+))?(?:\s+"(?P<block_reason>[^"]*)")?'
     )
     
-    with open(log_file, 'r', encoding='utf-8') as f:
-        for line in f:
-            match = log_pattern.match(line.strip())
-            if match:
-                stats['total_requests'] += 1
-                data = match.groupdict()
-                
-                # Track statistics
-                status = data.get('status', '0')
-                stats['status_codes'][status] = stats['status_codes'].get(status, 0) + 1
-                
-                ip = data.get('ip', 'unknown')
-                stats['ips'][ip] = stats['ips'].get(ip, 0) + 1
-                
-                path = data.get('path', 'unknown')
-                stats['paths'][path] = stats['paths'].get(path, 0) + 1
-                
-                if data.get('blocked') == 'BLOCKED':
-                    stats['blocked_requests'] += 1
-                    reason = data.get('block_reason', 'unknown')
-                    stats['blocked_reasons'][reason] = stats['blocked_reasons'].get(reason, 0) + 1
+    for line in lines:
+        match = log_pattern.match(line.strip())
+        if match:
+            stats['total_requests'] += 1
+            data = match.groupdict()
+            
+            # Track statistics
+            status = data.get('status', '0')
+            stats['status_codes'][status] = stats['status_codes'].get(status, 0) + 1
+            
+            ip = data.get('ip', 'unknown')
+            stats['ips'][ip] = stats['ips'].get(ip, 0) + 1
+            
+            path = data.get('path', 'unknown')
+            stats['paths'][path] = stats['paths'].get(path, 0) + 1
+            
+            if data.get('blocked') == 'BLOCKED':
+                stats['blocked_requests'] += 1
+                reason = data.get('block_reason', 'unknown')
+                stats['blocked_reasons'][reason] = stats['blocked_reasons'].get(reason, 0) + 1
@@ -0,0 +1,229 @@
+"""
+Per-IP request history for the AI anomaly detector.
+
+Each IP gets a ring buffer of parallel ``array`` columns (timestamps, status
+codes, interned path IDs, response times). Appends are O(1), pruning the
+sliding window only moves the head pointer, and the burst and 404 counters
+used as model features are kept up to date incrementally. Writers and readers
+of a buffer hold its ``lock``; the store takes it around appends and pruning,
+and the reader methods take it themselves.
+"""
+
+import threading
+from array import array
+
+DEFAULT_HISTORY_CAPACITY = 1024
+BURST_SECONDS = 10
+
+_INITIAL_SLOTS = 8
+
+
+class PathInterner:
+    """Maps paths to small integer IDs, reference-counted so IDs are recycled."""
+
+    def __init__(self):
+        self._ids = {}
+        self._paths = []
+        self._refs = []
+        self._free = []
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._ids)
+
+    def acquire(self, path):
+        with self._lock:
+            path_id = self._ids.get(path)
+            if path_id is None:
+                if self._free:
+                    path_id = self._free.pop()
+                    self._paths[path_id] = path
+                    self._refs[path_id] = 0
+                else:
+                    path_id = len(self._paths)
+                    self._paths.append(path)
+                    self._refs.append(0)
+                self._ids[path] = path_id
+            self._refs[path_id] += 1
+            return path_id
+
+    def release(self, path_id):
+        with self._lock:
+            self._refs[path_id] -= 1
+            if self._refs[path_id] <= 0:
+                del self._ids[self._paths[path_id]]
+                self._paths[path_id] = None
+                self._free.append(path_id)
+
+    def path(self, path_id):
+        return self._paths[path_id]
+
+
+class IPHistory:
+    """Fixed-capacity ring buffer of one IP's recent requests, oldest first."""
+
+    __slots__ = (
+        "times", "statuses", "path_ids", "resp_times",
+        "_head", "_size", "_capacity", "_burst_skip", "total_404", "lock",
+    )
+
+    def __init__(self, capacity=DEFAULT_HISTORY_CAPACITY):
+        self._capacity = max(1, int(capacity))
+        slots = min(_INITIAL_SLOTS, self._capacity)
+        self.times = array("d", bytes(8 * slots))
+        self.statuses = array("H", bytes(2 * slots))
+        self.path_ids = array("I", bytes(array("I").itemsize * slots))
+        self.resp_times = array("d", bytes(8 * slots))
+        self._head = 0
+        self._size = 0
+        # Entries at the front already known to be older than the burst window
+        self._burst_skip = 0
+        self.total_404 = 0
+        self.lock = threading.Lock()
+
+    def __len__(self):
+        return self._size
+
+    def _slot(self, offset):
+        return (self._head + offset) % len(self.times)
+
+    def _grow(self):
+        """Double the column storage (up to capacity), unrolling the ring."""
+        order = [self._slot(i) for i in range(self._size)]
+        new_slots = min(self._capacity, len(self.times) * 2)
+        pad = new_slots - self._size
+        for name in ("times", "statuses", "path_ids", "resp_times"):
+            column = getattr(self, name)
+            grown = array(column.typecode, (column[i] for i in order))
+            grown.extend(array(column.typecode, bytes(column.itemsize * pad)))
+            setattr(self, name, grown)
+        self._head = 0
+
+    def _drop_oldest(self):
+        slot = self._head
+        if self.statuses[slot] == 404:
+            self.total_404 -= 1
+        self._head = (self._head + 1) % len(self.times)
+        self._size -= 1
+        if self._burst_skip:
+            self._burst_skip -= 1
+        return self.path_ids[slot]
+
+    def append(self, timestamp, path_id, status, resp_time):
+        """Add an entry; returns the path ID evicted to make room, or None."""
+        evicted = None
+        if self._size == len(self.times):
+            if len(self.times) < self._capacity:
+                self._grow()
+            else:
+                evicted = self._drop_oldest()
+        slot = self._slot(self._size)
+        self.times[slot] = timestamp
+        self.statuses[slot] = status if 0 <= status <= 0xFFFF else 0
+        self.path_ids[slot] = path_id
+        self.resp_times[slot] = resp_time
+        self._size += 1
+        if status == 404:
+            self.total_404 += 1
+        return evicted
+
+    def prune(self, cutoff):
+        """Drop entries with timestamp <= cutoff; returns their path IDs."""
+        evicted = []
+        while self._size and self.times[self._head] <= cutoff:
+            evicted.append(self._drop_oldest())
+        return evicted
+
+    def burst_count(self, now, span=BURST_SECONDS):
+        """Number of entries within span seconds before now."""
+        with self.lock:
+            # Requests finish slightly out of order across threads, so step back too.
+            while self._burst_skip and now - self.times[self._slot(self._burst_skip - 1)] <= span:
+                self._burst_skip -= 1
+            while self._burst_skip < self._size and now - self.times[self._slot(self._burst_skip)] > span:
+                self._burst_skip += 1
+            return self._size - self._burst_skip
+
+    def timestamps(self):
+        with self.lock:
+            return [self.times[self._slot(i)] for i in range(self._size)]
+
+    def entries(self, interner, since=None):
+        """Return (time, path, status, resp_time) tuples, optionally after since.
+
+        Taken under the lock, so the buffer cannot grow and no path ID can be
+        released while it is read.
+        """
+        result = []
+        with self.lock:
+            for i in range(self._size):
+                slot = self._slot(i)
+                t = self.times[slot]
+                if since is not None and t < since:
+                    continue
+                result.append((t, interner.path(self.path_ids[slot]), self.statuses[slot], self.resp_times[slot]))
+        return result
+
+
+class RequestHistoryStore:
+    """Per-key IPHistory buffers sharing one path interner."""
+
+    def __init__(self, capacity=DEFAULT_HISTORY_CAPACITY, window_seconds=60):
+        self.capacity = capacity
+        self.window_seconds = window_seconds
+        self.paths = PathInterner()
+        self._histories = {}
+        self._lock = threading.Lock()
+        self._last_sweep = 0.0
+
+    def __len__(self):
+        return len(self._histories)
+
+    def __contains__(self, key):
+        return key in self._histories
+
+    def get(self, key, default=None):
+        return self._histories.get(key, default)
+
+    def _release(self, path_ids):
+        for path_id in path_ids:
+            self.paths.release(path_id)
+
+    def prune(self, key, now):
+        history = self._histories.get(key)
+        if history is None:
+            return None
+        with history.lock:
+            self._release(history.prune(now - self.window_seconds))
+        return history
+
+    def record(self, key, now, path, status, resp_time):
+        """Append a request for key and drop entries that left the window."""
+        path_id = self.paths.acquire(path)
+        while True:
+            history = self._histories.get(key)
+            if history is None:
+                with self._lock:
+                    history = self._histories.setdefault(key, IPHistory(self.capacity))
+            with history.lock:
+                # A concurrent sweep may have dropped this (empty) buffer.
+                if self._histories.get(key) is not history:
+                    continue
+                evicted = history.append(now, path_id, status, resp_time)
+                if evicted is not None:
+                    self.paths.release(evicted)
+                self._release(history.prune(now - self.window_seconds))
+                break
+        if now - self._last_sweep >= self.window_seconds:
+            self.sweep(now)
+
+    def sweep(self, now):
+        """Forget IPs with no requests left inside the window."""
+        self._last_sweep = now
+        cutoff = now - self.window_seconds
+        with self._lock:
+            for key, history in list(self._histories.items()):
+                with history.lock:
+                    self._release(history.prune(cutoff))
+                    if not len(history):
+                        del self._histories[key]
@@ -51,6 +51,9 @@ _memory_keywords = set()
 _memory_geo_blocked_countries = set()
 _memory_path_exemptions = {}
 
+# Bumped on every geo blocked country change made through this process
+_geo_blocked_version = 0
+
 # Thread locks for process-level synchronization
 _thread_locks = {
     WHITELIST_CSV: threading.RLock(),
@@ -319,6 +322,29 @@ def _append_csv_blacklist(ip, reason, extended_request_info=None):
     
     return _safe_csv_operation(_append_operation)
 
+def _append_csv_keywords(keywords):
+    """Append several keywords to CSV with one read and one write."""
+    def _append_operation():
+        _ensure_csv_files()
+        csv_file = Path(_get_data_dir()) / KEYWORDS_CSV
+        
+        filename = csv_file.name
+        thread_lock = _thread_locks.get(filename, threading.RLock())
+        
+        with thread_lock:
+            new_keywords = sorted(set(keywords) - _read_csv_keywords())
+            if not new_keywords:
+                return
+            
+            added_date = datetime.now().isoformat()
+            with _file_lock(csv_file, 'a') as f:
+                writer = csv.writer(f)
+                for keyword in new_keywords:
+                    writer.writerow([keyword, added_date])
+            logger.debug(f"Added {len(new_keywords)} keywords")
+    
+    return _safe_csv_operation(_append_operation)
+
 def _read_csv_keywords():
     """Read keywords from CSV with thread safety."""
     def _read_operation():
@@ -567,6 +593,8 @@ class KeywordStore:
     def add_keyword(self, kw, count=1):
         # Note: Current implementation doesn't store count, just presence
         add_keyword(kw)
+    def add_keywords(self, kws):
+        add_keywords(kws)
     def remove_keyword(self, kw):
         remove_keyword(kw)
     def get_top_keywords(self, n=10):
@@ -748,6 +776,19 @@ def get_geo_blocked_countries():
         return _read_csv_geo_blocked_countries()
     return set(_memory_geo_blocked_countries)
 
+def _bump_geo_blocked_version():
+    global _geo_blocked_version
+    _geo_blocked_version += 1
+
+def get_geo_blocked_countries_version():
+    """Return a counter bumped by every geo blocked list write in this process.
+
+    Cheap enough to read per request. Changes made by other processes (e.g.
+    the CLI) are not seen here; GeoBlockMiddleware picks them up with its
+    periodic refresh.
+    """
+    return _geo_blocked_version
+
 def is_country_geo_blocked(country_code):
     """Check if a country is geo blocked."""
     normalized = _normalize_country_code(country_code)
@@ -782,6 +823,7 @@ def add_geo_blocked_country(country_code):
         try:
             db.session.add(GeoBlockedCountry(country_code=normalized))
             db.session.commit()
+            _bump_geo_blocked_version()
             return
         except Exception:
             storage_mode = 'csv'
@@ -790,6 +832,7 @@ def add_geo_blocked_country(country_code):
         _append_csv_geo_blocked_country(normalized)
     else:
         _memory_geo_blocked_countries.add(normalized)
+    _bump_geo_blocked_version()
 
 def remove_geo_blocked_country(country_code):
     """Remove a country from geo blocked list."""
@@ -805,6 +848,7 @@ def remove_geo_blocked_country(country_code):
             if entry:
                 db.session.delete(entry)
                 db.session.commit()
+                _bump_geo_blocked_version()
             return
         except Exception:
             storage_mode = 'csv'
@@ -816,6 +860,7 @@ def remove_geo_blocked_country(country_code):
             _rewrite_csv_geo_blocked_countries(countries)
     else:
         _memory_geo_blocked_countries.discard(normalized)
+    _bump_geo_blocked_version()
 
 
 def get_path_exemptions():
@@ -896,6 +941,29 @@ def add_keyword(kw):
     else:
         _memory_keywords.add(kw)
 
+def add_keywords(keywords):
+    """Add several keywords to the blocked list in one storage round trip."""
+    keywords = {kw for kw in keywords if kw}
+    if not keywords:
+        return
+    storage_mode = _get_storage_mode()
+    
+    if storage_mode == 'database':
+        try:
+            existing = {k.keyword for k in Keyword.query.filter(Keyword.keyword.in_(keywords)).all()}
+            new_keywords = sorted(keywords - existing)
+            if new_keywords:
+                db.session.add_all([Keyword(keyword=kw) for kw in new_keywords])
+                db.session.commit()
+            return
+        except Exception:
+            storage_mode = 'csv'
+    
+    if storage_mode == 'csv':
+        _append_csv_keywords(keywords)
+    else:
+        _memory_keywords.update(keywords)
+
 def remove_keyword(keyword):
     """Remove keyword from blocked list."""
     storage_mode = _get_storage_mode()
@@ -0,0 +1,294 @@
+"""
+Incremental training checkpoint for the AIWAF trainer.
+
+Rather than re-parsing the whole log history on every ``aiwaf train``, the
+trainer keeps a small JSON checkpoint (``.aiwaf_train_checkpoint.json`` in
+the log directory by default) with:
+
+- one entry per log file, keyed by device and inode so a renamed rotation is
+  still recognised, holding the byte offset read up to and a fingerprint
+  (hash of the first line) of its content;
+- per IP, the 404 counts on normal and exempt paths (forgotten once the IP
+  has been quiet for ``AIWAF_TRAIN_404_MAX_AGE`` seconds) and a timestamp summary:
+  first and last seen, request count and the epochs within the burst window
+  of the last request, so burst counts carry across runs;
+- learned keyword token counts, with a few example paths per token;
+- a bounded reservoir sample of the feature rows trained on, so the model is
+  refitted on history plus the new rows rather than on the new rows alone.
+
+A run parses only the bytes appended since the checkpoint and merges them
+into these aggregates. The fingerprint tells a reused inode from the file
+that was read, and recognises a rotation that has since been compressed: a
+``.gz`` whose first line matches a file read up to some offset is read from
+that offset of its decompressed content, and one read whole before is
+skipped.
+"""
+
+import gzip
+import hashlib
+import json
+import logging
+import os
+import random
+from collections import Counter, defaultdict
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+from .features import BURST_WINDOW_SECONDS
+from .log_ingest import LogRecords, last_line_end
+
+# Hidden, so the JSON request log loaders never pick it up
+CHECKPOINT_FILENAME = '.aiwaf_train_checkpoint.json'
+
+# Bump when the layout changes so old checkpoints are ignored.
+_CHECKPOINT_FORMAT = 3
+
+EXAMPLE_PATHS = 3
+
+# At most this much of the first line goes into a file's fingerprint
+_FINGERPRINT_BYTES = 4096
+
+logger = logging.getLogger("aiwaf.train_checkpoint")
+
+
+def file_fingerprint(path):
+    """sha1 of the first line of path (decompressed for .gz); None while it has no complete line."""
+    opener = gzip.open if path.endswith('.gz') else open
+    try:
+        with opener(path, 'rb') as f:
+            head = f.readline(_FINGERPRINT_BYTES)
+    except (OSError, EOFError) as e:
+        logger.info(f"Warning: Could not read log file {path}: {e}")
+        return None
+    if not head.endswith(b'\n') and len(head) < _FINGERPRINT_BYTES:
+        return None
+    return hashlib.sha1(head).hexdigest()
+
+
+def _row_list(row):
+    return row.tolist() if hasattr(row, 'tolist') else [float(v) for v in row]
+
+
+def _new_ip_state():
+    return {'404': 0, '404_login': 0, 'first': None, 'last': None, 'count': 0, 'recent': []}
+
+
+class TrainingCheckpoint:
+    """Read offsets and aggregates for every log line trained on so far."""
+
+    def __init__(self, path, log_dir=None):
+        self.path = path
+        self.log_dir = os.path.abspath(log_dir) if log_dir else None
+        self.files = {}
+        self.ips = {}
+        self.tokens = Counter()
+        self.examples = {}
+        self.lines = 0
+        self.records = 0
+        self.feature_columns = []
+        self.reservoir = []
+        self.reservoir_seen = 0
+        self._pending_files = None
+
+    @classmethod
+    def load(cls, path, log_dir=None):
+        """Load the checkpoint at path; a missing, unreadable or foreign one loads empty."""
+        checkpoint = cls(path, log_dir)
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return checkpoint
+        if (not isinstance(data, dict) or data.get('format') != _CHECKPOINT_FORMAT
+                or data.get('log_dir') != checkpoint.log_dir):
+            return checkpoint
+        checkpoint.files = data.get('files', {})
+        checkpoint.ips = data.get('ips', {})
+        checkpoint.tokens = Counter(data.get('tokens', {}))
+        checkpoint.examples = data.get('examples', {})
+        checkpoint.lines = data.get('lines', 0)
+        checkpoint.records = data.get('records', 0)
+        checkpoint.feature_columns = data.get('feature_columns', [])
+        checkpoint.reservoir = data.get('reservoir', [])
+        checkpoint.reservoir_seen = data.get('reservoir_seen', 0)
+        return checkpoint
+
+    def save(self):
+        tmp_path = f"{self.path}.{os.getpid()}.tmp"
+        try:
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump({
+                    'format': _CHECKPOINT_FORMAT,
+                    'log_dir': self.log_dir,
+                    'lines': self.lines,
+                    'records': self.records,
+                    'files': self.files,
+                    'ips': self.ips,
+                    'tokens': self.tokens,
+                    'examples': self.examples,
+                    'feature_columns': self.feature_columns,
+                    'reservoir': self.reservoir,
+                    'reservoir_seen': self.reservoir_seen,
+                }, f, separators=(',', ':'))
+            os.replace(tmp_path, self.path)
+        except OSError as e:
+            # Without a checkpoint the next run simply reads everything again.
+            logger.info(f"Warning: Could not write training checkpoint {self.path}: {e}")
+
+    def plan(self, paths):
+        """Return the (path, start, end) byte ranges not read yet; end None is a gzip file.
+
+        Plain files are read up to their last complete line, so a line still
+        being written is picked up by the next run. For a gzip file start is
+        an offset into its decompressed content.
+        """
+        self._pending_files = {}
+        by_fingerprint = {entry['head']: entry for entry in self.files.values() if entry.get('head')}
+        ranges = []
+        for path in paths:
+            try:
+                stat = os.stat(path)
+            except OSError as e:
+                logger.info(f"Warning: Could not read log file {path}: {e}")
+                continue
+            key = f"{stat.st_dev}:{stat.st_ino}"
+            head = file_fingerprint(path)
+            known = self.files.get(key)
+            if known is not None and known.get('head') not in (None, head):
+                known = None  # the inode now holds a different file
+            if known is None and head is not None:
+                known = by_fingerprint.get(head)
+            if path.endswith('.gz'):
+                self._pending_files[key] = {'path': path, 'offset': None, 'head': head}
+                start = 0
+                if known is not None:
+                    if known.get('offset') is None:
+                        logger.info(f"Skipping {path}: already read as {known['path']}")
+                        continue
+                    start = known['offset']
+                    logger.info(f"Reading {path} from byte {start}: rotation of {known['path']}")
+                ranges.append((path, start, None))
+                continue
+            try:
+                end = last_line_end(path, stat.st_size)
+            except OSError as e:
+                logger.info(f"Warning: Could not read log file {path}: {e}")
+                continue
+            start = 0
+            if known is not None and known.get('offset') is not None and known['offset'] <= end:
+                start = known['offset']  # otherwise the file was truncated: read it again
+            self._pending_files[key] = {'path': path, 'offset': end, 'head': head}
+            if start < end:
+                ranges.append((path, start, end))
+        return ranges
+
+    def with_burst_context(self, records):
+        """Prepend the recent requests of records' IPs from earlier runs.
+
+        Returns (records, context_rows). The context rows carry status 0, so
+        only burst counts see them, and they come first so callers can drop
+        them from the features.
+        """
+        context = LogRecords()
+        for ip in records.ips:
+            state = self.ips.get(ip)
+            if state:
+                for epoch in state['recent']:
+                    context.append(ip, epoch, '/', 0, 0.0)
+        if not len(context):
+            return records, 0
+        context_rows = len(context)
+        context.extend(records)
+        return context, context_rows
+
+    def _ip(self, ip):
+        state = self.ips.get(ip)
+        if state is None:
+            state = self.ips[ip] = _new_ip_state()
+        return state
+
+    def merge_404s(self, ip_404, ip_404_login, now=None, max_age=None):
+        """Add this run's per-IP 404 counts; returns the cumulative (ip_404, ip_404_login).
+
+        With max_age, the counts of an IP whose last request is more than
+        max_age seconds before now are forgotten first, so an IP that comes
+        back after that long is judged on its new 404s alone.
+        """
+        if now is not None and max_age is not None:
+            for state in self.ips.values():
+                if state['last'] is not None and now - state['last'] > max_age:
+                    state['404'] = state['404_login'] = 0
+        for key, counts in (('404', ip_404), ('404_login', ip_404_login)):
+            for ip, count in counts.items():
+                self._ip(ip)[key] += count
+        merged_404 = defaultdict(int)
+        merged_login = defaultdict(int)
+        for ip, state in self.ips.items():
+            if state['404']:
+                merged_404[ip] = state['404']
+            if state['404_login']:
+                merged_login[ip] = state['404_login']
+        return merged_404, merged_login
+
+    def merge_tokens(self, tokens, examples):
+        """Add this run's keyword token counts and example paths; returns the cumulative counts."""
+        self.tokens.update(tokens)
+        for token, paths in examples.items():
+            kept = self.examples.setdefault(token, [])
+            kept.extend(paths[:EXAMPLE_PATHS - len(kept)])
+        return self.tokens
+
+    def sample_features(self, columns, rows, size):
+        """Fold feature rows into the reservoir (uniform over every row seen); returns it.
+
+        rows is a float ndarray (or a sequence of rows). Replacement slots
+        are drawn for row indices only, so just the rows that end up in the
+        reservoir are copied. A change of feature columns starts the
+        reservoir afresh.
+        """
+        if list(columns) != self.feature_columns:
+            self.feature_columns = list(columns)
+            self.reservoir = []
+            self.reservoir_seen = 0
+        del self.reservoir[size:]
+        fill = min(max(size - len(self.reservoir), 0), len(rows))
+        self.reservoir.extend(_row_list(rows[i]) for i in range(fill))
+        seen = self.reservoir_seen + fill
+        # Row i (from fill on) replaces slot randrange(seen_i), seen_i = seen + i - fill + 1
+        chosen = {}
+        if np is not None:
+            rng = np.random.default_rng(self.reservoir_seen)
+            seen_i = np.arange(seen + 1, seen + 1 + len(rows) - fill, dtype=np.float64)
+            slots = (rng.random(len(seen_i)) * seen_i).astype(np.int64)
+            hits = np.flatnonzero(slots < size)
+            chosen = dict(zip(slots[hits].tolist(), (hits + fill).tolist()))
+        else:
+            rng = random.Random(self.reservoir_seen)
+            for i in range(fill, len(rows)):
+                slot = rng.randrange(seen + i - fill + 1)
+                if slot < size:
+                    chosen[slot] = i
+        for slot, i in chosen.items():  # a later row replacing the same slot wins
+            self.reservoir[slot] = _row_list(rows[i])
+        self.reservoir_seen += len(rows)
+        return self.reservoir
+
+    def commit(self, line_count, records):
+        """Fold this run's lines and new records into the checkpoint and save it."""
+        for ip, epochs in records.epochs_by_ip().items():
+            state = self._ip(ip)
+            first, last = min(epochs), max(epochs)
+            state['first'] = first if state['first'] is None else min(state['first'], first)
+            state['last'] = last if state['last'] is None else max(state['last'], last)
+            state['count'] += len(epochs)
+            latest = state['last']
+            state['recent'] = sorted(t for t in state['recent'] + epochs
+                                     if latest - t <= BURST_WINDOW_SECONDS)
+        self.lines += line_count
+        self.records += len(records)
+        if self._pending_files is not None:
+            self.files = self._pending_files
+        self.save()
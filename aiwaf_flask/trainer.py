@@ -8,15 +8,17 @@ Trains machine learning models and learns keywords from access logs.
 
 import os
 import glob
-import gzip
 import re
-import csv
-import json
 import logging
 from datetime import datetime, timedelta
 from collections import defaultdict, Counter
 from pathlib import Path
-from typing import List, Dict, Optional, Set, Any
+from typing import List, Dict, Iterator, Optional, Set, Any
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
 
 # Try to import AI dependencies
 try:
@@ -24,6 +26,7 @@ try:
     import joblib
     from sklearn.ensemble import IsolationForest
     import sklearn
+    from .forest import artifact_path_for, export_isolation_forest, save_forest_artifact
     AI_AVAILABLE = True
 except ImportError:
     AI_AVAILABLE = False
@@ -31,15 +34,24 @@ except ImportError:
     joblib = None
     IsolationForest = None
     sklearn = None
+    export_isolation_forest = None
+    artifact_path_for = None
+    save_forest_artifact = None
 
 # Flask imports
 from flask import Flask, current_app
+from werkzeug.exceptions import MethodNotAllowed
+from werkzeug.routing import RequestRedirect
 
 # AIWAF imports
 from .storage import get_exemption_store, get_keyword_store, _get_storage_mode, _read_csv_blacklist
 from .blacklist_manager import BlacklistManager
 from .utils import is_exempt, is_path_exempt
-from .geoip import lookup_country_name
+from .geoip import batch_country_counts
+from .features import count_404s, extract_features
+from .log_formats import from_epoch, iter_csv_records, iter_json_records, parse_line
+from .log_ingest import LogRecords, parse_log_tasks, plan_log_tasks, resolve_jobs, split_ranges
+from .train_checkpoint import CHECKPOINT_FILENAME, EXAMPLE_PATHS, TrainingCheckpoint
 from . import rust_backend
 
 logger = logging.getLogger(__name__)
@@ -66,24 +78,74 @@ DEFAULT_MODEL_PATH = get_default_model_path()
 STATIC_KW = [".php", "xmlrpc", "wp-", ".env", ".git", ".bak", "config", "shell", "filemanager"]
 STATUS_IDX = ["200", "403", "404", "500"]
 
-# Enhanced log regex pattern for different formats
-_LOG_RX_PATTERNS = [
-    # Combined log format with response time
-    re.compile(
-        r'(\d+\.\d+\.\d+\.\d+).*\[(.*?)\].*"(?:GET|POST|PUT|DELETE|HEAD|OPTIONS) (.*?) HTTP/.*?" '
-        r'(\d{3}).*?"(.*?)" "(.*?)".*?response-time=(\d+\.\d+)'
-    ),
-    # Standard combined log format
-    re.compile(
-        r'(\d+\.\d+\.\d+\.\d+).*\[(.*?)\].*"(?:GET|POST|PUT|DELETE|HEAD|OPTIONS) (.*?) HTTP/.*?" '
-        r'(\d{3}) (\d+) "(.*?)" "(.*?)"'
-    ),
-    # Common log format
-    re.compile(
-        r'(\d+\.\d+\.\d+\.\d+).*\[(.*?)\].*"(?:GET|POST|PUT|DELETE|HEAD|OPTIONS) (.*?) HTTP/.*?" '
-        r'(\d{3}) (\d+)'
-    ),
-]
+def _feature_matrix(feature_dicts) -> tuple:
+    """(columns, ips, X) from feature columns or feature dicts; X holds every column but ip
+
+    X is one float ndarray (rows of float tuples without NumPy).
+    """
+    if isinstance(feature_dicts, dict):
+        columns = [c for c in feature_dicts if c != "ip"]
+        ips = feature_dicts.get("ip", [])
+        if np is not None:
+            return columns, ips, np.column_stack(
+                [np.asarray(feature_dicts[c], dtype=np.float64) for c in columns]
+            ).reshape(len(ips), len(columns))
+        return columns, ips, list(zip(*([float(v) for v in feature_dicts[c]] for c in columns)))
+    columns = [c for c in feature_dicts[0] if c != "ip"] if feature_dicts else []
+    ips = [row["ip"] for row in feature_dicts]
+    if np is not None:
+        return columns, ips, np.array(
+            [[row[c] for c in columns] for row in feature_dicts], dtype=np.float64
+        ).reshape(len(ips), len(columns))
+    return columns, ips, [tuple(float(row[c]) for c in columns) for row in feature_dicts]
+
+def parse_log_line(line: str) -> Optional[Dict[str, Any]]:
+    """Parse one log line of any supported format into a record dict"""
+    record = parse_line(line)
+    if record is None:
+        return None
+    ip, epoch, path, status, response_time = record
+    return {
+        "ip": ip,
+        "timestamp": from_epoch(epoch),
+        "path": path,
+        "status": str(status),
+        "response_time": response_time,
+    }
+
+class RouteOracle:
+    """Answers whether a path is served by a URL map, without request contexts.
+
+    Rules without converters are collected into a set up front, so most known
+    paths are a set lookup; other paths are matched once against a bound
+    MapAdapter and the answer is remembered per path.
+    """
+
+    def __init__(self, url_map):
+        self._adapter = url_map.bind('localhost')
+        self._static = {rule.rule.strip("/") for rule in url_map.iter_rules() if not rule.arguments}
+        self._cache: Dict[str, bool] = {}
+
+    def __contains__(self, path: str) -> bool:
+        # Remove query params and normalize
+        candidate = path.split("?")[0].strip("/")
+        exists = self._cache.get(candidate)
+        if exists is None:
+            exists = candidate in self._static or any(
+                self._match(f"/{c}") for c in (candidate, f"{candidate}/"))
+            self._cache[candidate] = exists
+        return exists
+
+    def _match(self, path: str) -> bool:
+        try:
+            self._adapter.match(path, method='GET')
+            return True
+        except (RequestRedirect, MethodNotAllowed):
+            # Route exists but wrong method or redirect
+            return True
+        except Exception:
+            # No route found
+            return False
 
 class FlaskAITrainer:
     """AI Trainer for Flask AIWAF"""
@@ -91,6 +153,7 @@ class FlaskAITrainer:
     def __init__(self, app: Optional[Flask] = None):
         self.app = app
         self._route_keywords: Optional[Set[str]] = None
+        self._routes: Optional[RouteOracle] = None
         
     def init_app(self, app: Flask):
         """Initialize with Flask app"""
@@ -106,37 +169,9 @@ class FlaskAITrainer:
         """Check if a path exists in Flask URL routes"""
         if not self.app:
             return False
-        
-        # Remove query params and normalize
-        candidate = path.split("?")[0].strip("/")
-        
-        # Try exact resolution first
-        try:
-            with self.app.test_request_context(f"/{candidate}"):
-                self.app.url_map.match(f"/{candidate}", method='GET')
-                return True
-        except:
-            pass
-        
-        # Try with trailing slash
-        if not candidate.endswith("/"):
-            try:
-                with self.app.test_request_context(f"/{candidate}/"):
-                    self.app.url_map.match(f"/{candidate}/", method='GET')
-                    return True
-            except:
-                pass
-        
-        # Try without trailing slash
-        if candidate.endswith("/"):
-            try:
-                with self.app.test_request_context(f"/{candidate.rstrip('/')}"):
-                    self.app.url_map.match(f"/{candidate.rstrip('/')}", method='GET')
-                    return True
-            except:
-                pass
-        
-        return False
+        if self._routes is None:
+            self._routes = RouteOracle(self.app.url_map)
+        return path in self._routes
     
     def remove_exempt_keywords(self) -> None:
         """Remove exempt keywords from dynamic keyword storage"""
@@ -278,11 +313,8 @@ class FlaskAITrainer:
         self._route_keywords = filtered_keywords
         return filtered_keywords
     
-    def _read_all_logs(self) -> List[str]:
-        """Read log lines from various sources"""
-        lines = []
-        
-        # Try log files first
+    def _find_access_logs(self) -> List[str]:
+        """Return the first access log found plus its rotated siblings, or []"""
         log_dir = self.get_config('AIWAF_LOG_DIR', DEFAULT_LOG_DIR)
         
         # Look for access log files
@@ -295,143 +327,110 @@ class FlaskAITrainer:
         
         for log_path in access_log_files:
             if os.path.exists(log_path):
-                logger.info(f"📁 Reading logs from: {log_path}")
-                with open(log_path, "r", errors="ignore") as f:
-                    lines.extend(f.readlines())
-                
                 # Also check for rotated logs
-                for p in sorted(glob.glob(f"{log_path}.*")):
-                    opener = gzip.open if p.endswith(".gz") else open
-                    try:
-                        with opener(p, "rt", errors="ignore") as f:
-                            lines.extend(f.readlines())
-                    except OSError:
-                        continue
-                break
-        
-        # If no log files found, try CSV logs
-        if not lines:
-            lines = self._get_logs_from_csv()
-        
-        # If still no logs, try JSON logs
-        if not lines:
-            lines = self._get_logs_from_json()
-        
-        logger.info(f"📊 Total log lines found: {len(lines)}")
-        return lines
+                return [log_path] + sorted(glob.glob(f"{log_path}.*"))
+        return []
     
-    def _get_logs_from_csv(self) -> List[str]:
-        """Get log data from CSV files"""
-        lines = []
+    def _structured_csv_logs(self) -> List[str]:
+        """CSV request logs: access/aiwaf CSVs in the log dir plus AIWAFLoggerMiddleware's file"""
         log_dir = self.get_config('AIWAF_LOG_DIR', DEFAULT_LOG_DIR)
-        csv_files = glob.glob(os.path.join(log_dir, '*.csv'))
-        
-        for csv_file in csv_files:
-            if 'access' in os.path.basename(csv_file) or 'aiwaf' in os.path.basename(csv_file):
-                try:
-                    with open(csv_file, 'r', newline='', errors='ignore') as f:
-                        reader = csv.DictReader(f)
-                        for row in reader:
-                            # Convert CSV to log format
-                            if all(key in row for key in ['timestamp', 'ip', 'method', 'path', 'status_code']):
-                                timestamp = row['timestamp']
-                                ip = row['ip']
-                                method = row.get('method', 'GET')
-                                path = row['path']
-                                status = row['status_code']
-                                response_time = row.get('response_time_ms', '0')
-                                user_agent = row.get('user_agent', '-')
-                                referer = row.get('referer', '-')
-                                
-                                # Convert to Apache log format
-                                log_line = (f'{ip} - - [{timestamp}] "{method} {path} HTTP/1.1" '
-                                          f'{status} 0 "{referer}" "{user_agent}" '
-                                          f'response-time={float(response_time)/1000}\n')
-                                lines.append(log_line)
-                    
-                    logger.info(f"📂 Loaded {len(lines)} entries from CSV: {csv_file}")
-                except Exception as e:
-                    logger.info(f"Warning: Could not read CSV file {csv_file}: {e}")
-        
-        return lines
+        csv_files = [p for p in glob.glob(os.path.join(log_dir, '*.csv'))
+                     if 'access' in os.path.basename(p) or 'aiwaf' in os.path.basename(p)]
+        
+        middleware_log = self.get_config('AIWAF_MIDDLEWARE_LOG', 'aiwaf_requests.log')
+        if not middleware_log.endswith('.csv'):
+            middleware_log = middleware_log.replace('.log', '.csv')
+        seen = {os.path.abspath(p) for p in csv_files}
+        if os.path.exists(middleware_log) and os.path.abspath(middleware_log) not in seen:
+            csv_files.append(middleware_log)
+        return csv_files
     
-    def _get_logs_from_json(self) -> List[str]:
-        """Get log data from JSON log files"""
-        lines = []
+    def _iter_csv_records(self) -> Iterator[tuple]:
+        """Yield typed records straight from CSV request logs"""
+        for csv_file in self._structured_csv_logs():
+            count = 0
+            try:
+                for record in iter_csv_records(csv_file):
+                    count += 1
+                    yield record
+                logger.info(f"📂 Loaded {count} entries from CSV: {csv_file}")
+            except Exception as e:
+                logger.info(f"Warning: Could not read CSV file {csv_file}: {e}")
+    
+    def _structured_json_logs(self) -> List[str]:
+        """JSON/JSONL request logs in the log dir"""
         log_dir = self.get_config('AIWAF_LOG_DIR', DEFAULT_LOG_DIR)
-        json_files = glob.glob(os.path.join(log_dir, '*.json')) + glob.glob(os.path.join(log_dir, '*.jsonl'))
-        
-        for json_file in json_files:
+        return glob.glob(os.path.join(log_dir, '*.json')) + glob.glob(os.path.join(log_dir, '*.jsonl'))
+    
+    def _iter_json_records(self) -> Iterator[tuple]:
+        """Yield typed records straight from JSON/JSONL request logs"""
+        for json_file in self._structured_json_logs():
+            count = 0
             try:
-                with open(json_file, 'r', errors='ignore') as f:
-                    for line in f:
-                        try:
-                            record = json.loads(line.strip())
-                            
-                            # Convert JSON to log format
-                            if all(key in record for key in ['timestamp', 'ip', 'method', 'path', 'status_code']):
-                                timestamp = record['timestamp']
-                                ip = record['ip']
-                                method = record.get('method', 'GET')
-                                path = record['path']
-                                status = record['status_code']
-                                response_time = record.get('response_time', 0)
-                                user_agent = record.get('user_agent', '-')
-                                referer = record.get('referer', '-')
-                                
-                                # Convert to Apache log format
-                                log_line = (f'{ip} - - [{timestamp}] "{method} {path} HTTP/1.1" '
-                                          f'{status} 0 "{referer}" "{user_agent}" '
-                                          f'response-time={response_time}\n')
-                                lines.append(log_line)
-                        except json.JSONDecodeError:
-                            continue
-                
-                logger.info(f"📄 Loaded entries from JSON: {json_file}")
+                for record in iter_json_records(json_file):
+                    count += 1
+                    yield record
+                logger.info(f"📄 Loaded {count} entries from JSON: {json_file}")
             except Exception as e:
                 logger.info(f"Warning: Could not read JSON file {json_file}: {e}")
-        
-        return lines
+    
+    def _collect_records(self, jobs: Optional[int] = None,
+                         checkpoint: Optional[TrainingCheckpoint] = None,
+                         limit: Optional[int] = None):
+        """Parse all log lines in one streaming pass; returns (line_count, LogRecords)
+        
+        With more than one job, access logs are split into newline-aligned
+        chunks (one task per gzipped rotation) and parsed in worker processes.
+        With a checkpoint, only the bytes it has not seen yet are parsed.
+        With a limit, parsing stops once about that many records are collected.
+        """
+        jobs = resolve_jobs(self.get_config('AIWAF_LOG_PARSE_JOBS', 1) if jobs is None else jobs)
+        log_files = self._find_access_logs()
+        if checkpoint is not None:
+            # CSV/JSON request logs are planned the same way and parsed as typed rows
+            log_files = log_files or self._structured_csv_logs() or self._structured_json_logs()
+            if not log_files:
+                return 0, LogRecords()
+            tasks = split_ranges(checkpoint.plan(log_files), jobs)
+            logger.info(f"📁 Reading logs from: {log_files[0]} ({len(tasks)} new ranges since last checkpoint)")
+            line_count, records = parse_log_tasks(tasks, jobs) if tasks else (0, LogRecords())
+            logger.info(f"📊 New log lines found: {line_count}")
+            return line_count, records
+        if log_files:
+            tasks = plan_log_tasks(log_files, jobs)
+            logger.info(f"📁 Reading logs from: {log_files[0]}")
+            if jobs > 1:
+                logger.info(f"⚡ Parsing {len(tasks)} chunks across {min(jobs, len(tasks))} processes")
+            line_count, records = parse_log_tasks(tasks, jobs, limit)
+            if line_count:
+                logger.info(f"📊 Total log lines found: {line_count}")
+                return line_count, records
+        
+        # No access log lines: fall back to CSV, then JSON request logs
+        records = LogRecords()
+        line_count = 0
+        for source in (self._iter_csv_records, self._iter_json_records):
+            for record in source():
+                line_count += 1
+                records.append(*record)
+                if limit and line_count >= limit:
+                    break
+            if line_count:
+                break
+        logger.info(f"📊 Total log lines found: {line_count}")
+        return line_count, records
+    
+    def _load_checkpoint(self, full: bool = False) -> TrainingCheckpoint:
+        """The incremental training checkpoint; empty for a full rebuild"""
+        log_dir = self.get_config('AIWAF_LOG_DIR', DEFAULT_LOG_DIR)
+        path = self.get_config('AIWAF_TRAIN_CHECKPOINT_PATH') or os.path.join(log_dir, CHECKPOINT_FILENAME)
+        if full or not self.get_config('AIWAF_TRAIN_INCREMENTAL', True):
+            return TrainingCheckpoint(path, log_dir)
+        return TrainingCheckpoint.load(path, log_dir)
     
     def _parse(self, line: str) -> Optional[Dict[str, Any]]:
-        """Parse a log line using multiple regex patterns"""
-        for pattern in _LOG_RX_PATTERNS:
-            m = pattern.search(line)
-            if m:
-                groups = m.groups()
-                ip = groups[0]
-                ts_str = groups[1]
-                path = groups[2]
-                status = groups[3]
-                
-                # Response time might be in different positions
-                rt = 0.0
-                for group in groups[4:]:
-                    try:
-                        if '.' in str(group):
-                            rt = float(group)
-                            break
-                    except (ValueError, TypeError):
-                        continue
-                
-                try:
-                    ts = datetime.strptime(ts_str.split()[0], "%d/%b/%Y:%H:%M:%S")
-                except ValueError:
-                    try:
-                        # Try different timestamp formats
-                        ts = datetime.fromisoformat(ts_str.replace('Z', '+00:00'))
-                    except ValueError:
-                        continue
-                
-                return {
-                    "ip": ip,
-                    "timestamp": ts,
-                    "path": path,
-                    "status": status,
-                    "response_time": rt,
-                }
-        
-        return None
+        """Parse a single log line, detecting its format"""
+        return parse_log_line(line)
     
     def _is_malicious_context_trainer(self, path: str, keyword: str, status: str = "404") -> bool:
         """Determine if a keyword appears in a malicious context (trainer version)"""
@@ -473,10 +472,17 @@ class FlaskAITrainer:
         
         return any(malicious_indicators)
     
-    def train(self, disable_ai: bool = False) -> None:
-        """Enhanced training with improved keyword filtering and exemption handling"""
+    def train(self, disable_ai: bool = False, full: bool = False) -> None:
+        """Enhanced training with improved keyword filtering and exemption handling
+        
+        Only log data appended since the last run is parsed and merged into the
+        training checkpoint; full=True rebuilds it from the whole log history.
+        """
         logger.info("🚀 Starting AIWAF Flask enhanced training...")
         
+        # Routes are resolved once per training run
+        self._routes = RouteOracle(self.app.url_map) if self.app else None
+        
         if not AI_AVAILABLE and not disable_ai:
             logger.info("⚠️  AI dependencies not available - switching to keyword-only mode")
             logger.info("   Install with: pip install aiwaf-flask[ai]")
@@ -494,55 +500,59 @@ class FlaskAITrainer:
         # For now, we'll rely on the existing exemption system during blocking
         exempted_count = 0  # Since we can't easily get all exempted IPs
         
-        raw_lines = self._read_all_logs()
-        if not raw_lines:
+        # One streaming pass over new data: lines are parsed as they are read, never all held
+        checkpoint = self._load_checkpoint(full)
+        new_lines, parsed = self._collect_records(checkpoint=checkpoint)
+        if not new_lines and checkpoint.lines:
+            logger.info("✅ No new log lines since the last training run (use --full to retrain from scratch)")
+            return
+        line_count = checkpoint.lines + new_lines
+        if not line_count:
             logger.info("❌ No log lines found – check AIWAF_LOG_DIR setting or log files.")
             return
         
         # Skip processing if we have too few entries
-        if len(raw_lines) < 50:
-            logger.info(f"⚠️  Only {len(raw_lines)} log entries found - need at least 50 for basic training")
+        if line_count < 50:
+            logger.info(f"⚠️  Only {line_count} log entries found - need at least 50 for basic training")
             return
         
         # Check if we have enough data for AI training
         min_ai_threshold = current_app.config.get('AIWAF_MIN_AI_LOGS', 10000)
         force_ai = current_app.config.get('AIWAF_FORCE_AI', False)
         
-        if not disable_ai and not force_ai and len(raw_lines) < min_ai_threshold:
-            logger.info(f"⚠️  Only {len(raw_lines)} log entries found - need at least {min_ai_threshold} for AI training")
+        if not disable_ai and not force_ai and line_count < min_ai_threshold:
+            logger.info(f"⚠️  Only {line_count} log entries found - need at least {min_ai_threshold} for AI training")
             logger.info("   Switching to keyword-only mode (use --force-ai to override or --disable-ai to suppress this warning)")
             disable_ai = True
-        elif not disable_ai and force_ai and len(raw_lines) < min_ai_threshold:
-            logger.info(f"⚠️  Only {len(raw_lines)} log entries found (recommended: {min_ai_threshold}+) but forcing AI training")
-        
-        parsed = []
-        ip_404 = defaultdict(int)
-        ip_404_login = defaultdict(int)
-        ip_times = defaultdict(list)
-        
-        logger.info(f"📋 Parsing {len(raw_lines)} log entries...")
-        for line in raw_lines:
-            rec = self._parse(line)
-            if not rec:
-                continue
-            parsed.append(rec)
-            ip_times[rec["ip"]].append(rec["timestamp"])
-            if rec["status"] == "404":
-                if is_path_exempt(rec["path"]):
-                    ip_404_login[rec["ip"]] += 1
-                else:
-                    ip_404[rec["ip"]] += 1
-        
-        logger.info(f"✅ Successfully parsed {len(parsed)} log entries")
+        elif not disable_ai and force_ai and line_count < min_ai_threshold:
+            logger.info(f"⚠️  Only {line_count} log entries found (recommended: {min_ai_threshold}+) but forcing AI training")
+        
+        new_records = parsed
+        logger.info(f"✅ Successfully parsed {len(new_records)} log entries")
         
         # Check if we have enough data
-        if len(parsed) < 50:
-            logger.info(f"⚠️  Only {len(parsed)} valid entries parsed - need at least 50 for basic training")
+        record_count = checkpoint.records + len(new_records)
+        if record_count < 50:
+            logger.info(f"⚠️  Only {record_count} valid entries parsed - need at least 50 for basic training")
             return
         
-        # 404 flood blocking (only for non-login paths)
+        # Burst counts reach back into requests trained on in earlier runs
+        parsed, context_rows = checkpoint.with_burst_context(new_records)
+        
+        # Path checks run once per unique path, indexed by path id
+        path_exempt = [is_path_exempt(path) for path in parsed.paths]
+        run_404, run_404_login = count_404s(parsed, path_exempt)
+        ip_404, ip_404_login = checkpoint.merge_404s(
+            run_404, run_404_login,
+            now=max(new_records.epochs, default=None),
+            max_age=self.get_config('AIWAF_TRAIN_404_MAX_AGE', 7 * 24 * 3600),
+        )
+        
+        # 404 flood blocking (only for non-login paths), for IPs with new 404s:
+        # an IP unblocked since an earlier run is not blocked again on old totals
         blocked_404_count = 0
-        for ip, count in ip_404.items():
+        for ip in run_404:
+            count = ip_404[ip]
             if count >= 6:
                 login_404s = ip_404_login.get(ip, 0)
                 total_404s = count + login_404s
@@ -555,23 +565,23 @@ class FlaskAITrainer:
             logger.info(f"🚫 Blocked {blocked_404_count} IPs for excessive 404 errors")
         
         # Prepare feature data (prefer Rust if enabled)
+        path_known = [self.path_exists_in_flask(path) for path in parsed.paths]
         feature_dicts = []
         use_rust = self.get_config("AIWAF_USE_RUST", False) and rust_backend.rust_available()
         if use_rust:
             records = []
-            for r in parsed:
-                known_path = self.path_exists_in_flask(r["path"])
-                kw_check = not known_path and not is_path_exempt(r["path"])
-                status_idx = STATUS_IDX.index(r["status"]) if r["status"] in STATUS_IDX else -1
+            for (ip, epoch, path, status, resp_time), path_id in zip(parsed.rows(), parsed.path_ids):
+                kw_check = not path_known[path_id] and not path_exempt[path_id]
+                status_idx = STATUS_IDX.index(str(status)) if str(status) in STATUS_IDX else -1
                 records.append({
-                    "ip": r["ip"],
-                    "path_lower": r["path"].lower(),
-                    "path_len": len(r["path"]),
-                    "timestamp": r["timestamp"].timestamp(),
-                    "response_time": r["response_time"],
+                    "ip": ip,
+                    "path_lower": path.lower(),
+                    "path_len": len(path),
+                    "timestamp": epoch,
+                    "response_time": resp_time,
                     "status_idx": status_idx,
                     "kw_check": kw_check,
-                    "total_404": ip_404[r["ip"]],
+                    "total_404": ip_404[ip],
                 })
 
             rust_features = rust_backend.extract_features(records, STATIC_KW)
@@ -579,35 +589,34 @@ class FlaskAITrainer:
                 feature_dicts = rust_features
 
         if not feature_dicts:
-            for r in parsed:
-                ip = r["ip"]
-                burst = sum(
-                    1 for t in ip_times[ip]
-                    if (r["timestamp"] - t).total_seconds() <= 10
-                )
-                total404 = ip_404[ip]
-                known_path = self.path_exists_in_flask(r["path"])
-                kw_hits = 0
-                if not known_path and not is_path_exempt(r["path"]):
-                    kw_hits = sum(k in r["path"].lower() for k in STATIC_KW)
-                
-                status_idx = STATUS_IDX.index(r["status"]) if r["status"] in STATUS_IDX else -1
-                
-                feature_dicts.append({
-                    "ip": ip,
-                    "path_len": len(r["path"]),
-                    "kw_hits": kw_hits,
-                    "resp_time": r["response_time"],
-                    "status_idx": status_idx,
-                    "burst_count": burst,
-                    "total_404": total404,
-                })
-        
-        if not feature_dicts:
+            path_kw_hits = [
+                0 if path_known[i] or path_exempt[i] else sum(k in path.lower() for k in STATIC_KW)
+                for i, path in enumerate(parsed.paths)
+            ]
+            feature_dicts = extract_features(parsed, ip_404, path_kw_hits, STATUS_IDX)
+        
+        if context_rows:
+            # Context rows only feed burst counts; they are not trained on again
+            if isinstance(feature_dicts, dict):
+                feature_dicts = {name: column[context_rows:] for name, column in feature_dicts.items()}
+            else:
+                feature_dicts = feature_dicts[context_rows:]
+        
+        # The model is fitted on a bounded sample of every run's rows, not on this run's alone
+        feature_cols, feature_ips, X = _feature_matrix(feature_dicts)
+        del feature_dicts  # the columns now live in X
+        if not len(X):
             logger.info("❌ Nothing to train on – no valid log entries.")
             return
         
-        logger.info(f"🔢 Generated {len(feature_dicts)} feature vectors for training")
+        logger.info(f"🔢 Generated {len(X)} feature vectors for training")
+        
+        reservoir_size = self.get_config('AIWAF_TRAIN_RESERVOIR_SIZE', 20000)
+        fit_rows = checkpoint.sample_features(feature_cols, X, reservoir_size)
+        if not disable_ai and AI_AVAILABLE and (
+                len(fit_rows) < 50 or (not force_ai and len(fit_rows) < min(min_ai_threshold, reservoir_size))):
+            logger.info(f"⚠️  Only {len(fit_rows)} feature rows to fit - keeping the existing AI model")
+            disable_ai = True
         
         # AI Model Training (optional)
         blocked_count = 0
@@ -615,9 +624,7 @@ class FlaskAITrainer:
             logger.info("🤖 Training AI anomaly detection model...")
             
             try:
-                df = pd.DataFrame(feature_dicts)
-                feature_cols = [c for c in df.columns if c != "ip"]
-                X = df[feature_cols].astype(float).values
+                X_fit = np.asarray(fit_rows, dtype=np.float64)
                 
                 contamination = self.get_config("AIWAF_AI_CONTAMINATION", 0.05)
                 model = IsolationForest(contamination=contamination, random_state=42)
@@ -626,7 +633,7 @@ class FlaskAITrainer:
                 import warnings
                 with warnings.catch_warnings():
                     warnings.filterwarnings("ignore", category=UserWarning, module="sklearn")
-                    model.fit(X)
+                    model.fit(X_fit)
                 
                 # Ensure model directory exists
                 model_path = self.get_config("AIWAF_MODEL_PATH", DEFAULT_MODEL_PATH)
@@ -635,18 +642,34 @@ class FlaskAITrainer:
                 # Save model with metadata
                 model_data = {
                     'model': model,
+                    # Flat tree arrays for the NumPy evaluator used at inference time
+                    'compiled': export_isolation_forest(model),
                     'sklearn_version': sklearn.__version__,
                     'created_at': str(datetime.now()),
                     'feature_count': len(feature_cols),
-                    'samples_count': len(X),
+                    'samples_count': len(X_fit),
                     'framework': 'flask'
                 }
                 joblib.dump(model_data, model_path)
                 logger.info(f"💾 Model saved: {model_path}")
-                logger.info(f"📊 Trained on {len(X)} samples with scikit-learn v{sklearn.__version__}")
                 
-                # Check for anomalies and intelligently decide which IPs to block
+                # Memory-mappable copy the middleware loads without unpickling
+                artifact_path = artifact_path_for(model_path)
+                try:
+                    save_forest_artifact(
+                        artifact_path,
+                        model_data['compiled'],
+                        {k: v for k, v in model_data.items() if k not in ('model', 'compiled')},
+                    )
+                    logger.info(f"💾 Compiled model saved: {artifact_path}")
+                except OSError as e:
+                    logger.warning(f"⚠️ Could not write compiled model {artifact_path}: {e}")
+                logger.info(f"📊 Trained on {len(X_fit)} samples with scikit-learn v{sklearn.__version__}")
+                
+                # Check this run's requests for anomalies and intelligently decide which IPs to block
                 preds = model.predict(X)
+                df = pd.DataFrame(X, columns=feature_cols, copy=False)
+                df["ip"] = feature_ips
                 anomalous_ips = set(df.loc[preds == -1, "ip"])
                 
                 if anomalous_ips:
@@ -696,28 +719,30 @@ class FlaskAITrainer:
                 disable_ai = True
         else:
             logger.info("🔤 AI model training skipped")
-            if not disable_ai:
-                df = pd.DataFrame(feature_dicts)  # Still need df for some operations
         
         # Keyword Learning
         logger.info("📚 Learning suspicious keywords from logs...")
         
         tokens = Counter()
+        token_examples = defaultdict(list)
         legitimate_keywords = self.get_legitimate_keywords()
         
-        for r in parsed:
+        for _, _, path, status, _ in parsed.rows():
             # Only learn from suspicious requests (errors on non-existent paths)
-            if (r["status"].startswith(("4", "5")) and 
-                not self.path_exists_in_flask(r["path"]) and 
-                not is_path_exempt(r["path"])):
+            if (400 <= status < 600 and 
+                not self.path_exists_in_flask(path) and 
+                not is_path_exempt(path)):
                 
-                for seg in re.split(r"\W+", r["path"].lower()):
+                for seg in re.split(r"\W+", path.lower()):
                     if (len(seg) > 3 and 
                         seg not in STATIC_KW and 
                         seg not in legitimate_keywords and
-                        self._is_malicious_context_trainer(r["path"], seg, r["status"])):
+                        self._is_malicious_context_trainer(path, seg, str(status))):
                         tokens[seg] += 1
+                        if len(token_examples[seg]) < EXAMPLE_PATHS:
+                            token_examples[seg].append(path)
         
+        tokens = checkpoint.merge_tokens(tokens, token_examples)
         keyword_store = get_keyword_store()
         top_n = self.get_config("AIWAF_DYNAMIC_TOP_N", 10)
         top_tokens = tokens.most_common(top_n)
@@ -728,10 +753,11 @@ class FlaskAITrainer:
         
         for kw, cnt in top_tokens:
             # Find example paths where this keyword appeared
-            example_paths = [r["path"] for r in parsed 
-                            if kw in r["path"].lower() and 
-                            r["status"].startswith(("4", "5")) and
-                            not self.path_exists_in_flask(r["path"])]
+            example_paths = [path for _, _, path, status, _ in parsed.rows()
+                            if kw in path.lower() and 
+                            400 <= status < 600 and
+                            not self.path_exists_in_flask(path)]
+            example_paths = example_paths or checkpoint.examples.get(kw, [])
             
             # Only add if keyword appears in malicious contexts
             if (cnt >= 2 and
@@ -751,7 +777,7 @@ class FlaskAITrainer:
         else:
             logger.info("🤖 AIWAF FLASK ENHANCED TRAINING COMPLETE")
         logger.info("="*60)
-        logger.info(f"📊 Training Data: {len(parsed)} log entries processed")
+        logger.info(f"📊 Training Data: {len(new_records)} new log entries processed ({record_count} in total)")
         
         if not disable_ai and AI_AVAILABLE:
             logger.info(f"🤖 AI Model: Trained with {len(feature_cols) if 'feature_cols' in locals() else 'N/A'} features")
@@ -773,6 +799,8 @@ class FlaskAITrainer:
             logger.info("✅ Enhanced AI protection now active with context-aware filtering!")
         logger.info("="*60)
 
+        checkpoint.commit(new_lines, new_records)
+
         try:
             _print_geoip_blocklist_summary()
         except Exception:
@@ -785,22 +813,23 @@ def init_trainer(app: Flask):
     """Initialize the trainer with Flask app"""
     _trainer.init_app(app)
 
-def train_from_logs(app: Optional[Flask] = None, disable_ai: bool = False):
+def train_from_logs(app: Optional[Flask] = None, disable_ai: bool = False, full: bool = False):
     """Train AIWAF from logs
     
     Args:
         app: Flask application instance (optional if already initialized)
         disable_ai: If True, skip AI model training and only do keyword learning
+        full: If True, ignore the training checkpoint and re-read all logs
     """
     if app:
         _trainer.init_app(app)
     
-    _trainer.train(disable_ai=disable_ai)
+    _trainer.train(disable_ai=disable_ai, full=full)
 
 # Convenience function for backward compatibility
-def train(disable_ai: bool = False):
+def train(disable_ai: bool = False, full: bool = False):
     """Train AIWAF from logs (requires app to be initialized first)"""
-    _trainer.train(disable_ai=disable_ai)
+    _trainer.train(disable_ai=disable_ai, full=full)
 
 # Legacy function for compatibility
 def get_legitimate_keywords():
@@ -826,14 +855,8 @@ def _print_geoip_summary(ips, title):
         logger.info("GeoIP summary skipped: AIWAF_GEOIP_DB_PATH not set or file missing.")
         return
 
-    counts = Counter()
-    unknown = 0
-    for ip in ips:
-        name = lookup_country_name(ip, cache_prefix=None, cache_seconds=None, db_path=db_path)
-        if name:
-            counts[name] += 1
-        else:
-            unknown += 1
+    counts = batch_country_counts(ips, db_path=db_path)
+    unknown = counts.pop(None, 0)
 
     if not counts and not unknown:
         return
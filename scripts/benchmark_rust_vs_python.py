@@ -1,16 +1,18 @@
 #!/usr/bin/env python3
-"""Quick benchmark: Rust vs Python header validation + AI analysis helpers."""
+"""Quick benchmark: Rust vs Python header validation + AI analysis helpers + burst windows."""
 
 from __future__ import annotations
 
 import argparse
 import os
+import random
 import sys
 import time
 
 sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
-from aiwaf_flask import rust_backend
+from aiwaf_flask import anomaly_middleware, rust_backend
+from aiwaf_flask.anomaly_middleware import _average_burst
 from aiwaf_flask.header_validation_middleware import validate_headers_python
 
 
@@ -105,9 +107,52 @@ def analyze_recent_behavior_python(entries: list[dict], static_keywords: list[st
     }
 
 
+def quadratic_average_burst(timestamps: list[float], span: float = 10) -> float:
+    """The pre-windowed AIAnomalyMiddleware burst scan, kept for comparison."""
+    counts = [sum(1 for t in timestamps if abs(entry - t) <= span) for entry in timestamps]
+    return sum(counts) / len(counts) if counts else 0
+
+
+def benchmark_burst(entry_count: int, iterations: int) -> None:
+    rng = random.Random(0)
+    timestamps = sorted(1000.0 + rng.random() * 300 for _ in range(entry_count))
+    entries = [
+        {"path_lower": "/home", "timestamp": t, "status": 200, "kw_check": False}
+        for t in timestamps
+    ]
+    label = f"({entry_count} entries)"
+
+    quad_iters = max(1, iterations // 1000)
+    quad_time = bench(lambda: quadratic_average_burst(timestamps), quad_iters)
+    print(f"Python burst O(n^2) {label}:      {quad_iters / quad_time:.2f} ops/sec")
+
+    saved_min = anomaly_middleware.NUMPY_BURST_MIN_ENTRIES
+    try:
+        anomaly_middleware.NUMPY_BURST_MIN_ENTRIES = float("inf")
+        sweep_time = bench(lambda: _average_burst(timestamps), iterations)
+        print(f"Python burst two-pointer {label}: {iterations / sweep_time:.2f} ops/sec")
+        if anomaly_middleware.NUMPY_AVAILABLE:
+            anomaly_middleware.NUMPY_BURST_MIN_ENTRIES = 0
+            numpy_time = bench(lambda: _average_burst(timestamps), iterations)
+            print(f"NumPy burst searchsorted {label}: {iterations / numpy_time:.2f} ops/sec")
+        else:
+            print("NumPy burst searchsorted: skipped (numpy not available)")
+    finally:
+        anomaly_middleware.NUMPY_BURST_MIN_ENTRIES = saved_min
+
+    if rust_backend.rust_available():
+        rust_iters = max(1, iterations // 100)
+        rust_time = bench(lambda: rust_backend.analyze_recent_behavior(entries, []), rust_iters)
+        print(f"Rust analyze_recent {label}:      {rust_iters / rust_time:.2f} ops/sec")
+    else:
+        print("Rust analyze_recent burst: skipped (aiwaf_rust not available)")
+
+
 def main() -> int:
     parser = argparse.ArgumentParser()
     parser.add_argument("--iters", type=int, default=10000)
+    parser.add_argument("--burst-entries", type=int, default=1000,
+                        help="History size for the burst window benchmark")
     args = parser.parse_args()
 
     headers = {
@@ -174,6 +219,8 @@ def main() -> int:
         print(f"Rust analyze_recent:      {args.iters / rust_recent_time:.2f} ops/sec")
     else:
         print("Rust analysis helpers:    skipped (aiwaf_rust not available)")
+
+    benchmark_burst(args.burst_entries, max(1, args.iters // 10))
     return 0
 
 
@@ -0,0 +1,28 @@
+import random
+
+import pytest
+
+from aiwaf_flask import anomaly_middleware
+from aiwaf_flask.anomaly_middleware import _average_burst
+
+
+def _quadratic_average_burst(timestamps, span=10):
+    counts = [sum(1 for t in timestamps if abs(entry - t) <= span) for entry in timestamps]
+    return sum(counts) / len(counts) if counts else 0
+
+
+@pytest.mark.parametrize("use_numpy", [False, True])
+def test_average_burst_matches_quadratic_scan(monkeypatch, use_numpy):
+    if use_numpy and not anomaly_middleware.NUMPY_AVAILABLE:
+        pytest.skip("NumPy not installed")
+    monkeypatch.setattr(anomaly_middleware, "NUMPY_BURST_MIN_ENTRIES", 1 if use_numpy else 10 ** 9)
+    rng = random.Random(3)
+
+    for n in (0, 1, 2, 17, 300):
+        # Quarter-second resolution keeps exact +/-10s boundaries in play
+        timestamps = [1000 + rng.randrange(0, 1200) / 4 for _ in range(n)]
+        assert _average_burst(timestamps) == pytest.approx(_quadratic_average_burst(timestamps))
+
+
+def test_average_burst_handles_unsorted_input():
+    assert _average_burst([30.0, 0.0, 10.0, 5.0]) == pytest.approx((3 + 3 + 3 + 1) / 4)
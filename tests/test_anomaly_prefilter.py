@@ -0,0 +1,106 @@
+import time
+
+from flask import Flask
+
+from aiwaf_flask.anomaly_middleware import AIAnomalyMiddleware
+
+
+class CountingModel:
+    def __init__(self):
+        self.calls = 0
+
+    def predict(self, X):
+        self.calls += 1
+        return [1] * len(X)
+
+
+def _make_app(config=None):
+    app = Flask(__name__)
+    app.config.update({
+        'TESTING': True,
+        'AIWAF_USE_CSV': False,
+        'AIWAF_MIN_AI_LOGS': 10 ** 9,
+    })
+    if config:
+        app.config.update(config)
+
+    @app.route('/known')
+    def known():
+        return 'OK'
+
+    middleware = AIAnomalyMiddleware(app)
+    middleware.last_ai_check = time.time()  # keep the status check from unloading the model
+    middleware.model = CountingModel()
+    return app, middleware
+
+
+def _get(app, path, ip='198.51.100.7'):
+    return app.test_client().get(path, environ_base={'REMOTE_ADDR': ip})
+
+
+def test_benign_requests_skip_the_model():
+    app, middleware = _make_app()
+    for _ in range(5):
+        assert _get(app, '/known').status_code == 200
+    assert middleware.model.calls == 0
+
+    _get(app, '/missing-page')
+    assert middleware.model.calls == 1
+
+    # A 404 in the window sends this IP's later requests to the model too
+    _get(app, '/known')
+    assert middleware.model.calls == 2
+
+    # Other IPs are unaffected
+    _get(app, '/known', ip='198.51.100.8')
+    assert middleware.model.calls == 2
+
+    assert middleware.get_stats()['scoring_tiers'] == {'no_model': 0, 'prefilter': 6, 'model': 2}
+
+
+def test_burst_threshold_defers_to_model():
+    app, middleware = _make_app({'AIWAF_AI_PREFILTER_BURST': 3})
+    for _ in range(5):
+        _get(app, '/known')
+    assert middleware.model.calls == 2
+    assert middleware.tier_counts['prefilter'] == 3
+
+
+def test_prefilter_can_be_disabled():
+    app, middleware = _make_app({'AIWAF_AI_PREFILTER': False})
+    for _ in range(3):
+        _get(app, '/known')
+    assert middleware.model.calls == 3
+
+    middleware.model = None
+    _get(app, '/known')
+    assert middleware.tier_counts == {'no_model': 1, 'prefilter': 0, 'model': 3}
+
+
+class FlaggingModel(CountingModel):
+    def predict(self, X):
+        self.calls += 1
+        return [-1] * len(X)
+
+
+def test_scan_like_known_route_still_reaches_the_model():
+    app, middleware = _make_app()
+
+    @app.route('/admin/config/backup/shell')
+    def scan_like():
+        return 'OK'
+
+    middleware.model = FlaggingModel()
+    assert _get(app, '/admin/config/backup/shell').status_code == 403
+    assert middleware.tier_counts['prefilter'] == 0
+
+
+def test_keyword_hits_in_history_defer_to_model():
+    app, middleware = _make_app()
+    ip = '198.51.100.9'
+    # e.g. an unknown path refused by another middleware, so no 404 was recorded
+    middleware.request_cache.record(f'aiwaf:{ip}', time.time(), '/wp-admin/setup.php', 403, 0.01)
+
+    _get(app, '/known', ip=ip)
+    assert middleware.model.calls == 1
+    assert middleware.tier_counts['prefilter'] == 0
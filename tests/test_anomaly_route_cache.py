@@ -0,0 +1,92 @@
+from flask import Flask
+
+from aiwaf_flask.anomaly_middleware import AIAnomalyMiddleware
+
+
+def _make_app(config=None):
+    app = Flask(__name__)
+    app.config.update({
+        'TESTING': True,
+        'AIWAF_USE_CSV': False,
+        'AIWAF_MIN_AI_LOGS': 10 ** 9,
+    })
+    if config:
+        app.config.update(config)
+
+    @app.route('/known')
+    def known():
+        return 'OK'
+
+    @app.route('/items/<int:item_id>', methods=['POST'])
+    def item(item_id):
+        return 'OK'
+
+    return app
+
+
+def _count_matches(monkeypatch):
+    calls = []
+    real_match = AIAnomalyMiddleware._match_route
+
+    def counting_match(url_map, path):
+        calls.append(path)
+        return real_match(url_map, path)
+
+    monkeypatch.setattr(AIAnomalyMiddleware, '_match_route', staticmethod(counting_match))
+    return calls
+
+
+def test_route_lookups_are_memoized(monkeypatch):
+    app = _make_app()
+    middleware = AIAnomalyMiddleware(app)
+    calls = _count_matches(monkeypatch)
+
+    with app.app_context():
+        for _ in range(3):
+            assert middleware._route_exists('/known')
+            assert middleware._route_exists('/items/5')  # POST-only still exists
+            assert not middleware._route_exists('/wp-admin')
+
+    assert calls == ['/known', '/items/5', '/wp-admin']
+    assert middleware.get_stats()['cached_routes'] == 3
+
+
+def test_current_request_uses_flask_routing(monkeypatch):
+    app = _make_app()
+    middleware = AIAnomalyMiddleware(app)
+    calls = _count_matches(monkeypatch)
+
+    with app.test_request_context('/known'):
+        assert middleware._route_exists('/known')
+    with app.test_request_context('/items/7', method='GET'):
+        assert middleware._route_exists('/items/7')
+    with app.test_request_context('/missing'):
+        assert not middleware._route_exists('/missing')
+
+    assert calls == []
+
+
+def test_route_cache_invalidated_when_url_map_changes(monkeypatch):
+    app = _make_app()
+    middleware = AIAnomalyMiddleware(app)
+
+    with app.app_context():
+        assert not middleware._route_exists('/late')
+
+    app.add_url_rule('/late', 'late', lambda: 'OK')
+
+    with app.app_context():
+        assert middleware._route_exists('/late')
+
+
+def test_route_cache_is_bounded(monkeypatch):
+    app = _make_app({'AIWAF_ROUTE_CACHE_SIZE': 2})
+    middleware = AIAnomalyMiddleware(app)
+    calls = _count_matches(monkeypatch)
+
+    with app.app_context():
+        for path in ('/a', '/b', '/c', '/a'):
+            middleware._route_exists(path)
+
+    assert calls == ['/a', '/b', '/c', '/a']
+    assert list(middleware._route_cache) == ['/c', '/a']
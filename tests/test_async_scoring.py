@@ -0,0 +1,108 @@
+import threading
+import time
+
+import pytest
+from flask import Flask
+
+from aiwaf_flask.anomaly_middleware import AIAnomalyMiddleware
+from aiwaf_flask.async_scoring import AsyncModelScorer
+
+
+def test_scorer_batches_items():
+    batches = []
+    handled = []
+
+    scorer = AsyncModelScorer(
+        lambda items: batches.append(list(items)) or [i * 10 for i in items],
+        lambda item, prediction: handled.append((item, prediction)),
+        batch_size=4,
+        interval_ms=50,
+    )
+    for i in range(10):
+        assert scorer.submit(i)
+    assert scorer.flush()
+    scorer.stop()
+
+    assert sorted(handled) == [(i, i * 10) for i in range(10)]
+    assert all(len(batch) <= 4 for batch in batches)
+    assert len(batches) < 10
+    assert scorer.stats()["scored"] == 10
+
+
+def _blocked_scorer(overflow):
+    release = threading.Event()
+
+    def slow_score(items):
+        release.wait(2)
+        return [1] * len(items)
+
+    scorer = AsyncModelScorer(slow_score, lambda item, p: None, batch_size=1,
+                              interval_ms=0, queue_size=1, overflow=overflow)
+    scorer.submit("busy")  # taken by the worker, which then blocks
+    for _ in range(200):
+        if scorer.stats()["queued"] == 0:
+            break
+        threading.Event().wait(0.005)
+    assert scorer.submit("queued")
+    return scorer, release
+
+
+@pytest.mark.parametrize("overflow, accepted, dropped", [
+    ("sync", False, 0),
+    ("drop", True, 1),
+    ("drop_oldest", True, 1),
+])
+def test_overflow_policies(overflow, accepted, dropped):
+    scorer, release = _blocked_scorer(overflow)
+    try:
+        assert scorer.submit("overflow") is accepted
+        stats = scorer.stats()
+        assert stats["overflowed"] == 1
+        assert stats["dropped"] == dropped
+    finally:
+        release.set()
+        scorer.flush()
+        scorer.stop()
+
+
+def test_unknown_overflow_policy_rejected():
+    with pytest.raises(ValueError):
+        AsyncModelScorer(lambda items: [], lambda item, p: None, overflow="spill")
+
+
+class AlwaysAnomalous:
+    def __init__(self):
+        self.calls = []
+
+    def predict(self, X):
+        self.calls.append(len(X))
+        return [-1] * len(X)
+
+
+def test_async_mode_blocks_on_following_request():
+    app = Flask(__name__)
+    app.config.update({
+        'TESTING': True,
+        'AIWAF_USE_CSV': False,
+        'AIWAF_MIN_AI_LOGS': 10 ** 9,
+        'AIWAF_AI_SCORING_MODE': 'async',
+        'AIWAF_AI_BATCH_INTERVAL_MS': 5,
+    })
+    middleware = AIAnomalyMiddleware(app)
+    middleware.last_ai_check = time.time()  # keep the periodic check from unloading the model
+    model = AlwaysAnomalous()
+    middleware.model = model
+
+    client = app.test_client()
+    ip = {'REMOTE_ADDR': '203.0.113.9'}
+
+    first = client.get('/wp-admin/config/backup.php', environ_base=ip)
+    assert first.status_code == 404  # scored off the request path
+
+    assert middleware._scorer.flush()
+    assert model.calls == [1]
+
+    second = client.get('/', environ_base=ip)
+    assert second.status_code == 403
+    assert middleware.get_stats()['scoring_mode'] == 'async'
+    middleware._scorer.stop()
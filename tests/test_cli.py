@@ -6,6 +6,7 @@ Test AIWAF CLI functionality
 import tempfile
 import os
 import sys
+from collections import Counter
 from pathlib import Path
 
 # Add package to path
@@ -137,20 +138,21 @@ def test_cli_geo_command(monkeypatch, tmp_path):
 def test_cli_geoip_summary(monkeypatch, tmp_path, capsys):
     from aiwaf_flask.cli import AIWAFManager
     from aiwaf_flask import trainer as trainer_mod
+    from aiwaf_flask.log_ingest import LogRecords
     import aiwaf_flask.geoip as geoip_mod
 
     manager = AIWAFManager(str(tmp_path))
 
-    monkeypatch.setattr(trainer_mod._trainer, "_read_all_logs", lambda: ["line1", "line2"])
-    monkeypatch.setattr(
-        trainer_mod._trainer,
-        "_parse",
-        lambda line: {"ip": "1.1.1.1"} if line == "line1" else {"ip": "2.2.2.2"},
-    )
+    records = LogRecords()
+    records.append("1.1.1.1", 0.0, "/", 200)
+    records.append("2.2.2.2", 1.0, "/", 200)
+    monkeypatch.setattr(trainer_mod._trainer, "_collect_records", lambda jobs=None, limit=None: (2, records))
     monkeypatch.setattr(
         geoip_mod,
-        "lookup_country_name",
-        lambda ip, **kwargs: "United States" if ip == "1.1.1.1" else None,
+        "batch_country_counts",
+        lambda ip_counts, **kwargs: Counter(
+            {("United States" if ip == "1.1.1.1" else None): n for ip, n in ip_counts.items()}
+        ),
     )
 
     manager.geoip_traffic_summary(log_dir=str(tmp_path), top=10, limit=0)
@@ -0,0 +1,149 @@
+import warnings
+
+import pytest
+
+np = pytest.importorskip("numpy")
+pytest.importorskip("sklearn")
+from flask import Flask
+from sklearn.ensemble import IsolationForest
+
+from aiwaf_flask.anomaly_middleware import AIAnomalyMiddleware
+from aiwaf_flask.forest import (
+    CompiledIsolationForest,
+    artifact_path_for,
+    export_isolation_forest,
+    load_forest_artifact,
+    read_forest_artifact_info,
+    save_forest_artifact,
+)
+
+
+def _training_data(seed=0):
+    rng = np.random.default_rng(seed)
+    X = rng.normal(size=(1500, 6)) * [10, 2, 0.3, 3, 5, 4]
+    X[:, 1] = np.round(X[:, 1])
+    probe = np.vstack([X[:300], rng.normal(size=(300, 6)) * 25])
+    return X, probe
+
+
+@pytest.mark.parametrize("params", [
+    {},
+    {"contamination": 0.05},
+    {"max_features": 3},
+    {"max_samples": 64, "n_estimators": 17},
+])
+def test_compiled_forest_matches_sklearn(params):
+    X, probe = _training_data()
+    model = IsolationForest(random_state=42, **params).fit(X)
+    compiled = CompiledIsolationForest.from_sklearn(model)
+
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore")
+        expected_scores = model.score_samples(probe)
+        expected_pred = model.predict(probe)
+
+    np.testing.assert_allclose(compiled.score_samples(probe), expected_scores, rtol=0, atol=1e-12)
+    np.testing.assert_array_equal(compiled.predict(probe), expected_pred)
+    assert compiled.predict(probe[0]).shape == (1,)
+
+
+def test_arrays_round_trip():
+    X, probe = _training_data(1)
+    arrays = export_isolation_forest(IsolationForest(random_state=0).fit(X))
+    compiled = CompiledIsolationForest.from_arrays(arrays)
+    again = CompiledIsolationForest.from_arrays(compiled.to_arrays())
+    np.testing.assert_array_equal(again.decision_function(probe), compiled.decision_function(probe))
+
+    with pytest.raises(ValueError):
+        compiled.predict(np.zeros((1, 5)))
+
+
+def test_middleware_prefers_compiled_evaluator():
+    X, _ = _training_data()
+    model = IsolationForest(random_state=42).fit(X)
+    app = Flask(__name__)
+    middleware = AIAnomalyMiddleware()
+
+    selected = middleware._select_model({"model": model, "compiled": export_isolation_forest(model)}, app)
+    assert isinstance(selected, CompiledIsolationForest)
+
+    assert isinstance(middleware._select_model(model, app), CompiledIsolationForest)
+
+    app.config["AIWAF_MODEL_EVALUATOR"] = "sklearn"
+    assert middleware._select_model({"model": model}, app) is model
+
+
+def test_forest_artifact_round_trip_is_memory_mapped(tmp_path):
+    X, probe = _training_data(2)
+    model = IsolationForest(random_state=3).fit(X)
+    compiled = CompiledIsolationForest.from_sklearn(model)
+    path = tmp_path / "model.forest"
+
+    save_forest_artifact(str(path), compiled.to_arrays(), {"samples_count": len(X)})
+    loaded, metadata = load_forest_artifact(str(path))
+
+    assert metadata == {"samples_count": len(X)}
+    assert loaded.memory_mapped and loaded.artifact_path == str(path)
+    assert not loaded.threshold.flags.writeable
+    np.testing.assert_array_equal(loaded.predict(probe), model.predict(probe))
+    np.testing.assert_array_equal(load_forest_artifact(str(path), use_mmap=False)[0].score_samples(probe),
+                                  compiled.score_samples(probe))
+
+    info = read_forest_artifact_info(str(path))
+    assert info["format"] == "aiwaf-forest"
+    assert info["arrays"]["roots"]["shape"] == [model.n_estimators]
+
+    bogus = tmp_path / "bogus.forest"
+    bogus.write_bytes(b"not a forest")
+    with pytest.raises(ValueError):
+        load_forest_artifact(str(bogus))
+
+
+def test_artifact_path_for():
+    assert artifact_path_for("/data/model.pkl") == "/data/model.forest"
+    assert artifact_path_for("/data/model.forest") == "/data/model.forest"
+
+
+def test_middleware_loads_artifact_without_unpickling(tmp_path, monkeypatch):
+    X, probe = _training_data()
+    model = IsolationForest(random_state=42).fit(X)
+    model_path = tmp_path / "model.pkl"
+    save_forest_artifact(str(tmp_path / "model.forest"), export_isolation_forest(model))
+
+    app = Flask(__name__)
+    app.config.update(AIWAF_FORCE_AI=True, AIWAF_MODEL_PATH=str(model_path))
+    middleware = AIAnomalyMiddleware()
+
+    def fail(*args, **kwargs):
+        raise AssertionError("joblib.load should not be called")
+
+    monkeypatch.setattr("aiwaf_flask.anomaly_middleware.joblib.load", fail)
+    middleware._load_model(app)
+    assert isinstance(middleware.model, CompiledIsolationForest)
+    assert middleware.model.memory_mapped
+    np.testing.assert_array_equal(middleware.model.predict(probe), model.predict(probe))
+
+    app.config["AIWAF_MODEL_EVALUATOR"] = "sklearn"
+    middleware.model = None
+    middleware._load_model(app)
+    assert middleware.model is None
+
+
+def test_model_info_reports_serving_format(tmp_path, capsys):
+    from aiwaf_flask.cli import AIWAFManager
+
+    X, _ = _training_data()
+    model_path = tmp_path / "model.pkl"
+    model_path.write_bytes(b"")
+    manager = AIWAFManager.__new__(AIWAFManager)
+
+    manager._print_serving_format(model_path)
+    assert "pickle (joblib)" in capsys.readouterr().out
+
+    arrays = export_isolation_forest(IsolationForest(n_estimators=7, random_state=0).fit(X))
+    save_forest_artifact(str(tmp_path / "model.forest"), arrays, {"feature_count": 6})
+    manager._print_serving_format(model_path)
+    out = capsys.readouterr().out
+    assert "aiwaf-forest (memory-mapped)" in out
+    assert "Trees: 7" in out
+    assert "feature_count: 6" in out
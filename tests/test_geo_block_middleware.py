@@ -1,3 +1,4 @@
+import pytest
 from flask import Flask
 
 from aiwaf_flask.geo_block_middleware import GeoBlockMiddleware
@@ -83,3 +84,88 @@ def test_geo_block_disabled_path_rule(monkeypatch):
 
     assert client.get('/api/status', headers=headers).status_code == 200
     assert client.get('/ui', headers=headers).status_code == 403
+
+
+def test_geo_block_reads_storage_only_on_change(monkeypatch):
+    from aiwaf_flask import storage
+
+    app = _make_app({'AIWAF_USE_CSV': False})
+    monkeypatch.setattr(storage, '_memory_geo_blocked_countries', set())
+    monkeypatch.setattr(
+        'aiwaf_flask.geo_block_middleware.get_country_for_ip',
+        lambda ip, config: 'FR',
+    )
+    reads = {'count': 0}
+    real_get = storage.get_geo_blocked_countries
+
+    def counting_get():
+        reads['count'] += 1
+        return real_get()
+
+    monkeypatch.setattr('aiwaf_flask.geo_block_middleware.get_geo_blocked_countries', counting_get)
+    monkeypatch.setattr('aiwaf_flask.geo_block_middleware.BlacklistManager.block', lambda ip, reason: None)
+
+    GeoBlockMiddleware(app)
+
+    @app.route('/page')
+    def page():
+        return 'OK'
+
+    client = app.test_client()
+    headers = {'User-Agent': 'Test Browser 1.0'}
+
+    for _ in range(3):
+        assert client.get('/page', headers=headers).status_code == 200
+    assert reads['count'] == 1
+
+    with app.app_context():
+        storage.add_geo_blocked_country('fr')
+    assert client.get('/page', headers=headers).status_code == 403
+    assert reads['count'] == 2
+
+    with app.app_context():
+        storage.remove_geo_blocked_country('FR')
+    assert client.get('/page', headers=headers).status_code == 200
+    assert reads['count'] == 3
+
+
+def test_geo_block_policy_rebuilds_on_changes_not_per_request(monkeypatch):
+    from aiwaf_flask import storage
+
+    app = _make_app({'AIWAF_GEO_BLOCK_COUNTRIES': ['US'], 'AIWAF_GEO_BLOCKED_REFRESH_SECONDS': 60,
+                     'AIWAF_USE_CSV': False})
+    monkeypatch.setattr(storage, '_memory_geo_blocked_countries', set())
+    monkeypatch.setattr('aiwaf_flask.storage.os.stat', lambda *a, **k: pytest.fail('stat per request'))
+    middleware = GeoBlockMiddleware(app)
+
+    policy = middleware._get_policy(app)
+    assert policy.is_blocked('US') and not policy.is_blocked('FR')
+    assert middleware._get_policy(app) is policy
+
+    # In-place edits wait for the refresh interval or an explicit refresh
+    app.config['AIWAF_GEO_BLOCK_COUNTRIES'].append('FR')
+    assert middleware._get_policy(app) is policy
+    middleware.refresh_policy()
+    assert middleware._get_policy(app).is_blocked('FR')
+
+    # A reassigned list or a storage write rebuilds at once
+    app.config['AIWAF_GEO_BLOCK_COUNTRIES'] = ['DE']
+    assert middleware._get_policy(app).is_blocked('DE')
+    with app.app_context():
+        storage.add_geo_blocked_country('cn')
+    assert middleware._get_policy(app).is_blocked('CN')
+
+
+def test_geo_block_policy_verdicts():
+    from aiwaf_flask.geo_block_middleware import GeoBlockPolicy
+
+    block = GeoBlockPolicy(allow=set(), block={'US'}, dynamic={'CN', 'EU1'})
+    assert block.is_blocked('US')
+    assert block.is_blocked('CN')
+    assert block.is_blocked('EU1')
+    assert not block.is_blocked('FR')
+
+    allow = GeoBlockPolicy(allow={'US'}, block={'FR'}, dynamic=set())
+    assert not allow.is_blocked('US')
+    assert allow.is_blocked('FR')
+    assert allow.is_blocked('ZZZ')
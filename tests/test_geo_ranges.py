@@ -0,0 +1,176 @@
+import os
+import threading
+
+import pytest
+from flask import Flask
+
+from aiwaf_flask import geo_ranges
+from aiwaf_flask.geo_block_middleware import GeoBlockMiddleware
+from aiwaf_flask.geo_ranges import _merge_ranges, load_geo_ranges
+
+
+def _make_fake_reader(networks):
+    import ipaddress
+
+    class FakeReader:
+        def __iter__(self):
+            for cidr, record in networks:
+                yield ipaddress.ip_network(cidr), record
+
+        def close(self):
+            pass
+
+    return FakeReader
+
+
+NETWORKS = [
+    ("1.1.0.0/20", {"country_code": "AU"}),
+    ("1.1.16.0/20", {"country_code": "AU"}),
+    ("8.8.8.0/24", {"country_code": "US"}),
+    ("2001:db8::/32", {"country_code": "FR"}),
+    ("9.0.0.0/8", {}),
+]
+
+
+@pytest.fixture
+def fake_db(tmp_path, monkeypatch):
+    db_path = tmp_path / "geo.mmdb"
+    db_path.write_bytes(b"mmdb")
+    calls = {"count": 0}
+    reader_cls = _make_fake_reader(NETWORKS)
+
+    def fake_open(path):
+        calls["count"] += 1
+        return reader_cls()
+
+    monkeypatch.setattr(geo_ranges, "MAXMINDDB_AVAILABLE", True)
+    monkeypatch.setattr(geo_ranges, "maxminddb", type("M", (), {"open_database": staticmethod(fake_open)}))
+    return str(db_path), calls
+
+
+def test_merge_ranges_joins_adjacent_same_country():
+    merged = _merge_ranges([(10, 19, "AU"), (0, 9, "AU"), (20, 29, "US"), (25, 40, "US")])
+    assert merged == [[0, 19, "AU"], [20, 40, "US"]]
+
+
+def test_block_mode_table_lookup(fake_db):
+    db_path, _ = fake_db
+    table = geo_ranges.compile_geo_ranges(db_path, ["au", "FR"])
+    assert len(table) == 2  # the two AU /20s merge
+    assert table.lookup("1.1.31.255") == "AU"
+    assert table.lookup("1.1.32.0") is None
+    assert table.lookup("8.8.8.8") is None
+    assert table.lookup("2001:db8:1::1") == "FR"
+    assert table.lookup("::ffff:1.1.0.1") == "AU"
+    assert table.lookup("bogus") is None
+
+
+def test_allow_mode_leaves_unknown_addresses_unblocked(fake_db):
+    db_path, _ = fake_db
+    table = geo_ranges.compile_geo_ranges(db_path, ["US"], mode=geo_ranges.RANGE_MODE_ALLOW)
+    assert table.lookup("8.8.8.8") is None
+    assert table.lookup("1.1.0.1") == "AU"
+    assert table.lookup("9.9.9.9") is None
+
+
+def test_disk_cache_reused_until_db_changes(fake_db, tmp_path):
+    db_path, calls = fake_db
+    cache_dir = str(tmp_path / "cache")
+
+    first = load_geo_ranges(db_path, {"US"}, cache_dir=cache_dir)
+    second = load_geo_ranges(db_path, {"US"}, cache_dir=cache_dir)
+    assert calls["count"] == 1
+    assert first.to_dict() == second.to_dict()
+    assert second.lookup("8.8.8.8") == "US"
+
+    load_geo_ranges(db_path, {"US", "AU"}, cache_dir=cache_dir)
+    assert calls["count"] == 2
+    # The superseded table's cache file is removed
+    assert len([n for n in os.listdir(cache_dir) if n.startswith("geo_ranges_")]) == 1
+
+    stat = os.stat(db_path)
+    os.utime(db_path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000_000))
+    load_geo_ranges(db_path, {"US"}, cache_dir=cache_dir)
+    assert calls["count"] == 3
+
+
+def test_middleware_uses_compiled_table(fake_db, tmp_path, monkeypatch):
+    db_path, calls = fake_db
+    app = Flask(__name__)
+    app.config.update({
+        'TESTING': True,
+        'AIWAF_EXEMPT_PATHS': set(),
+        'AIWAF_GEO_BLOCK_ENABLED': True,
+        'AIWAF_GEO_BLOCK_COUNTRIES': ['US'],
+        'AIWAF_GEO_COMPILED_RANGES': True,
+        'AIWAF_GEOIP_DB_PATH': db_path,
+        'AIWAF_GEO_RANGE_CACHE_DIR': str(tmp_path / "cache"),
+    })
+
+    def fail_lookup(ip, config):
+        raise AssertionError("per-request lookup should not run")
+
+    monkeypatch.setattr('aiwaf_flask.geo_block_middleware.get_country_for_ip', fail_lookup)
+    monkeypatch.setattr('aiwaf_flask.geo_block_middleware.get_geo_blocked_countries', lambda: set())
+    monkeypatch.setattr('aiwaf_flask.geo_block_middleware.BlacklistManager.block', lambda ip, reason: None)
+    middleware = GeoBlockMiddleware(app)
+    middleware._ranges.wait()  # init_app started the build
+
+    @app.route('/')
+    def index():
+        return 'OK'
+
+    client = app.test_client()
+    blocked = client.get('/', environ_base={'REMOTE_ADDR': '8.8.8.8'})
+    allowed = client.get('/', environ_base={'REMOTE_ADDR': '1.1.0.1'})
+    assert blocked.status_code == 403
+    assert allowed.status_code == 200
+    assert calls["count"] == 1
+
+
+
+def test_middleware_falls_back_to_lookups_while_table_builds(fake_db, tmp_path, monkeypatch):
+    db_path, calls = fake_db
+    release = threading.Event()
+    reader_cls = _make_fake_reader(NETWORKS)
+
+    def slow_open(path):
+        release.wait(5)
+        calls["count"] += 1
+        return reader_cls()
+
+    monkeypatch.setattr(geo_ranges.maxminddb, "open_database", staticmethod(slow_open))
+    lookups = []
+
+    def lookup(ip, config):
+        lookups.append(ip)
+        return "US" if ip == "8.8.8.8" else "AU"
+
+    app = Flask(__name__)
+    app.config.update({
+        'TESTING': True,
+        'AIWAF_EXEMPT_PATHS': set(),
+        'AIWAF_GEO_BLOCK_ENABLED': True,
+        'AIWAF_GEO_BLOCK_COUNTRIES': ['US'],
+        'AIWAF_GEO_COMPILED_RANGES': True,
+        'AIWAF_GEOIP_DB_PATH': db_path,
+        'AIWAF_GEO_RANGE_CACHE_DIR': str(tmp_path / "cache"),
+    })
+    monkeypatch.setattr('aiwaf_flask.geo_block_middleware.get_country_for_ip', lookup)
+    monkeypatch.setattr('aiwaf_flask.geo_block_middleware.get_geo_blocked_countries', lambda: set())
+    monkeypatch.setattr('aiwaf_flask.geo_block_middleware.BlacklistManager.block', lambda ip, reason: None)
+    middleware = GeoBlockMiddleware(app)
+
+    @app.route('/')
+    def index():
+        return 'OK'
+
+    client = app.test_client()
+    assert client.get('/', environ_base={'REMOTE_ADDR': '8.8.8.8'}).status_code == 403
+    assert lookups == ["8.8.8.8"]
+
+    release.set()
+    middleware._ranges.wait()
+    assert client.get('/', environ_base={'REMOTE_ADDR': '8.8.8.8'}).status_code == 403
+    assert lookups == ["8.8.8.8"]
+    assert calls["count"] == 1
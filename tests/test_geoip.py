@@ -14,9 +14,9 @@ def test_lookup_country_uses_cache(monkeypatch):
 
     def fake_lookup(ip, db_path):
         calls["count"] += 1
-        return "US"
+        return "US", "United States", None
 
-    monkeypatch.setattr(geoip, "_lookup_maxmind", fake_lookup)
+    monkeypatch.setattr(geoip, "_lookup_record", fake_lookup)
     mmdb_path = _get_mmdb_path()
 
     first = geoip.lookup_country("8.8.8.8", cache_prefix="test:", cache_seconds=3600, db_path=mmdb_path)
@@ -42,7 +42,7 @@ def test_lookup_country_name_uses_cache(monkeypatch):
             self.country = DummyCountry(name=name, iso_code=code)
 
     class DummyReader:
-        def __init__(self, path):
+        def __init__(self, path, **kwargs):
             self.path = path
 
         def country(self, ip):
@@ -72,9 +72,9 @@ def test_get_country_for_ip_uses_config(monkeypatch):
 
     def fake_lookup(ip, db_path):
         calls["count"] += 1
-        return "FR"
+        return "FR", "France", None
 
-    monkeypatch.setattr(geoip, "_lookup_maxmind", fake_lookup)
+    monkeypatch.setattr(geoip, "_lookup_record", fake_lookup)
     config = {
         "AIWAF_GEO_CACHE_PREFIX": "geo",
         "AIWAF_GEO_CACHE_SECONDS": 60,
@@ -87,3 +87,198 @@ def test_get_country_for_ip_uses_config(monkeypatch):
     assert first == "FR"
     assert second == "FR"
     assert calls["count"] == 1
+
+
+def _make_fake_db(tmp_path):
+    db_file = tmp_path / "fake.mmdb"
+    db_file.write_bytes(b"fake")
+    return str(db_file)
+
+
+def test_reader_is_shared_and_reopened_on_mtime_change(monkeypatch, tmp_path):
+    geoip.close_geoip_readers()
+    opened = []
+
+    class RawReader:
+        def __init__(self, path, **kwargs):
+            opened.append(kwargs.get("mode"))
+
+        def country(self, ip):
+            raise TypeError("country() not supported for this database")
+
+        def city(self, ip):
+            raise TypeError("city() not supported for this database")
+
+        def get(self, ip):
+            return {"country_code": "DE", "country": "Germany"}
+
+        def close(self):
+            return None
+
+    monkeypatch.setattr(geoip, "GEOIP_AVAILABLE", True)
+    monkeypatch.setattr(geoip, "GeoIPReader", RawReader)
+    db_path = _make_fake_db(tmp_path)
+
+    assert geoip._lookup_record("1.2.3.4", db_path)[0] == "DE"
+    assert geoip._lookup_record("5.6.7.8", db_path)[1] == "Germany"
+    assert len(opened) == 1
+    assert opened[0] == geoip.MODE_MMAP
+    assert geoip._readers[db_path].strategy == "raw"
+
+    stat = os.stat(db_path)
+    os.utime(db_path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000_000))
+    assert geoip._lookup_record("1.2.3.4", db_path)[0] == "DE"
+    assert len(opened) == 2
+    geoip.close_geoip_readers()
+
+
+def test_lookup_strategy_is_resolved_once(monkeypatch, tmp_path):
+    geoip.close_geoip_readers()
+    calls = {"country": 0, "city": 0}
+
+    class CityReader:
+        def __init__(self, path, **kwargs):
+            pass
+
+        def country(self, ip):
+            calls["country"] += 1
+            raise TypeError("country() not supported for this database")
+
+        def city(self, ip):
+            calls["city"] += 1
+
+            class Country:
+                iso_code = "JP"
+                name = "Japan"
+
+            class Response:
+                country = Country()
+
+            return Response()
+
+    monkeypatch.setattr(geoip, "GEOIP_AVAILABLE", True)
+    monkeypatch.setattr(geoip, "GeoIPReader", CityReader)
+    db_path = _make_fake_db(tmp_path)
+
+    for ip in ("1.1.1.1", "2.2.2.2", "3.3.3.3"):
+        assert geoip._lookup_record(ip, db_path)[0] == "JP"
+
+    assert calls == {"country": 1, "city": 3}
+    geoip.close_geoip_readers()
+
+
+def test_network_cache_serves_whole_block(monkeypatch):
+    geoip._geoip_cache.clear()
+    calls = {"count": 0}
+
+    def fake_lookup(ip, db_path):
+        calls["count"] += 1
+        return "AU", "Australia", 20
+
+    monkeypatch.setattr(geoip, "_lookup_record", fake_lookup)
+
+    assert geoip.lookup_country("1.1.0.1", cache_prefix="net:", db_path="x.mmdb") == "AU"
+    assert geoip.lookup_country("1.1.15.254", cache_prefix="net:", db_path="x.mmdb") == "AU"
+    assert calls["count"] == 1
+
+    # 1.1.16.0 is outside 1.1.0.0/20
+    geoip.lookup_country("1.1.16.1", cache_prefix="net:", db_path="x.mmdb")
+    assert calls["count"] == 2
+
+    stats = geoip.get_geo_cache_stats()
+    assert stats["hits"] == 1
+    assert stats["misses"] == 2
+    assert stats["size"] == 2
+
+
+def test_network_cache_caches_not_found_blocks(monkeypatch):
+    geoip._geoip_cache.clear()
+    calls = {"count": 0}
+
+    def fake_lookup(ip, db_path):
+        calls["count"] += 1
+        return None, None, 8
+
+    monkeypatch.setattr(geoip, "_lookup_record", fake_lookup)
+
+    assert geoip.lookup_country("9.9.9.9", cache_prefix="neg:", db_path="x.mmdb") is None
+    assert geoip.lookup_country("9.200.1.1", cache_prefix="neg:", db_path="x.mmdb") is None
+    assert calls["count"] == 1
+
+
+def test_network_cache_lru_bound_and_longest_prefix():
+    cache = geoip.GeoNetworkCache(max_entries=2)
+    cache.set("ns", "10.0.0.1", 8, ("A", None), 60)
+    cache.set("ns", "10.1.0.1", 16, ("B", None), 60)
+    assert cache.get("ns", "10.1.2.3") == ("B", None)
+    assert cache.get("ns", "10.2.0.1") == ("A", None)
+
+    cache.set("ns", "2001:db8::1", 32, ("C", None), 60)
+    assert cache.stats()["size"] == 2
+    # 10.1.0.0/16 was least recently used and got evicted
+    assert cache.get("ns", "10.1.2.3") == ("A", None)
+    assert cache.get("ns", "2001:db8:ffff::1") == ("C", None)
+    assert cache.get("ns", "not-an-ip") is geoip.GeoNetworkCache._MISS
+
+
+def test_batch_country_counts_dedupes_and_reuses_networks(tmp_path, monkeypatch):
+    db_path = tmp_path / "geo.mmdb"
+    db_path.write_bytes(b"mmdb")
+    monkeypatch.setattr(geoip, "GEOIP_AVAILABLE", True)
+    looked_up = []
+
+    def fake_lookup(ip, path):
+        looked_up.append(ip)
+        if ip.startswith("8.8.8."):
+            return "US", "United States", 24
+        return None, None, None
+
+    monkeypatch.setattr(geoip, "_lookup_record", fake_lookup)
+    progress = []
+
+    counts = geoip.batch_country_counts(
+        ["8.8.8.9", "8.8.8.8", "8.8.8.9", "10.0.0.1", "bogus"],
+        db_path=str(db_path),
+        jobs=1,
+        chunk_size=3,
+        progress=lambda done, total: progress.append((done, total)),
+    )
+
+    assert counts == {"United States": 3, None: 2}
+    assert looked_up == ["8.8.8.8", "10.0.0.1"]
+    assert progress == [(3, 4), (4, 4)]
+
+
+def test_batch_country_counts_jobs_zero_uses_every_cpu(tmp_path, monkeypatch):
+    db_path = tmp_path / "geo.mmdb"
+    db_path.write_bytes(b"mmdb")
+    monkeypatch.setattr(geoip, "GEOIP_AVAILABLE", True)
+    monkeypatch.setattr(geoip, "_lookup_record", lambda ip, path: ("US", "United States", 32))
+    monkeypatch.setattr(geoip.os, "cpu_count", lambda: 3)
+    workers = []
+
+    class SerialExecutor:
+        def __init__(self, max_workers):
+            workers.append(max_workers)
+
+        def __enter__(self):
+            return self
+
+        def __exit__(self, *exc):
+            return False
+
+        def map(self, fn, *iterables):
+            return map(fn, *iterables)
+
+    monkeypatch.setattr(geoip, "ProcessPoolExecutor", SerialExecutor)
+    ips = [f"8.8.8.{i}" for i in range(10)]
+
+    assert geoip.batch_country_counts(ips, db_path=str(db_path), jobs=0, chunk_size=2) == {"United States": 10}
+    assert geoip.batch_country_counts(ips, db_path=str(db_path), jobs=None, chunk_size=2) == {"United States": 10}
+    assert geoip.batch_country_counts(ips, db_path=str(db_path), jobs=2, chunk_size=2) == {"United States": 10}
+    assert workers == [3, 3, 2]
+
+
+def test_batch_country_counts_accepts_weights_without_db(tmp_path):
+    counts = geoip.batch_country_counts({"1.2.3.4": 5}, db_path=str(tmp_path / "missing.mmdb"))
+    assert counts == {None: 5}
@@ -0,0 +1,111 @@
+from aiwaf_flask import header_validation_middleware as hv
+from aiwaf_flask.header_validation_middleware import (
+    _check_user_agent,
+    clear_verdict_cache,
+    get_verdict_cache_stats,
+    validate_headers_python,
+)
+
+BROWSER_ENVIRON = {
+    "HTTP_USER_AGENT": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) Chrome/120.0",
+    "HTTP_ACCEPT": "text/html,application/xhtml+xml,application/xml;q=0.9,*/*;q=0.8",
+    "HTTP_ACCEPT_LANGUAGE": "en-US,en;q=0.5",
+    "HTTP_ACCEPT_ENCODING": "gzip, deflate",
+    "HTTP_CONNECTION": "keep-alive",
+    "SERVER_PROTOCOL": "HTTP/1.1",
+}
+
+
+def _sequential_check(user_agent):
+    """Reference implementation: one regex at a time, in list order."""
+    ua_lower = user_agent.lower()
+    if any(rx.search(ua_lower) for rx in hv.LEGITIMATE_BOTS):
+        return None
+    for pattern, rx in hv.SUSPICIOUS_UA:
+        if rx.search(ua_lower):
+            return f"Pattern: {pattern}"
+    return None
+
+
+def test_combined_classifier_matches_sequential_verdicts():
+    samples = [
+        "python-requests/2.31",
+        "Googlebot/2.1 python",
+        "Mozilla/4.0",
+        "Mozilla/5.0 (Macintosh) Safari/605.1",
+        "Java/17 node spider",
+        "curl/8.0 bot",
+    ]
+    for ua in samples:
+        assert (_check_user_agent(ua) is None) == (_sequential_check(ua) is None)
+
+
+def test_combined_classifier_reports_the_leftmost_pattern():
+    # "bot" is listed before "curl" and "wget" but matches further right
+    assert _check_user_agent("curl/8.0 bot") == "Pattern: curl"
+    assert _check_user_agent("okhttp/4 wget") == "Pattern: okhttp"
+    assert _sequential_check("curl/8.0 bot") == "Pattern: bot"
+
+
+def test_verdict_cache_hits_for_repeated_headers():
+    clear_verdict_cache()
+    assert validate_headers_python(dict(BROWSER_ENVIRON)) is None
+    assert validate_headers_python(dict(BROWSER_ENVIRON)) is None
+
+    stats = get_verdict_cache_stats()
+    assert stats["misses"] == 1
+    assert stats["hits"] == 1
+    assert stats["hit_rate"] == 0.5
+
+
+def test_verdict_cache_keys_on_required_header_presence():
+    clear_verdict_cache()
+    config = {"GET": ["HTTP_USER_AGENT", "HTTP_X_CLIENT_ID"]}
+    environ = dict(BROWSER_ENVIRON)
+
+    reason = validate_headers_python(environ, config_required_headers=config)
+    assert reason == "Missing required headers: x-client-id"
+
+    environ["HTTP_X_CLIENT_ID"] = "abc"
+    assert validate_headers_python(environ, config_required_headers=config) is None
+
+
+def test_required_header_table_flags_overrides():
+    table = hv.build_required_header_table({"HEAD": [], "POST": ["HTTP_USER_AGENT", "HTTP_ACCEPT"]})
+    assert table["HEAD"] == ((), True)
+    assert table["POST"] == (("HTTP_USER_AGENT", "HTTP_ACCEPT"), False)
+    assert table["GET"][1] is False
+
+
+def test_middleware_rebuilds_table_when_config_reassigned(monkeypatch):
+    from flask import Flask
+
+    calls = {"count": 0}
+    original = hv.build_required_header_table
+
+    def counting_build(config=None):
+        calls["count"] += 1
+        return original(config)
+
+    monkeypatch.setattr(hv, "build_required_header_table", counting_build)
+
+    app = Flask(__name__)
+    app.config["AIWAF_EXEMPT_PATHS"] = set()
+    app.config["AIWAF_USE_CSV"] = False
+    middleware = hv.HeaderValidationMiddleware(app)
+
+    @app.route("/", methods=["GET", "HEAD"])
+    def index():
+        return "ok"
+
+    client = app.test_client()
+    built_at_init = calls["count"]
+    assert client.head("/", headers={"User-Agent": ""}).status_code == 403
+    assert client.get("/").status_code == 200
+    assert calls["count"] == built_at_init
+
+    app.config["AIWAF_REQUIRED_HEADERS"] = {"HEAD": []}
+    assert client.head("/", headers={"User-Agent": ""}).status_code == 200
+    assert client.head("/", headers={"User-Agent": ""}).status_code == 200
+    assert calls["count"] == built_at_init + 1
+    assert middleware._required_table["HEAD"] == ((), True)
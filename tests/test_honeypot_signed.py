@@ -0,0 +1,122 @@
+from unittest.mock import patch
+
+from flask import Flask, render_template_string
+
+from aiwaf_flask import honeypot_timing_middleware as hm
+from aiwaf_flask.honeypot_timing_middleware import (
+    HoneypotTimingMiddleware,
+    make_form_token,
+    verify_form_token,
+)
+
+
+def _make_app(config=None):
+    app = Flask(__name__)
+    app.config.update({
+        'TESTING': True,
+        'SECRET_KEY': 'test-secret',
+        'AIWAF_USE_CSV': False,
+        'AIWAF_EXEMPT_PATHS': set(),
+        'AIWAF_MIN_FORM_TIME': 1.0,
+        'AIWAF_HONEYPOT_MODE': 'signed',
+    })
+    if config:
+        app.config.update(config)
+    HoneypotTimingMiddleware(app)
+
+    @app.route('/form', methods=['GET', 'POST'])
+    def form():
+        return render_template_string('<form>{{ aiwaf_honeypot_field() }}</form>')
+
+    @app.route('/plain')
+    def plain():
+        return 'OK'
+
+    return app
+
+
+def test_token_roundtrip_and_tamper():
+    app = _make_app()
+    with app.app_context():
+        token = make_form_token(app, now=1234.5)
+        assert verify_form_token(token, app, now=1240.0) == 1234.5
+
+        issued_at, _, signature = token.rpartition('.')
+        assert verify_form_token(f"1000.000.{signature}", app, now=1240.0) is None
+        assert verify_form_token(f"{issued_at}.{'0' * len(signature)}", app, now=1240.0) is None
+        assert verify_form_token('', app) is None
+
+
+def test_token_is_bound_to_ip_and_expires():
+    app = _make_app({'AIWAF_HONEYPOT_TOKEN_MAX_AGE': 600})
+    token = make_form_token(app, now=1000.0, ip='203.0.113.5')
+    assert verify_form_token(token, app, ip='203.0.113.5', now=1500.0) == 1000.0
+    assert verify_form_token(token, app, ip='203.0.113.6', now=1500.0) is None
+    assert verify_form_token(token, app, ip='203.0.113.5', now=1601.0) is None
+
+
+def test_token_verifies_across_app_instances():
+    """Any worker sharing the secret can verify a token issued elsewhere."""
+    issuer = _make_app()
+    verifier = _make_app()
+    token = make_form_token(issuer, now=50.0)
+    assert verify_form_token(token, verifier, now=60.0) == 50.0
+
+    other = _make_app({'SECRET_KEY': 'different'})
+    assert verify_form_token(token, other, now=60.0) is None
+
+
+@patch('time.time')
+def test_signed_mode_blocks_fast_form_post(mock_time):
+    app = _make_app()
+    client = app.test_client()
+
+    mock_time.return_value = 1000.0
+    with app.test_request_context(environ_base={'REMOTE_ADDR': '127.0.0.1'}):
+        token = make_form_token(app)
+
+    mock_time.return_value = 1000.2
+    response = client.post('/form', data={'aiwaf_ts': token})
+    assert response.status_code == 403
+
+
+@patch('time.time')
+def test_signed_mode_allows_slow_form_post(mock_time):
+    app = _make_app()
+    client = app.test_client()
+
+    mock_time.return_value = 1000.0
+    with app.test_request_context(environ_base={'REMOTE_ADDR': '127.0.0.1'}):
+        token = make_form_token(app)
+
+    mock_time.return_value = 1005.0
+    response = client.post('/form', data={'aiwaf_ts': token})
+    assert response.status_code == 200
+
+
+@patch('time.time')
+def test_signed_mode_uses_cookie_and_skips_memory(mock_time):
+    hm._aiwaf_cache.clear()
+    app = _make_app()
+    client = app.test_client()
+
+    mock_time.return_value = 2000.0
+    page = client.get('/form')
+    assert b'name="aiwaf_ts"' in page.data
+    assert 'aiwaf_ts=' in page.headers.get('Set-Cookie', '')
+    assert hm._aiwaf_cache == {}
+
+    mock_time.return_value = 2000.1
+    response = client.post('/form')
+    assert response.status_code == 403
+
+
+def test_cookie_only_set_on_responses_that_render_a_form():
+    app = _make_app()
+    client = app.test_client()
+    assert 'aiwaf_ts=' not in client.get('/plain').headers.get('Set-Cookie', '')
+
+    page = client.get('/form')
+    cookie = page.headers.get('Set-Cookie', '')
+    token = cookie.split('aiwaf_ts=', 1)[1].split(';', 1)[0]
+    assert f'value="{token}"'.encode() in page.data
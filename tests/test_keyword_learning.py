@@ -0,0 +1,115 @@
+import threading
+
+from flask import Flask
+
+from aiwaf_flask import storage
+from aiwaf_flask.anomaly_middleware import AIAnomalyMiddleware
+
+
+def _make_app(tmp_path, config=None):
+    app = Flask(__name__)
+    app.config.update({
+        'TESTING': True,
+        'AIWAF_USE_CSV': True,
+        'AIWAF_DATA_DIR': str(tmp_path),
+        'AIWAF_MIN_AI_LOGS': 10 ** 9,
+    })
+    if config:
+        app.config.update(config)
+    return app, AIAnomalyMiddleware(app)
+
+
+def _track_context_checks(monkeypatch, middleware):
+    threads = []
+    real_check = middleware._is_malicious_path
+
+    def check(*args):
+        threads.append(threading.current_thread().name)
+        return real_check(*args)
+
+    monkeypatch.setattr(middleware, '_is_malicious_path', check)
+    return threads
+
+
+def test_404_keywords_are_learned_in_the_background(tmp_path, monkeypatch):
+    app, middleware = _make_app(tmp_path)
+    threads = _track_context_checks(monkeypatch, middleware)
+    client = app.test_client()
+
+    for _ in range(5):
+        assert client.get('/wp-admin/secretpanel.php').status_code == 404
+    client.get('/about-company')  # no attack indicators, nothing learned
+
+    assert middleware._keyword_learner.flush()
+    middleware._keyword_learner.stop()
+
+    assert 'secretpanel' in middleware.malicious_keywords
+    assert 'about' not in middleware.malicious_keywords
+    # Evaluated once per distinct path, never on the request thread
+    assert threads == ['aiwaf-keywords', 'aiwaf-keywords']
+    with app.app_context():
+        assert 'secretpanel' in storage.get_top_keywords(1000)
+
+
+def test_batch_is_stored_with_one_call(tmp_path, monkeypatch):
+    app, middleware = _make_app(tmp_path, {'AIWAF_KEYWORD_LEARNING_MODE': 'sync'})
+    assert middleware._keyword_learner is None
+    calls = []
+    monkeypatch.setattr(storage.KeywordStore, 'add_keywords', lambda self, kws: calls.append(set(kws)))
+
+    middleware._learn_keywords([
+        ('/backup/oldsite.zip', '', ()),
+        ('/backup/oldsite.zip', '', ()),
+        ('/files/dumpster', 'cmd=ls', ('cmd',)),
+        ('/static/logo.png', '', ()),
+    ])
+    # 'backup' is already a static keyword
+    assert calls == [{'oldsite', 'files', 'dumpster'}]
+    assert {'oldsite', 'files', 'dumpster'} <= middleware.malicious_keywords
+
+
+def test_concurrent_learners_keep_every_keyword(tmp_path, monkeypatch):
+    app, middleware = _make_app(tmp_path, {'AIWAF_KEYWORD_LEARNING_MODE': 'sync'})
+    both_reading = threading.Barrier(2)
+    stored = []
+
+    def slow_add(self, kws):
+        stored.append(set(kws))
+        threading.Event().wait(0.05)  # widen the window between merge and rebind
+
+    real_check = middleware._is_malicious_path
+
+    def check(*args):
+        both_reading.wait(5)  # both learners have read the keyword set
+        return real_check(*args)
+
+    monkeypatch.setattr(storage.KeywordStore, 'add_keywords', slow_add)
+    monkeypatch.setattr(middleware, '_is_malicious_path', check)
+    learners = [
+        threading.Thread(target=middleware._learn_keywords, args=([(path, '', ())],))
+        for path in ('/wp-admin/firstpanel.php', '/wp-admin/secondpanel.php')
+    ]
+    for thread in learners:
+        thread.start()
+    for thread in learners:
+        thread.join(5)
+
+    assert {'firstpanel', 'secondpanel'} <= middleware.malicious_keywords
+    assert sorted(map(sorted, stored)) == [['firstpanel'], ['secondpanel']]
+
+
+def test_sync_mode_learns_inline(tmp_path):
+    app, middleware = _make_app(tmp_path, {'AIWAF_KEYWORD_LEARNING_MODE': 'sync'})
+    app.test_client().get('/phpmyadmin/setupwizard')
+    assert 'setupwizard' in middleware.malicious_keywords
+
+
+def test_add_keywords_csv(tmp_path):
+    app, _ = _make_app(tmp_path)
+    with app.app_context():
+        storage.add_keyword('alpha')
+        storage.add_keywords(['alpha', 'beta', 'gamma', ''])
+        storage.add_keywords([])
+        with open(tmp_path / storage.KEYWORDS_CSV) as f:
+            rows = [line.split(',')[0] for line in f.read().splitlines()[1:]]
+    assert sorted(rows) == ['alpha', 'beta', 'gamma']
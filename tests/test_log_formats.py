@@ -0,0 +1,85 @@
+import json
+import time
+from datetime import datetime
+
+from flask import Flask
+
+from aiwaf_flask import log_ingest
+from aiwaf_flask.log_formats import (
+    FORMAT_COMBINED, FORMAT_COMBINED_RT, FORMAT_COMMON, FORMAT_CSV, FORMAT_JSON,
+    LogLineParser, detect_format, parse_line, parse_timestamp, to_epoch,
+)
+from aiwaf_flask.trainer import FlaskAITrainer
+
+HEAD = '1.2.3.4 - - [10/Oct/2025:13:55:36 +0000] "GET /wp-admin.php?x=1 HTTP/1.1" 404 12'
+EPOCH = to_epoch(datetime(2025, 10, 10, 13, 55, 36))
+
+
+def test_detects_each_format():
+    assert detect_format(HEAD + ' "-" "curl/8" response-time=0.250\n')[0] == FORMAT_COMBINED_RT
+    assert detect_format(HEAD + ' "-" "curl/8" 250ms - "-"\n')[0] == FORMAT_COMBINED
+    assert detect_format(HEAD + '\n')[0] == FORMAT_COMMON
+    assert detect_format('{"ip": "1.2.3.4"}\n')[0] == FORMAT_JSON
+    assert detect_format('timestamp,ip,method,path,status_code,response_time_ms\n') == (
+        FORMAT_CSV, ['timestamp', 'ip', 'method', 'path', 'status_code', 'response_time_ms'])
+    assert detect_format('[2025-10-10 13:55:36] [AIWAF] BLOCKED 1.2.3.4 - reason\n') == (None, None)
+
+
+def test_apache_variants_parse_to_the_same_record():
+    expected = ('1.2.3.4', EPOCH, '/wp-admin.php?x=1', 404)
+    assert parse_line(HEAD + ' "-" "curl/8" response-time=0.250\n') == expected + (0.25,)
+    assert parse_line(HEAD + ' "-" "curl/8" 250ms BLOCKED "Keyword"\n') == expected + (0.25,)
+    assert parse_line(HEAD + ' "-" "curl/8"\n') == expected + (0.0,)
+    assert parse_line(HEAD.replace(' 12', ' -') + '\n') == expected + (0.0,)
+
+
+def test_fast_timestamps_match_strptime_and_iso():
+    for value in ('01/Jan/2024:00:00:00 +0000', '29/Feb/2024:23:59:59 -0700', '10/Oct/2025:13:55:36'):
+        slow = to_epoch(datetime.strptime(value.split()[0], '%d/%b/%Y:%H:%M:%S'))
+        assert parse_timestamp(value) == slow
+    assert parse_timestamp('2025-10-10T13:55:36') == EPOCH
+    assert parse_timestamp('2025-10-10T13:55:36Z') == EPOCH
+    assert parse_timestamp('not a time') is None
+
+
+def test_hostile_user_agent_fails_fast():
+    line = HEAD + ' "-" "' + 'a "' * 5000 + '\n'
+    start = time.perf_counter()
+    for _ in range(20):
+        parse_line('x' + line)
+    assert time.perf_counter() - start < 0.5
+
+
+def test_parser_keeps_file_format_and_follows_a_switch():
+    parser = LogLineParser()
+    assert parser.parse('timestamp,ip,path,status_code,response_time_ms\n') is None
+    assert parser.format == FORMAT_CSV
+    assert parser.parse('2025-10-10T13:55:36,1.2.3.4,/x,403,1500\n') == ('1.2.3.4', EPOCH, '/x', 403, 1.5)
+    assert parser.parse('garbage\n') is None
+
+    row = {'timestamp': '2025-10-10T13:55:36', 'ip': '5.6.7.8', 'path': '/y',
+           'status_code': 200, 'response_time': 0.01}
+    assert parser.parse(json.dumps(row) + '\n') == ('5.6.7.8', EPOCH, '/y', 200, 0.01)
+    assert parser.format == FORMAT_JSON
+
+
+def test_csv_access_log_is_parsed_in_parallel_chunks(tmp_path, monkeypatch):
+    rows = [f'2025-10-10T13:{i // 60:02d}:{i % 60:02d},10.0.0.{i % 7},GET,/p{i % 5},,HTTP/1.1,'
+            f'{404 if i % 3 else 200},0,{i},,ua,False,\n' for i in range(300)]
+    header = ('timestamp,ip,method,path,query_string,protocol,status_code,content_length,'
+              'response_time_ms,referer,user_agent,blocked,block_reason\n')
+    (tmp_path / 'access.log').write_text(header + ''.join(rows))
+    monkeypatch.setattr(log_ingest, 'MIN_CHUNK_BYTES', 1024)
+
+    results = []
+    for jobs in (1, 3):
+        app = Flask(__name__)
+        app.config.update(AIWAF_LOG_DIR=str(tmp_path), AIWAF_LOG_PARSE_JOBS=jobs)
+        with app.app_context():
+            results.append(FlaskAITrainer(app)._collect_records())
+
+    (serial_lines, serial), (parallel_lines, parallel) = results
+    assert serial_lines == parallel_lines == 301
+    assert len(serial) == 300
+    assert list(parallel.rows()) == list(serial.rows())
+    assert list(serial.rows())[5] == ('10.0.0.5', EPOCH - 55 * 60 - 31, '/p0', 404, 0.005)
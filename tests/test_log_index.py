@@ -0,0 +1,108 @@
+import threading
+
+from flask import Flask
+
+from aiwaf_flask import log_index
+from aiwaf_flask.anomaly_middleware import AIAnomalyMiddleware
+from aiwaf_flask.log_index import INDEX_FILENAME, LogVolumeIndex
+
+
+def _line_count(*paths):
+    total = 0
+    for path in paths:
+        with open(path, 'r', encoding='utf-8', errors='ignore') as f:
+            total += sum(1 for _ in f)
+    return total
+
+
+def _track_counts(monkeypatch):
+    ranges = []
+    real_count = log_index.count_newlines
+
+    def tracking(path, start, end):
+        ranges.append((path.rsplit('/', 1)[-1], start, end))
+        return real_count(path, start, end)
+
+    monkeypatch.setattr(log_index, 'count_newlines', tracking)
+    return ranges
+
+
+def test_index_matches_line_iteration_and_reads_only_appended_bytes(tmp_path, monkeypatch):
+    access = tmp_path / 'access.log'
+    events = tmp_path / 'events.jsonl'
+    access.write_text('a\nb\nc')  # unterminated last line still counts
+    events.write_text('{}\n{}\n')
+    (tmp_path / 'notes.txt').write_text('ignored\n' * 5)
+
+    index = LogVolumeIndex(str(tmp_path))
+    assert index.refresh() == _line_count(access, events) == 5
+
+    ranges = _track_counts(monkeypatch)
+    with open(access, 'a') as f:
+        f.write('c-continued\nd\n')
+    assert index.refresh() == _line_count(access, events) == 6
+    assert ranges == [('access.log', 5, 19)]
+
+    ranges.clear()
+    assert index.refresh() == 6
+    assert ranges == []
+
+
+def test_index_recounts_rotated_and_truncated_files(tmp_path):
+    access = tmp_path / 'access.log'
+    access.write_text('x\n' * 10)
+    index = LogVolumeIndex(str(tmp_path))
+    assert index.refresh() == 10
+
+    access.write_text('y\n' * 3)  # truncated in place
+    assert index.refresh() == 3
+
+    rotated = tmp_path / 'access.log.new'
+    rotated.write_text('z\n' * 7)
+    rotated.replace(access)  # new inode, larger size
+    assert index.refresh() == 7
+
+    access.unlink()
+    assert index.refresh() == 0
+
+
+def test_index_is_persisted_between_instances(tmp_path, monkeypatch):
+    (tmp_path / 'access.log').write_text('x\n' * 4)
+    assert LogVolumeIndex(str(tmp_path)).refresh() == 4
+    assert (tmp_path / INDEX_FILENAME).exists()
+
+    ranges = _track_counts(monkeypatch)
+    assert LogVolumeIndex(str(tmp_path)).refresh() == 4
+    assert ranges == []
+
+
+def test_log_volume_is_checked_off_the_request_thread(tmp_path, monkeypatch):
+    (tmp_path / 'access.log').write_text('x\n' * 30)
+    app = Flask(__name__)
+    app.config.update({
+        'TESTING': True,
+        'AIWAF_USE_CSV': False,
+        'AIWAF_LOG_DIR': str(tmp_path),
+        'AIWAF_MIN_AI_LOGS': 20,
+    })
+    middleware = AIAnomalyMiddleware(app)
+
+    checked = threading.Event()
+    threads = []
+    real_check = middleware._check_log_data_sufficiency
+
+    def check(check_app):
+        threads.append(threading.current_thread().name)
+        result = real_check(check_app)
+        checked.set()
+        return result
+
+    monkeypatch.setattr(middleware, '_check_log_data_sufficiency', check)
+    assert threads == []  # nothing counted while booting
+
+    app.test_client().get('/')
+    assert checked.wait(5)
+    middleware.stop_ai_monitor()
+
+    assert threads and set(threads) == {'aiwaf-ai-status'}
+    assert middleware.get_stats()['log_lines'] == 30
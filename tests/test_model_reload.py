@@ -0,0 +1,90 @@
+import os
+
+import pytest
+
+np = pytest.importorskip("numpy")
+pytest.importorskip("sklearn")
+from flask import Flask
+from sklearn.ensemble import IsolationForest
+
+from aiwaf_flask.anomaly_middleware import AIAnomalyMiddleware
+from aiwaf_flask.forest import export_isolation_forest, save_forest_artifact
+
+
+def _save_model(path, center, seed=0):
+    rng = np.random.default_rng(seed)
+    X = center + rng.normal(size=(500, 6))
+    save_forest_artifact(str(path), export_isolation_forest(IsolationForest(random_state=seed).fit(X)))
+    # Make sure the change is visible even on coarse-mtime filesystems
+    stat = os.stat(path)
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10 ** 9 * (seed + 1)))
+
+
+def _make_middleware(model_path):
+    app = Flask(__name__)
+    app.config.update({
+        'TESTING': True,
+        'AIWAF_USE_CSV': False,
+        'AIWAF_FORCE_AI': True,
+        'AIWAF_MODEL_PATH': str(model_path),
+        'AIWAF_MODEL_RELOAD_INTERVAL': 1,
+    })
+    return app, AIAnomalyMiddleware(app)
+
+
+def _reload(middleware, app):
+    middleware._last_reload_check = 0
+    return middleware._check_model_reload(app)
+
+
+def test_changed_model_file_is_swapped_in(tmp_path):
+    model_path = tmp_path / 'model.forest'
+    _save_model(model_path, 0.0, seed=0)
+    app, middleware = _make_middleware(model_path)
+    original = middleware.model
+    assert original is not None
+
+    assert not _reload(middleware, app)
+    assert middleware.model is original
+
+    _save_model(model_path, 0.0, seed=1)
+    assert _reload(middleware, app)
+    assert middleware.model is not original
+    assert middleware.get_stats()['model_reloads'] == 1
+
+    assert not _reload(middleware, app)
+
+
+def test_model_failing_canary_is_rejected(tmp_path):
+    model_path = tmp_path / 'model.forest'
+    _save_model(model_path, 0.0, seed=0)
+    app, middleware = _make_middleware(model_path)
+    original = middleware.model
+    middleware._canary_features.extend([0.0] * 6 for _ in range(20))
+
+    # Trained far away from recent traffic, so it flags all of it
+    _save_model(model_path, 1000.0, seed=1)
+    assert not _reload(middleware, app)
+    assert middleware.model is original
+    assert middleware.model_reload_rejections == 1
+
+    # Not retried until the file changes again
+    assert not _reload(middleware, app)
+    assert middleware.model_reload_rejections == 1
+
+
+def test_reload_respects_interval_and_disabled_ai(tmp_path):
+    model_path = tmp_path / 'model.forest'
+    _save_model(model_path, 0.0, seed=0)
+    app, middleware = _make_middleware(model_path)
+    _save_model(model_path, 0.0, seed=1)
+
+    middleware._last_reload_check = 10 ** 12
+    assert not middleware._check_model_reload(app)
+
+    middleware._model_wanted = False
+    assert not _reload(middleware, app)
+
+    app.config['AIWAF_MODEL_RELOAD_INTERVAL'] = 0
+    middleware._model_wanted = True
+    assert not _reload(middleware, app)
@@ -0,0 +1,142 @@
+import gzip
+import json
+from collections import Counter
+from datetime import datetime, timedelta
+
+from flask import Flask
+
+from aiwaf_flask import log_ingest, logging_middleware
+from aiwaf_flask.log_ingest import iter_task_lines, resolve_jobs, split_file
+from aiwaf_flask.logging_middleware import analyze_access_logs
+from aiwaf_flask.trainer import FlaskAITrainer
+
+
+def _line(i, start=datetime(2025, 1, 1, 12, 0, 0)):
+    stamp = (start + timedelta(seconds=i)).strftime('%d/%b/%Y:%H:%M:%S +0000')
+    status = 404 if i % 7 == 0 else 200
+    return (f'10.0.{i % 5}.{i % 11} - - [{stamp}] "GET /page/{i % 13} HTTP/1.1" {status} 12 '
+            f'"-" "curl/8" response-time=0.{i % 90 + 10:03d}\n')
+
+
+def _records(log_dir, jobs):
+    app = Flask(__name__)
+    app.config.update(AIWAF_LOG_DIR=str(log_dir), AIWAF_LOG_PARSE_JOBS=jobs)
+    with app.app_context():
+        return FlaskAITrainer(app)._collect_records()
+
+
+def test_resolve_jobs():
+    assert resolve_jobs(None) == 1
+    assert resolve_jobs(3) == 3
+    assert resolve_jobs(0) >= 1
+
+
+def test_split_file_ranges_end_on_newlines_and_cover_the_file(tmp_path):
+    path = tmp_path / 'access.log'
+    path.write_text(''.join(_line(i) for i in range(40)) + 'unterminated')
+    data = path.read_bytes()
+
+    ranges = split_file(str(path), 500)
+    assert len(ranges) > 1
+    assert ranges[0][0] == 0 and ranges[-1][1] == len(data)
+    for (_, end), (start, _) in zip(ranges, ranges[1:]):
+        assert end == start and data[end - 1:end] == b'\n'
+
+    lines = [line for start, end in ranges for line in iter_task_lines((str(path), start, end))]
+    assert ''.join(lines) == data.decode()
+
+
+def test_parallel_training_ingest_matches_serial(tmp_path, monkeypatch):
+    (tmp_path / 'access.log').write_text(''.join(_line(i) for i in range(300)) + 'garbage\n')
+    (tmp_path / 'access.log.1').write_text(''.join(_line(i) for i in range(300, 400)))
+    with gzip.open(tmp_path / 'access.log.2.gz', 'wt') as f:
+        f.writelines(_line(i) for i in range(400, 450))
+    monkeypatch.setattr(log_ingest, 'MIN_CHUNK_BYTES', 2048)
+
+    serial_count, serial = _records(tmp_path, 1)
+    parallel_count, parallel = _records(tmp_path, 3)
+
+    assert serial_count == parallel_count == 451
+    assert len(parallel) == 450
+    assert list(parallel.rows()) == list(serial.rows())
+
+
+def test_parallel_log_analysis_matches_serial(tmp_path, monkeypatch):
+    monkeypatch.setattr(logging_middleware, 'MIN_CHUNK_BYTES', 1024)
+    start = datetime(2025, 1, 1, 12, 0, 0)
+    lines = []
+    for i in range(200):
+        stamp = (start + timedelta(seconds=i)).strftime('%d/%b/%Y:%H:%M:%S +0000')
+        blocked = ' BLOCKED "Keyword"' if i % 9 == 0 else ' -'
+        lines.append(f'10.0.0.{i % 6} - - [{stamp}] "GET /p{i % 4} HTTP/1.1" {200 + i % 3} 10 '
+                     f'"-" "ua" {i}ms{blocked}\n')
+    (tmp_path / 'access.log').write_text(''.join(lines))
+
+    serial = analyze_access_logs(str(tmp_path), 'combined')
+    parallel = analyze_access_logs(str(tmp_path), 'combined', jobs=3)
+    assert parallel['total_requests'] == serial['total_requests'] == 200
+    assert parallel['blocked_requests'] == serial['blocked_requests']
+    assert parallel['ips'] == serial['ips']
+    assert parallel['status_codes'] == serial['status_codes']
+    assert parallel['blocked_reasons'] == serial['blocked_reasons']
+
+
+def test_parallel_csv_and_json_analysis_matches_serial(tmp_path, monkeypatch):
+    monkeypatch.setattr(logging_middleware, 'MIN_CHUNK_BYTES', 512)
+    rows = [
+        {'timestamp': f'2025-01-01T{i % 24:02d}:00:00', 'ip': f'10.0.0.{i % 4}', 'method': 'GET',
+         'path': f'/p{i % 3}', 'status_code': 200 + i % 2, 'response_time_ms': i,
+         'blocked': i % 5 == 0, 'block_reason': 'Rate'}
+        for i in range(120)
+    ]
+    csv_dir = tmp_path / 'csv'
+    csv_dir.mkdir()
+    header = list(rows[0])
+    body = '\n'.join(','.join(str(row[k]) for k in header) for row in rows)
+    (csv_dir / 'access.log').write_text(','.join(header) + '\n' + body + '\n')
+    json_dir = tmp_path / 'json'
+    json_dir.mkdir()
+    (json_dir / 'access.log').write_text(''.join(json.dumps(row) + '\n' for row in rows))
+
+    for log_dir, fmt in ((csv_dir, 'csv'), (json_dir, 'json')):
+        serial = analyze_access_logs(str(log_dir), fmt)
+        parallel = analyze_access_logs(str(log_dir), fmt, jobs=2)
+        assert parallel['total_requests'] == serial['total_requests'] == 120
+        assert parallel['blocked_requests'] == serial['blocked_requests'] == 24
+        assert parallel['ips'] == serial['ips']
+        assert parallel['hourly_distribution'] == serial['hourly_distribution']
+        assert sorted(parallel['response_times']) == sorted(serial['response_times'])
+
+
+def test_geo_summary_parses_in_parallel_with_jobs(tmp_path, monkeypatch, capsys):
+    import aiwaf_flask.geoip as geoip_mod
+    from aiwaf_flask.cli import AIWAFManager
+
+    (tmp_path / 'access.log').write_text(''.join(_line(i) for i in range(100)))
+    monkeypatch.setattr(log_ingest, 'MIN_CHUNK_BYTES', 1024)
+    seen = {}
+
+    def fake_counts(ip_counts, **kwargs):
+        seen.update(ip_counts)
+        return Counter({'Testland': sum(ip_counts.values())})
+
+    monkeypatch.setattr(geoip_mod, 'batch_country_counts', fake_counts)
+    assert AIWAFManager(str(tmp_path)).geoip_traffic_summary(log_dir=str(tmp_path), limit=60, jobs=2)
+
+    assert sum(seen.values()) == 60
+    assert 'Testland: 60' in capsys.readouterr().out
+
+
+def test_limit_stops_parsing_early(tmp_path, monkeypatch):
+    (tmp_path / 'access.log').write_text(''.join(_line(i) for i in range(300)))
+    (tmp_path / 'access.log.1').write_text(''.join(_line(i) for i in range(300, 400)))
+    monkeypatch.setattr(log_ingest, 'MIN_CHUNK_BYTES', 1024)
+    tasks = log_ingest.plan_log_tasks([str(tmp_path / 'access.log'), str(tmp_path / 'access.log.1')], 4)
+
+    lines, records = log_ingest.parse_log_tasks(tasks, 1, limit=25)
+    assert lines == len(records) == 25
+
+    lines, records = log_ingest.parse_log_tasks(tasks, 2, limit=25)
+    # Only the tasks already in flight finish: far fewer than the 400 lines
+    assert 25 <= len(records) <= lines < 200
+    assert list(records.rows())[:25] == list(log_ingest.parse_log_tasks(tasks, 1)[1].rows())[:25]
@@ -0,0 +1,93 @@
+import random
+import sys
+import threading
+
+from aiwaf_flask.request_history import IPHistory, PathInterner, RequestHistoryStore
+
+
+def test_ring_buffer_matches_list_model():
+    rng = random.Random(7)
+    store = RequestHistoryStore(capacity=64, window_seconds=30)
+    model = []
+    now = 1000.0
+    for _ in range(2000):
+        now += rng.random() * 0.6
+        path = f"/p{rng.randrange(6)}"
+        status = rng.choice([200, 404, 500])
+        store.record("ip", now, path, status, 0.01)
+
+        model.append((now, path, status, 0.01))
+        model = [d for d in model if now - d[0] < 30][-64:]
+
+        history = store.get("ip")
+        assert history.entries(store.paths) == model
+        assert history.total_404 == sum(1 for d in model if d[2] == 404)
+        probe = now + rng.uniform(-3, 3)
+        assert history.burst_count(probe) == sum(1 for d in model if probe - d[0] <= 10)
+
+
+def test_capacity_evicts_oldest_and_recycles_path_ids():
+    interner = PathInterner()
+    history = IPHistory(capacity=2)
+    for t, path in enumerate(["/a", "/b", "/c"]):
+        evicted = history.append(float(t), interner.acquire(path), 200, 0.0)
+        if evicted is not None:
+            interner.release(evicted)
+
+    assert [e[1] for e in history.entries(interner)] == ["/b", "/c"]
+    assert len(interner) == 2
+    assert interner.acquire("/d") == 0  # "/a"'s ID was freed and reused
+
+
+def test_sweep_forgets_idle_ips():
+    store = RequestHistoryStore(capacity=8, window_seconds=60)
+    store.record("idle", 0.0, "/x", 200, 0.0)
+    store.record("busy", 100.0, "/y", 200, 0.0)
+
+    store.sweep(100.0)
+
+    assert "idle" not in store
+    assert "busy" in store
+    assert len(store.paths) == 1
+
+
+def test_readers_never_see_released_paths_while_writers_run():
+    switch_interval = sys.getswitchinterval()
+    sys.setswitchinterval(1e-6)  # switch threads often to provoke interleavings
+    store = RequestHistoryStore(capacity=16, window_seconds=0.5)
+    stop = threading.Event()
+    errors = []
+
+    def write(seed):
+        rng = random.Random(seed)
+        now = 0.0
+        while not stop.is_set():
+            now += 0.01
+            store.record("ip", now, f"/p{rng.randrange(50)}", 404, 0.0)  # unique paths get released
+
+    def read():
+        try:
+            for _ in range(3000):
+                history = store.get("ip")
+                if history is None:
+                    continue
+                for _, path, _, _ in history.entries(store.paths):
+                    assert path is not None
+                history.burst_count(1e9)
+                history.timestamps()
+        except Exception as e:  # pragma: no cover - surfaced below
+            errors.append(e)
+
+    writers = [threading.Thread(target=write, args=(i,)) for i in range(3)]
+    reader = threading.Thread(target=read)
+    try:
+        for t in writers:
+            t.start()
+        reader.start()
+        reader.join()
+    finally:
+        stop.set()
+        for t in writers:
+            t.join()
+        sys.setswitchinterval(switch_interval)
+    assert not errors
@@ -0,0 +1,76 @@
+import json
+
+from flask import Flask
+
+from aiwaf_flask.log_formats import iter_csv_records, iter_json_records, parse_timestamp
+from aiwaf_flask.logging_middleware import AIWAFLoggingMiddleware
+from aiwaf_flask.middleware_logger import AIWAFLoggerMiddleware
+from aiwaf_flask.trainer import FlaskAITrainer
+
+
+def _collect(log_dir, **config):
+    app = Flask(__name__)
+    app.config.update(AIWAF_LOG_DIR=str(log_dir), **config)
+    with app.app_context():
+        return FlaskAITrainer(app)._collect_records()
+
+
+def _serve(app):
+    @app.route('/')
+    def home():
+        return 'ok'
+
+    client = app.test_client()
+    client.get('/', environ_base={'REMOTE_ADDR': '10.0.0.1'})
+    client.get('/wp-login.php', environ_base={'REMOTE_ADDR': '10.0.0.2'})
+
+
+def test_logging_middleware_csv_and_json_access_logs_are_read_as_records(tmp_path):
+    for fmt in ('csv', 'json'):
+        log_dir = tmp_path / fmt
+        app = Flask(__name__)
+        app.config.update(AIWAF_LOG_DIR=str(log_dir), AIWAF_LOG_FORMAT=fmt)
+        AIWAFLoggingMiddleware(app)
+        _serve(app)
+
+        line_count, records = _collect(log_dir)
+        rows = list(records.rows())
+        assert [(ip, path, status) for ip, _, path, status, _ in rows] == [
+            ('10.0.0.1', '/', 200), ('10.0.0.2', '/wp-login.php', 404)]
+        assert line_count == (3 if fmt == 'csv' else 2)  # CSV has a header row
+
+
+def test_logger_middleware_csv_is_used_as_fallback(tmp_path):
+    middleware_log = tmp_path / 'requests' / 'aiwaf_requests.log'
+    app = Flask(__name__)
+    app.config.update(AIWAF_MIDDLEWARE_LOGGING=True, AIWAF_MIDDLEWARE_LOG=str(middleware_log))
+    AIWAFLoggerMiddleware(app)
+    _serve(app)
+
+    empty_dir = tmp_path / 'logs'
+    empty_dir.mkdir()
+    line_count, records = _collect(empty_dir, AIWAF_MIDDLEWARE_LOG=str(middleware_log))
+
+    assert line_count == 2
+    assert [(ip, status) for ip, _, _, status, _ in records.rows()] == [('10.0.0.1', 200), ('10.0.0.2', 404)]
+
+
+def test_structured_rows_keep_full_precision(tmp_path):
+    (tmp_path / 'aiwaf_requests.csv').write_text(
+        'timestamp,ip,method,path,status_code,content_length,response_time,referer,user_agent\n'
+        '2025-10-10T13:55:36.250001,10.0.0.1,GET,/a,200,-,0.123456,,ua\n'
+        ',10.0.0.9,GET,/missing-timestamp,200,-,0.1,,ua\n'
+    )
+    (tmp_path / 'events.jsonl').write_text(json.dumps({
+        'timestamp': '2025-10-10T13:55:37.5', 'ip': '10.0.0.2', 'path': '/b',
+        'status_code': 500, 'response_time_ms': 1234,
+    }) + '\nnot json\n')
+
+    assert list(iter_csv_records(str(tmp_path / 'aiwaf_requests.csv'))) == [
+        ('10.0.0.1', parse_timestamp('2025-10-10T13:55:36.250001'), '/a', 200, 0.123456)]
+    assert list(iter_json_records(str(tmp_path / 'events.jsonl'))) == [
+        ('10.0.0.2', parse_timestamp('2025-10-10T13:55:37.5'), '/b', 500, 1.234)]
+
+    line_count, records = _collect(tmp_path, AIWAF_MIDDLEWARE_LOG=str(tmp_path / 'none.log'))
+    assert line_count == 1  # CSV found, so JSON is not read
+    assert list(records.rows())[0][4] == 0.123456
@@ -0,0 +1,258 @@
+import gzip
+import json
+import os
+from datetime import datetime, timedelta
+
+import pytest
+from flask import Flask
+
+from aiwaf_flask.blacklist_manager import BlacklistManager
+from aiwaf_flask.log_formats import to_epoch
+from aiwaf_flask.log_ingest import LogRecords, parse_log_task
+from aiwaf_flask import train_checkpoint
+from aiwaf_flask.train_checkpoint import CHECKPOINT_FILENAME, TrainingCheckpoint
+from aiwaf_flask.trainer import FlaskAITrainer
+
+START = datetime(2025, 1, 1, 12, 0, 0)
+
+
+def _line(ip, seconds, path, status):
+    stamp = (START + timedelta(seconds=seconds)).strftime('%d/%b/%Y:%H:%M:%S +0000')
+    return f'{ip} - - [{stamp}] "GET {path} HTTP/1.1" {status} 12 "-" "curl/8" response-time=0.050\n'
+
+
+def _traffic(first, last):
+    lines = []
+    for i in range(first, last):
+        lines.append(_line(f'10.0.0.{i % 5}', i * 3, f'/page{i % 4}', 200))
+        lines.append(_line('6.6.6.6', i * 3 + 1, f'/wp-content/evilshell{i % 3}.php', 404))
+    return lines
+
+
+def _records():
+    records = LogRecords()
+    records.append('1.1.1.1', to_epoch(START), '/', 200)
+    return records
+
+
+def _train(log_dir, tmp_path, full=False):
+    app = Flask(__name__)
+    app.config.update(AIWAF_LOG_DIR=str(log_dir), AIWAF_DATA_DIR=str(tmp_path / 'data'),
+                      AIWAF_USE_CSV=True)
+    with app.app_context():
+        FlaskAITrainer(app).train(disable_ai=True, full=full)
+    with open(log_dir / CHECKPOINT_FILENAME) as f:
+        return json.load(f)
+
+
+def test_plan_reads_only_appended_complete_lines_and_follows_rotation(tmp_path):
+    log = tmp_path / 'access.log'
+    log.write_text(''.join(_traffic(0, 2)))
+    checkpoint = TrainingCheckpoint(str(tmp_path / CHECKPOINT_FILENAME), str(tmp_path))
+
+    assert checkpoint.plan([str(log)]) == [(str(log), 0, log.stat().st_size)]
+    checkpoint.commit(4, _records())
+    read_to = log.stat().st_size
+
+    with open(log, 'a') as f:
+        f.write(_traffic(2, 3)[0] + '10.0.0.9 - - [01/Jan/2025:12:0')  # last line still being written
+    appended_to = read_to + len(_traffic(2, 3)[0])
+    assert checkpoint.plan([str(log)]) == [(str(log), read_to, appended_to)]
+    checkpoint.commit(1, _records())
+
+    # Rotation: the old file keeps its inode under a new name and a fresh log starts
+    rotated = tmp_path / 'access.log.1'
+    os.rename(log, rotated)
+    with open(rotated, 'a') as f:
+        f.write('0:00 +0000] "GET / HTTP/1.1" 200 1 "-" "curl/8" response-time=0.010\n')
+    log.write_text(_traffic(3, 4)[0])
+    # An unrelated old archive is new to the checkpoint, whatever its mtime
+    archive = tmp_path / 'other.log.gz'
+    with gzip.open(archive, 'wt') as f:
+        f.writelines(_traffic(10, 11))
+    os.utime(archive, (0, 0))
+
+    reloaded = TrainingCheckpoint.load(checkpoint.path, str(tmp_path))
+    assert reloaded.plan([str(log), str(rotated), str(archive)]) == [
+        (str(log), 0, log.stat().st_size),
+        (str(rotated), appended_to, rotated.stat().st_size),
+        (str(archive), 0, None),
+    ]
+    reloaded.commit(4, _records())
+
+    # The rotation is compressed after a line was appended: only that line is new
+    rotated_gz = tmp_path / 'access.log.1.gz'
+    with open(rotated, 'rb') as src, gzip.open(rotated_gz, 'wb') as dst:
+        dst.write(src.read() + _traffic(5, 6)[0].encode())
+    read_to = rotated.stat().st_size
+    os.remove(rotated)
+    assert reloaded.plan([str(log), str(rotated_gz), str(archive)]) == [(str(rotated_gz), read_to, None)]
+    assert parse_log_task((str(rotated_gz), read_to, None))[0] == 1
+    reloaded.commit(1, _records())
+    assert reloaded.plan([str(log), str(rotated_gz), str(archive)]) == []
+
+
+def test_plan_rereads_a_reused_inode(tmp_path):
+    log = tmp_path / 'access.log'
+    log.write_text(''.join(_traffic(0, 2)))
+    checkpoint = TrainingCheckpoint(str(tmp_path / CHECKPOINT_FILENAME), str(tmp_path))
+    checkpoint.plan([str(log)])
+    checkpoint.commit(4, _records())
+
+    # Same inode, different content that has grown past the old offset
+    log.write_text(''.join(_traffic(5, 8)))
+    assert checkpoint.plan([str(log)]) == [(str(log), 0, log.stat().st_size)]
+
+
+def test_incremental_runs_match_a_full_rebuild(tmp_path):
+    log_dir = tmp_path / 'logs'
+    log_dir.mkdir()
+    log = log_dir / 'access.log'
+    log.write_text(''.join(_traffic(0, 40)))
+    first = _train(log_dir, tmp_path)
+    assert first['lines'] == 80
+
+    with open(log, 'a') as f:
+        f.writelines(_traffic(40, 70))
+    incremental = _train(log_dir, tmp_path)
+    full = _train(log_dir, tmp_path, full=True)
+
+    assert incremental['lines'] == full['lines'] == 140
+    for key in ('records', 'ips', 'tokens'):
+        assert incremental[key] == full[key], key
+    assert full['ips']['6.6.6.6']['404'] == 70
+    last = to_epoch(START) + 69 * 3 + 1
+    assert full['ips']['6.6.6.6']['recent'] == [last - 9, last - 6, last - 3, last]
+    assert full['tokens']['evilshell0'] == 24
+
+
+def test_run_without_new_lines_keeps_checkpoint(tmp_path):
+    log_dir = tmp_path / 'logs'
+    log_dir.mkdir()
+    (log_dir / 'access.log').write_text(''.join(_traffic(0, 40)))
+    first = _train(log_dir, tmp_path)
+    assert _train(log_dir, tmp_path) == first
+
+
+def _csv_rows(first, last):
+    return [f'{(START + timedelta(seconds=i)).isoformat()},10.0.0.{i % 3},GET,/page{i % 4},'
+            f'{404 if i % 5 == 0 else 200},{i * 2},"curl/8, like Gecko"\n' for i in range(first, last)]
+
+
+def test_incremental_csv_runs_read_the_same_records_as_a_full_run(tmp_path):
+    log_dir = tmp_path / 'logs'
+    log_dir.mkdir()
+    log = log_dir / 'access.csv'
+    log.write_text('timestamp,ip,method,path,status_code,response_time_ms,user_agent\n'
+                   + ''.join(_csv_rows(0, 30)))
+    app = Flask(__name__)
+    app.config.update(AIWAF_LOG_DIR=str(log_dir), AIWAF_DATA_DIR=str(tmp_path / 'data'))
+    checkpoint = TrainingCheckpoint(str(log_dir / CHECKPOINT_FILENAME), str(log_dir))
+    with app.app_context():
+        trainer = FlaskAITrainer(app)
+        first_lines, first = trainer._collect_records(checkpoint=checkpoint)
+        checkpoint.commit(first_lines, first)
+        with open(log, 'a') as f:
+            f.writelines(_csv_rows(30, 50))
+        more_lines, more = trainer._collect_records(jobs=2, checkpoint=checkpoint)
+        full_lines, full = trainer._collect_records()
+
+    assert (first_lines, more_lines) == (30, 20)
+    assert full_lines == 50
+    assert list(first.rows()) + list(more.rows()) == list(full.rows())
+    assert list(full.rows())[1] == ('10.0.0.1', to_epoch(START) + 1, '/page1', 200, 0.002)
+
+
+def test_404_counts_age_out_and_unblocked_ips_stay_unblocked(tmp_path):
+    checkpoint = TrainingCheckpoint(str(tmp_path / CHECKPOINT_FILENAME), str(tmp_path))
+    checkpoint.merge_404s({'1.1.1.1': 5, '2.2.2.2': 5}, {})
+    checkpoint.ips['1.1.1.1']['last'] = 1000.0
+    checkpoint.ips['2.2.2.2']['last'] = 4000.0
+    ip_404, _ = checkpoint.merge_404s({'1.1.1.1': 2}, {}, now=5000.0, max_age=3600)
+    assert dict(ip_404) == {'1.1.1.1': 2, '2.2.2.2': 5}
+
+    log_dir = tmp_path / 'logs'
+    log_dir.mkdir()
+    log = log_dir / 'access.log'
+    log.write_text(''.join(_traffic(0, 40)))
+    app = Flask(__name__)
+    app.config.update(AIWAF_LOG_DIR=str(log_dir), AIWAF_DATA_DIR=str(tmp_path / 'data'),
+                      AIWAF_USE_CSV=True)
+    with app.app_context():
+        FlaskAITrainer(app).train(disable_ai=True)
+        assert BlacklistManager.is_blocked('6.6.6.6')
+        BlacklistManager.unblock('6.6.6.6')
+
+        # New traffic without 404s from the unblocked IP
+        with open(log, 'a') as f:
+            f.writelines(_line(f'10.0.0.{i % 5}', 200 + i, '/page1', 200) for i in range(10))
+        FlaskAITrainer(app).train(disable_ai=True)
+        assert not BlacklistManager.is_blocked('6.6.6.6')
+
+
+@pytest.mark.parametrize('use_numpy', [True, False])
+def test_reservoir_samples_rows_uniformly(tmp_path, monkeypatch, use_numpy):
+    checkpoint = TrainingCheckpoint(str(tmp_path / CHECKPOINT_FILENAME), str(tmp_path))
+    if use_numpy:
+        np = pytest.importorskip('numpy')
+        rows = np.arange(20000, dtype=np.float64).reshape(10000, 2)
+    else:
+        monkeypatch.setattr(train_checkpoint, 'np', None)
+        rows = [(float(2 * i), float(2 * i + 1)) for i in range(10000)]
+
+    checkpoint.sample_features(['a', 'b'], rows[:50], 500)
+    assert checkpoint.reservoir == [[float(2 * i), float(2 * i + 1)] for i in range(50)]
+    sample = checkpoint.sample_features(['a', 'b'], rows[50:], 500)
+
+    assert checkpoint.reservoir_seen == 10000
+    assert len(sample) == 500
+    assert all(type(row) is list and row[1] == row[0] + 1 for row in sample)
+    ids = [row[0] // 2 for row in sample]
+    assert len(set(ids)) == 500
+    assert 3500 < sum(ids) / len(ids) < 6500
+    assert sum(i >= 5000 for i in ids) > 150  # later rows still get in
+
+
+def test_incremental_ai_run_refits_on_history_plus_new_rows(tmp_path):
+    joblib = pytest.importorskip('joblib')
+    pytest.importorskip('sklearn')
+    log_dir = tmp_path / 'logs'
+    log_dir.mkdir()
+    log = log_dir / 'access.log'
+    log.write_text(''.join(_traffic(0, 200)))
+    model_path = tmp_path / 'model' / 'model.pkl'
+
+    def train(**config):
+        app = Flask(__name__)
+        app.config.update(AIWAF_LOG_DIR=str(log_dir), AIWAF_DATA_DIR=str(tmp_path / 'data'),
+                          AIWAF_MODEL_PATH=str(model_path), AIWAF_FORCE_AI=True, **config)
+        with app.app_context():
+            FlaskAITrainer(app).train()
+        return joblib.load(model_path)
+
+    assert train()['samples_count'] == 400
+    with open(log, 'a') as f:
+        f.writelines(_traffic(200, 201))
+    model = train()
+    assert model['samples_count'] == 402
+    assert model['model'].max_samples_ == 256
+
+    with open(log, 'a') as f:
+        f.writelines(_traffic(201, 202))
+    assert train(AIWAF_TRAIN_RESERVOIR_SIZE=100)['samples_count'] == 100
+
+
+def test_tiny_reservoir_keeps_the_existing_model(tmp_path):
+    joblib = pytest.importorskip('joblib')
+    pytest.importorskip('sklearn')
+    log_dir = tmp_path / 'logs'
+    log_dir.mkdir()
+    (log_dir / 'access.log').write_text(''.join(_traffic(0, 40)))
+    model_path = tmp_path / 'model.pkl'
+    app = Flask(__name__)
+    app.config.update(AIWAF_LOG_DIR=str(log_dir), AIWAF_DATA_DIR=str(tmp_path / 'data'),
+                      AIWAF_MODEL_PATH=str(model_path), AIWAF_FORCE_AI=True,
+                      AIWAF_TRAIN_RESERVOIR_SIZE=10)
+    with app.app_context():
+        FlaskAITrainer(app).train()
+    assert not model_path.exists()
@@ -0,0 +1,78 @@
+import random
+from collections import defaultdict
+
+import pytest
+
+from aiwaf_flask import features
+from aiwaf_flask.log_ingest import LogRecords
+from aiwaf_flask.trainer import STATIC_KW, STATUS_IDX
+
+PATHS = ['/', '/login', '/wp-admin.php', '/.env', '/static/app.js', '/config.bak', '/a/b/c']
+EXEMPT = {'/login'}
+
+
+def _records(seed=7, size=600):
+    rng = random.Random(seed)
+    records = LogRecords()
+    base = 1_700_000_000.0
+    for _ in range(size):
+        # Tenths of a second make (epoch - 10) land on float rounding boundaries
+        epoch = base + rng.randrange(0, 900) / 10
+        records.append(f'10.0.0.{rng.randrange(12)}', epoch, rng.choice(PATHS),
+                       rng.choice([200, 200, 403, 404, 500, 301]), rng.random())
+    records.append('10.9.9.9', base, '/', 200, 0.1)  # single-record IP
+    return records
+
+
+def _loop_features(records):
+    """The trainer's original per-record feature loop."""
+    ip_404 = defaultdict(int)
+    for ip, _, path, status, _ in records.rows():
+        if status == 404 and path not in EXEMPT:
+            ip_404[ip] += 1
+    ip_times = records.epochs_by_ip()
+    rows = []
+    for ip, epoch, path, status, resp_time in records.rows():
+        burst = sum(1 for t in ip_times[ip] if epoch - t <= 10)
+        kw_hits = 0
+        if path not in EXEMPT:
+            kw_hits = sum(k in path.lower() for k in STATIC_KW)
+        status_idx = STATUS_IDX.index(str(status)) if str(status) in STATUS_IDX else -1
+        rows.append({
+            "ip": ip, "path_len": len(path), "kw_hits": kw_hits, "resp_time": resp_time,
+            "status_idx": status_idx, "burst_count": burst, "total_404": ip_404[ip],
+        })
+    return ip_404, rows
+
+
+@pytest.mark.parametrize('use_numpy', [True, False])
+def test_columnar_features_match_record_loop(monkeypatch, use_numpy):
+    if use_numpy:
+        pytest.importorskip('numpy')
+    else:
+        monkeypatch.setattr(features, 'np', None)
+    records = _records()
+    expected_404, expected = _loop_features(records)
+
+    path_exempt = [path in EXEMPT for path in records.paths]
+    ip_404, ip_404_login = features.count_404s(records, path_exempt)
+    assert dict(ip_404) == {ip: n for ip, n in expected_404.items() if n}
+    assert sum(ip_404_login.values()) == sum(
+        1 for _, _, path, status, _ in records.rows() if status == 404 and path in EXEMPT)
+
+    kw_hits = [0 if exempt else sum(k in path.lower() for k in STATIC_KW)
+               for path, exempt in zip(records.paths, path_exempt)]
+    columns = features.extract_features(records, ip_404, kw_hits, STATUS_IDX)
+
+    assert list(columns) == list(expected[0])
+    for name, values in columns.items():
+        assert list(values) == [row[name] for row in expected], name
+
+
+def test_burst_counts_include_later_requests_of_the_ip():
+    records = LogRecords()
+    for epoch in (100.0, 105.0, 110.0, 111.0, 130.0):
+        records.append('1.1.1.1', epoch, '/', 200)
+    records.append('2.2.2.2', 105.0, '/', 200)
+
+    assert list(features.burst_counts(records)) == [5, 5, 5, 4, 1, 1]
@@ -1,10 +1,16 @@
+from collections import Counter
+
 from aiwaf_flask import trainer
 
 
 def test_geoip_summary_for_blocklist(capsys, monkeypatch):
     monkeypatch.setattr(trainer, "_get_storage_mode", lambda: "csv")
     monkeypatch.setattr(trainer, "_read_csv_blacklist", lambda: {"1.1.1.1": "test", "2.2.2.2": "test"})
-    monkeypatch.setattr(trainer, "lookup_country_name", lambda ip, **kwargs: "United States" if ip == "1.1.1.1" else None)
+    monkeypatch.setattr(
+        trainer,
+        "batch_country_counts",
+        lambda ips, **kwargs: Counter("United States" if ip == "1.1.1.1" else None for ip in ips),
+    )
     monkeypatch.setattr(trainer.os.path, "exists", lambda path: True)
     monkeypatch.setattr(trainer, "_get_geoip_db_path", lambda: "fake.mmdb")
 
@@ -0,0 +1,51 @@
+from flask import Flask
+
+from aiwaf_flask.trainer import FlaskAITrainer, RouteOracle
+
+
+def _app():
+    app = Flask(__name__)
+
+    @app.route('/about')
+    def about():
+        return 'about'
+
+    @app.route('/docs/')
+    def docs():
+        return 'docs'
+
+    @app.route('/users/<int:user_id>')
+    def user(user_id):
+        return str(user_id)
+
+    @app.route('/submit', methods=['POST'])
+    def submit():
+        return 'ok'
+
+    return app
+
+
+def test_path_exists_in_flask_matches_static_and_dynamic_routes():
+    trainer = FlaskAITrainer(_app())
+
+    for path in ('/about', '/about/', '/about?x=1', '/docs', '/docs/',
+                 '/users/42', '/submit', '/static/app.js'):
+        assert trainer.path_exists_in_flask(path), path
+    for path in ('/wp-admin.php', '/users/abc', '/about/more', '/.env'):
+        assert not trainer.path_exists_in_flask(path), path
+
+
+def test_route_oracle_needs_no_request_context_and_matches_each_path_once(monkeypatch):
+    app = _app()
+    monkeypatch.setattr(app, 'test_request_context', None)
+    oracle = RouteOracle(app.url_map)
+    calls = []
+    real_match = oracle._match
+    monkeypatch.setattr(oracle, '_match', lambda path: calls.append(path) or real_match(path))
+
+    for _ in range(3):
+        assert '/about' in oracle
+        assert '/users/7' in oracle
+        assert '/wp-login.php' not in oracle
+
+    assert calls == ['/users/7', '/wp-login.php', '/wp-login.php/']
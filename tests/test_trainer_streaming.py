@@ -0,0 +1,60 @@
+import gzip
+from datetime import datetime, timedelta, timezone
+
+from flask import Flask
+
+from aiwaf_flask.log_ingest import LogRecords, to_epoch
+from aiwaf_flask.trainer import FlaskAITrainer
+
+
+def _line(ip, ts, path, status, rt=0.05):
+    stamp = ts.strftime('%d/%b/%Y:%H:%M:%S +0000')
+    return (f'{ip} - - [{stamp}] "GET {path} HTTP/1.1" {status} 12 "-" "curl/8" '
+            f'response-time={rt:.3f}\n')
+
+
+def _trainer(log_dir):
+    app = Flask(__name__)
+    app.config['AIWAF_LOG_DIR'] = str(log_dir)
+    return app, FlaskAITrainer(app)
+
+
+def test_log_records_intern_ips_and_paths():
+    records = LogRecords()
+    start = datetime(2025, 1, 1, 12, 0, 0)
+    records.append('10.0.0.1', start, '/a', '200', 0.1)
+    records.append('10.0.0.1', start + timedelta(seconds=5), '/a', 404)
+    records.append('10.0.0.2', to_epoch(start), '/b', '500', 0.2)
+
+    assert len(records) == 3
+    assert records.ips == ['10.0.0.1', '10.0.0.2']
+    assert records.paths == ['/a', '/b']
+    assert list(records.rows())[1] == ('10.0.0.1', to_epoch(start) + 5, '/a', 404, 0.0)
+    assert records.epochs_by_ip()['10.0.0.1'] == [to_epoch(start), to_epoch(start) + 5]
+
+
+def test_to_epoch_treats_naive_as_utc():
+    naive = datetime(2025, 1, 1, 12, 0, 0)
+    assert to_epoch(naive) == to_epoch(naive.replace(tzinfo=timezone.utc))
+
+
+def test_collect_records_streams_current_and_rotated_logs(tmp_path):
+    start = datetime(2025, 1, 1, 12, 0, 0)
+    current = [_line('10.0.0.1', start + timedelta(seconds=i), f'/page{i % 3}', 200) for i in range(5)]
+    rotated = [_line('10.0.0.2', start, '/wp-admin.php', 404)]
+    (tmp_path / 'access.log').write_text(''.join(current) + 'not a log line\n')
+    with gzip.open(tmp_path / 'access.log.1.gz', 'wt') as f:
+        f.writelines(rotated)
+
+    app, trainer = _trainer(tmp_path)
+    with app.app_context():
+        line_count, records = trainer._collect_records()
+        expected = [trainer._parse(line) for line in current + rotated]
+
+    assert line_count == 7
+    assert len(records) == 6
+    assert list(records.rows()) == [
+        (r['ip'], to_epoch(r['timestamp']), r['path'], int(r['status']), r['response_time'])
+        for r in expected
+    ]
+